@@ -0,0 +1,243 @@
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+# Quote balances are held in units of 10^-8 (Binance's quote precision)
+CASH_DECIMALS = 8
+
+def decimals_of(increment):
+    """Number of decimals of a tick/step size ('0.01000000' -> 2)."""
+    exponent = Decimal(str(increment)).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+def filters_from_symbol_info(info):
+    """(tick_size, step_size) from a get_symbol_info() response, or None if absent."""
+    if not info:
+        return None
+    tick_size = step_size = None
+    for f in info.get('filters', []):
+        if f.get('filterType') == 'PRICE_FILTER':
+            tick_size = f.get('tickSize')
+        elif f.get('filterType') == 'LOT_SIZE':
+            step_size = f.get('stepSize')
+    if tick_size is None or step_size is None:
+        return None
+    return tick_size, step_size
+
+
+class Instrument:
+    """
+    Price/quantity grid of one symbol: prices are integer ticks (PRICE_FILTER
+    tickSize) and quantities integer steps (LOT_SIZE stepSize).
+    """
+
+    def __init__(self, symbol, tick_size='0.00000001', step_size='0.00000001', cash_decimals=CASH_DECIMALS):
+        self.symbol = symbol
+        self.tick_size = Decimal(str(tick_size)).normalize()
+        self.step_size = Decimal(str(step_size)).normalize()
+        self.price_decimals = decimals_of(self.tick_size)
+        self.qty_decimals = decimals_of(self.step_size)
+        self._inv_tick = 1 / float(self.tick_size)
+        self._inv_step = 1 / float(self.step_size)
+        # Cash units per (1 step x 1 tick), as an exact ratio
+        self._num, self._den = (self.tick_size * self.step_size).scaleb(cash_decimals).as_integer_ratio()
+
+    def price_ticks(self, price):
+        if isinstance(price, (Decimal, str)):
+            return int((Decimal(price) / self.tick_size).to_integral_value(ROUND_HALF_UP))
+        return int(round(price * self._inv_tick))
+
+    def qty_steps(self, quantity):
+        if isinstance(quantity, (Decimal, str)):
+            return int((Decimal(quantity) / self.step_size).to_integral_value(ROUND_HALF_UP))
+        return int(round(quantity * self._inv_step))
+
+    def floor_steps(self, quantity):
+        """Whole steps of `quantity`, rounded down (what can actually be sold of a balance)."""
+        return int((Decimal(str(quantity)) / self.step_size).to_integral_value(ROUND_DOWN))
+
+    def value_units(self, steps, ticks):
+        """Quote value of `steps` at `ticks`, in cash units (integer math only)."""
+        if self._den == 1:
+            return steps * ticks * self._num
+        return steps * ticks * self._num // self._den
+
+    def price(self, ticks):
+        return (Decimal(ticks) * self.tick_size).quantize(self.tick_size)
+
+    def quantity(self, steps):
+        return (Decimal(steps) * self.step_size).quantize(self.step_size)
+
+
+class Position:
+    """Open quantity and cost basis of one symbol, all in integers."""
+
+    __slots__ = ('steps', 'cost_units', 'notional_units', 'realized_units', 'fees_units', 'last_ticks')
+
+    def __init__(self):
+        self.steps = 0 # Quantity held
+        self.cost_units = 0 # What the open quantity cost, buy fees included
+        self.notional_units = 0 # Same without fees (for the average entry price)
+        self.realized_units = 0
+        self.fees_units = 0 # Every fee paid on this symbol
+        self.last_ticks = 0 # Last marked price
+
+
+class Ledger:
+    """
+    Fixed-point portfolio: quote cash plus any number of positions.
+
+    Balances are scaled integers, so valuation on every tick is exact and
+    costs a few integer multiplications; Decimal is only produced at the
+    reporting boundary (to_decimal, summary). Fills may be partial and a
+    position can be built or reduced over several of them.
+    """
+
+    def __init__(self, cash=0, cash_decimals=CASH_DECIMALS):
+        self.cash_decimals = cash_decimals
+        self.cash_units = self.to_units(cash)
+        self.instruments = {}
+        self.positions = {}
+
+    def to_units(self, amount):
+        return int(Decimal(str(amount)).scaleb(self.cash_decimals).to_integral_value(ROUND_HALF_UP))
+
+    def to_decimal(self, units):
+        return Decimal(units).scaleb(-self.cash_decimals)
+
+    def register(self, instrument):
+        self.instruments[instrument.symbol] = instrument
+
+    def instrument(self, symbol):
+        instrument = self.instruments.get(symbol)
+        if instrument is None:
+            instrument = self.instruments[symbol] = Instrument(symbol, cash_decimals=self.cash_decimals)
+        return instrument
+
+    def position(self, symbol):
+        position = self.positions.get(symbol)
+        if position is None:
+            position = self.positions[symbol] = Position()
+        return position
+
+    def apply_fill(self, symbol, side, quantity, price, fee=0):
+        """
+        Books one (possibly partial) fill; fee is in quote currency.
+        Returns (realized_units, basis_units, proceeds_units): the cost basis and
+        net proceeds of the sold quantity, zeros for buys.
+        """
+        instrument = self.instrument(symbol)
+        position = self.position(symbol)
+        steps = instrument.qty_steps(quantity)
+        ticks = instrument.price_ticks(price)
+        value = instrument.value_units(steps, ticks)
+        fee_units = self.to_units(fee)
+
+        position.last_ticks = ticks
+        position.fees_units += fee_units
+        if side == "BUY":
+            self.cash_units -= value + fee_units
+            position.steps += steps
+            position.cost_units += value + fee_units
+            position.notional_units += value
+            return 0, 0, 0
+
+        # SELL: release the sold share of the cost basis (integer pro-rata, remainder stays)
+        held = position.steps
+        if held > 0:
+            sold = min(steps, held)
+            basis = position.cost_units * sold // held
+            notional = position.notional_units * sold // held
+        else:
+            basis = notional = 0
+        proceeds = value - fee_units
+        realized = proceeds - basis
+
+        self.cash_units += proceeds
+        position.steps -= steps
+        position.cost_units -= basis
+        position.notional_units -= notional
+        position.realized_units += realized
+        if position.steps <= 0:
+            position.steps = position.cost_units = position.notional_units = 0
+        return realized, basis, proceeds
+
+    def mark(self, symbol, price):
+        """Records the latest price of a symbol for valuation."""
+        position = self.positions.get(symbol)
+        if position is not None:
+            position.last_ticks = self.instruments[symbol].price_ticks(price)
+
+    def market_value_units(self):
+        total = 0
+        for symbol, position in self.positions.items():
+            if position.steps:
+                total += self.instruments[symbol].value_units(position.steps, position.last_ticks)
+        return total
+
+    def net_worth_units(self):
+        return self.cash_units + self.market_value_units()
+
+    def net_worth_units_at(self, symbol, price):
+        """Net worth with `symbol` valued at `price`, without marking it (read-only views)."""
+        total = self.net_worth_units()
+        position = self.positions.get(symbol)
+        if position is None or not position.steps:
+            return total
+        instrument = self.instruments[symbol]
+        return (total - instrument.value_units(position.steps, position.last_ticks)
+                + instrument.value_units(position.steps, instrument.price_ticks(price)))
+
+    def unrealized_units(self, symbol):
+        position = self.positions.get(symbol)
+        if position is None or not position.steps:
+            return 0
+        return self.instruments[symbol].value_units(position.steps, position.last_ticks) - position.cost_units
+
+    def average_entry(self, symbol):
+        """Average entry price (fees excluded) of the open quantity, as Decimal."""
+        position = self.positions.get(symbol)
+        if position is None or not position.steps:
+            return Decimal('0')
+        instrument = self.instruments[symbol]
+        return (self.to_decimal(position.notional_units) / instrument.quantity(position.steps)).quantize(instrument.tick_size)
+
+    def summary(self):
+        """Per-symbol quantity, average entry, realized/unrealized PnL and fees, as Decimals."""
+        rows = {}
+        for symbol, position in self.positions.items():
+            instrument = self.instruments[symbol]
+            rows[symbol] = {
+                'quantity': instrument.quantity(position.steps),
+                'avg_entry': self.average_entry(symbol),
+                'last_price': instrument.price(position.last_ticks),
+                'realized': self.to_decimal(position.realized_units),
+                'unrealized': self.to_decimal(self.unrealized_units(symbol)),
+                'fees': self.to_decimal(position.fees_units)
+            }
+        return rows
+
+    def state(self):
+        """Plain-integer state, for the state journal."""
+        return {
+            'cash_units': self.cash_units,
+            'instruments': {s: [str(i.tick_size), str(i.step_size)] for s, i in self.instruments.items()},
+            'positions': {s: [getattr(p, f) for f in Position.__slots__] for s, p in self.positions.items()}
+        }
+
+    def load_state(self, state):
+        self.cash_units = state['cash_units']
+        for symbol, (tick_size, step_size) in state['instruments'].items():
+            self.register(Instrument(symbol, tick_size, step_size, self.cash_decimals))
+        self.positions = {}
+        for symbol, values in state['positions'].items():
+            position = self.positions[symbol] = Position()
+            for field, value in zip(Position.__slots__, values):
+                setattr(position, field, value)
+
+    def close_position(self, symbol):
+        """Forgets a position without a fill (it was closed outside the bot); returns its quantity in steps."""
+        position = self.positions.get(symbol)
+        if position is None:
+            return 0
+        steps = position.steps
+        position.steps = position.cost_units = position.notional_units = 0
+        return steps
@@ -0,0 +1,145 @@
+from kline_buffer import KlineBuffer
+
+_UNIT_MS = {'s': 1000, 'm': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000}
+
+def interval_ms(interval):
+    """Milliseconds of a Binance interval such as '5m' or '4h' (None for unknown or calendar units)."""
+    try:
+        return int(interval[:-1]) * _UNIT_MS[interval[-1]]
+    except (ValueError, KeyError, IndexError):
+        return None
+
+
+class CandleAggregator:
+    """
+    Builds higher-timeframe bars (e.g. 15m, 1h, 4h) from base-interval klines.
+
+    Bars are aligned to epoch multiples of the period, like Binance's own
+    klines up to 1d. Closed base candles are folded into the bar being built;
+    the open base candle is only overlaid by current(), so repeated updates
+    of it never double count. A bar is complete when its last base candle
+    closes, or when a candle of a later bar arrives (missing candles); bars
+    that didn't see every base candle (joined mid-bar, gaps) are flagged.
+    """
+
+    def __init__(self, timeframe, base_timeframe):
+        self.timeframe = timeframe
+        self.period = interval_ms(timeframe)
+        self.base_period = interval_ms(base_timeframe)
+        if not self.period or not self.base_period or self.period <= self.base_period or self.period % self.base_period:
+            raise ValueError(f"{timeframe} bars can't be built from {base_timeframe} candles")
+        self.bar_open = None # Open time of the bar in progress
+        self._bar = None # [open, high, low, close, volume] of its closed base candles
+        self._open = None # (open, high, low, close, volume) of the open base candle
+        self._last_base = None # Open time of the last closed base candle
+        self._full = False # Every base candle of the bar in progress was seen
+
+    def add(self, open_time, open_, high, low, close, volume, closed):
+        """
+        Applies one base kline; returns the bars it completed as (bar, full) pairs,
+        bar being (open_time, o, h, l, c, v) and full False if base candles were missing.
+        """
+        completed = []
+        if self._last_base is not None and open_time <= self._last_base:
+            return completed # Duplicate close, or an update for a candle that already closed
+
+        bucket = open_time - open_time % self.period
+        if self.bar_open is not None and bucket != self.bar_open:
+            if bucket < self.bar_open:
+                return completed
+            if self._bar is not None:
+                completed.append(self._complete())
+            self.bar_open = self._open = None
+        if self.bar_open is None:
+            self.bar_open = bucket
+
+        if not closed:
+            self._open = (open_, high, low, close, volume)
+            return completed
+
+        self._open = None
+        bar = self._bar
+        if bar is None:
+            self._bar = [open_, high, low, close, volume]
+            self._full = open_time == bucket
+        else:
+            self._full = self._full and open_time == self._last_base + self.base_period
+            if high > bar[1]:
+                bar[1] = high
+            if low < bar[2]:
+                bar[2] = low
+            bar[3] = close
+            bar[4] += volume
+        self._last_base = open_time
+        if open_time + self.base_period >= bucket + self.period:
+            completed.append(self._complete())
+        return completed
+
+    def _complete(self):
+        bar = (self.bar_open, *self._bar)
+        self.bar_open = self._bar = None
+        return bar, self._full and self._last_base + self.base_period == bar[0] + self.period
+
+    def current(self):
+        """The bar in progress including the open base candle, or None right after a bar completed."""
+        if self._open is None:
+            return (self.bar_open, *self._bar) if self._bar is not None else None
+        open_, high, low, close, volume = self._open
+        if self._bar is None:
+            return (self.bar_open, open_, high, low, close, volume)
+        bar_open, bar_high, bar_low, _, bar_volume = self._bar
+        return (self.bar_open, bar_open, max(bar_high, high), min(bar_low, low), close, bar_volume + volume)
+
+
+class TimeframeView:
+    """
+    One higher timeframe of a symbol: the aggregator, a buffer of completed
+    bars and an IndicatorEngine over them. `indicators` holds
+    (rsi, ema, atr, vol_confirm) including the bar in progress after every update.
+    """
+
+    def __init__(self, timeframe, base_timeframe, engine, capacity):
+        self.timeframe = timeframe
+        self.aggregator = CandleAggregator(timeframe, base_timeframe)
+        self.buffer = KlineBuffer(capacity)
+        self.engine = engine
+        self.indicators = (None, None, None, None)
+
+    def bootstrap(self, klines, base_buffer):
+        """
+        Loads completed bars (e.g. from the KlineStore), then rebuilds the bar in
+        progress from the base candles newer than the last of them.
+        """
+        self.buffer.extend(klines)
+        self.engine.seed(self.buffer)
+        last = self.buffer.last_open_time
+        start = last + self.aggregator.period if last is not None else None
+        open_times = base_buffer.window('open_time')
+        opens, highs, lows = base_buffer.window('open'), base_buffer.window('high'), base_buffer.window('low')
+        closes, volumes = base_buffer.window('close'), base_buffer.window('volume')
+        for i in range(len(open_times)):
+            if start is None or open_times[i] >= start:
+                self.update(int(open_times[i]), opens[i], highs[i], lows[i], closes[i], volumes[i], True)
+
+    def update(self, open_time, open_, high, low, close, volume, closed):
+        """
+        Feeds one base kline. Completed bars are committed to the buffer and
+        engine; the ones built from every base candle are returned (safe to cache).
+        """
+        full_bars = []
+        for bar, full in self.aggregator.add(open_time, open_, high, low, close, volume, closed):
+            self.buffer.append(*bar)
+            self.engine.update(bar[4], bar[5], bar[2], bar[3])
+            if full:
+                full_bars.append(bar)
+        current = self.aggregator.current()
+        if current is None:
+            self.indicators = self.engine.metrics()
+        else:
+            self.indicators = self.engine.peek(current[4], current[5], current[2], current[3])
+        return full_bars
+
+    def reseed(self, engine):
+        """Swaps in a fresh engine (e.g. after a period change) replayed from the bar buffer."""
+        engine.seed(self.buffer)
+        self.engine = engine
@@ -0,0 +1,315 @@
+import argparse
+import time
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from strategies import MarketState, Signal, TrendRsiAtrStrategy, load_strategy, strategy_name
+from indicators import IndicatorEngine
+from aggregator import TimeframeView
+from portfolio_tracker import calculate_fee, calculate_round_trip
+from colorama import init, Fore, Style
+
+# Column layout of Binance kline dumps (data.binance.vision) and REST get_klines
+KLINE_COLUMNS = [
+    'open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time',
+    'quote_volume', 'trades', 'taker_buy_base', 'taker_buy_quote', 'ignore'
+]
+
+def has_header(first_field):
+    """True if the first field of a CSV isn't a number (Binance dumps start with the open time)."""
+    try:
+        float(first_field)
+        return False
+    except ValueError:
+        return True
+
+def load_klines(path):
+    """
+    Loads klines from a local CSV or Parquet file.
+    Accepts headerless Binance dumps as well as files with named columns.
+    """
+    if str(path).endswith('.parquet'):
+        df = pd.read_parquet(path)
+    else:
+        # Sniff the first row so a header never gets parsed as data (and the columns keep numeric dtypes)
+        header = 0 if has_header(pd.read_csv(path, header=None, nrows=1).iloc[0, 0]) else None
+        df = pd.read_csv(path, header=header)
+        if header is None:
+            df.columns = KLINE_COLUMNS[:len(df.columns)]
+
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    for col in ('open_time', 'open', 'high', 'low', 'close', 'volume'):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col])
+    return df.sort_values('open_time').reset_index(drop=True) if 'open_time' in df.columns else df
+
+def compute_rsi(closes, period=14):
+    """RSI with Wilder's Smoothing for a whole series."""
+    delta = pd.Series(closes).diff()
+    gain = delta.clip(lower=0).ewm(com=period - 1, adjust=False).mean()
+    loss = -delta.clip(upper=0).ewm(com=period - 1, adjust=False).mean()
+    return (100 - (100 / (1 + gain / loss))).to_numpy()
+
+def compute_ema(closes, period=200):
+    """EMA trend filter for a whole series."""
+    return pd.Series(closes).ewm(span=period, adjust=False).mean().to_numpy()
+
+def compute_atr(closes, period=14, highs=None, lows=None):
+    """ATR for a whole series: mean true range, or mean close-to-close move without highs/lows."""
+    closes = np.asarray(closes, dtype=np.float64)
+    true_range = np.full(len(closes), np.nan)
+    if highs is not None and lows is not None:
+        highs = np.asarray(highs, dtype=np.float64)
+        lows = np.asarray(lows, dtype=np.float64)
+        prev_close = closes[:-1]
+        true_range[1:] = np.maximum.reduce([
+            highs[1:] - lows[1:],
+            np.abs(highs[1:] - prev_close),
+            np.abs(lows[1:] - prev_close)
+        ])
+    else:
+        true_range[1:] = np.abs(np.diff(closes))
+    return pd.Series(true_range).rolling(window=period).mean().to_numpy()
+
+def compute_volume_confirm(volumes, period=10):
+    """Volume above its rolling mean (True until the window is full)."""
+    vol_series = pd.Series(volumes)
+    avg_vol = vol_series.rolling(window=period).mean()
+    return ((vol_series > avg_vol) | avg_vol.isna()).to_numpy()
+
+def compute_indicators(closes, volumes, rsi_period=14, ema_period=200, atr_period=14, volume_period=10,
+                       highs=None, lows=None):
+    """
+    Computes the strategy indicators for a whole series in one vectorized pass.
+    Values at index i equal IndicatorEngine.metrics() after committing bar i;
+    `ready` is False during the EMA warm-up.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    return {
+        'rsi': compute_rsi(closes, rsi_period),
+        'ema': compute_ema(closes, ema_period),
+        'atr': compute_atr(closes, atr_period, highs, lows),
+        'vol_confirm': compute_volume_confirm(volumes, volume_period),
+        'ready': np.arange(len(closes)) >= ema_period - 1
+    }
+
+def base_timeframe(config, symbol=None):
+    """Kline interval of `symbol` in SYMBOLS (TIMEFRAME when it isn't listed)."""
+    for listed, timeframe, _ in config['SYMBOLS']:
+        if listed == symbol:
+            return timeframe
+    return config['TIMEFRAME']
+
+def intrabar_prices(df, config):
+    """simulate() keyword arguments for stop crossings inside bars: only when the live bot has an exit stream."""
+    if not config['EXIT_STREAM'] or 'high' not in df.columns or 'low' not in df.columns:
+        return {}
+    return {'highs': df['high'].to_numpy(dtype=np.float64), 'lows': df['low'].to_numpy(dtype=np.float64)}
+
+def compute_trend_ok(df, config, timeframe):
+    """
+    The TREND_TIMEFRAME filter after each closed bar, as SymbolSession computes
+    it: close above the EMA of the higher-timeframe bars built from these klines
+    (bar in progress included). None without a trend timeframe or open times.
+    """
+    if not config['TREND_TIMEFRAME'] or 'open_time' not in df.columns:
+        return None
+    engine = IndicatorEngine(config['RSI_PERIOD'], config['TREND_EMA_PERIOD'], config['ATR_PERIOD'])
+    try:
+        view = TimeframeView(config['TREND_TIMEFRAME'], timeframe, engine, capacity=config['TREND_EMA_PERIOD'] + 20)
+    except ValueError as e:
+        print(Fore.YELLOW + f"[WARN] {e}; backtesting without the trend filter.")
+        return None
+    closes = df['close'].to_numpy(dtype=np.float64)
+    opens = df['open'].to_numpy(dtype=np.float64) if 'open' in df.columns else closes
+    highs = df['high'].to_numpy(dtype=np.float64) if 'high' in df.columns else closes
+    lows = df['low'].to_numpy(dtype=np.float64) if 'low' in df.columns else closes
+    volumes = df['volume'].to_numpy(dtype=np.float64)
+    open_times = df['open_time'].to_numpy()
+    trend_ok = np.zeros(len(closes), dtype=bool)
+    for i in range(len(closes)):
+        view.update(int(open_times[i]), opens[i], highs[i], lows[i], closes[i], volumes[i], True)
+        trend_ema = view.indicators[1]
+        trend_ok[i] = trend_ema is not None and closes[i] > trend_ema
+    return trend_ok
+
+def simulate(closes, indicators, quantity=0.001, initial_balance=1000.0, fee_rate=0.001,
+             atr_multiplier_sl=2.0, atr_multiplier_tp=1.5, min_profit_buffer=0.0025, times=None,
+             strategy=None, trend_ok=None, highs=None, lows=None):
+    """
+    Runs the live entry/exit state machine over closed bars, deciding with the
+    strategy's on_bar_close (default: the final strategy with the given
+    multipliers). trend_ok is the per-bar TREND_TIMEFRAME filter, if any.
+    Trailing state and fee math follow SymbolSession.on_kline and PortfolioTracker.log_trade.
+
+    With highs/lows (EXIT_STREAM on), a bar whose low crosses the stop from
+    exit_levels() exits at the stop price within that bar, as on_price does
+    live, and its high raises the trailing peak. Not modelled: trailing exits
+    between closes (the path inside a bar is unknown), slippage past the stop,
+    and on_tick decisions on open-candle updates.
+    """
+    if strategy is None:
+        strategy = TrendRsiAtrStrategy({
+            'ATR_MULTIPLIER_SL': atr_multiplier_sl, 'ATR_MULTIPLIER_TP': atr_multiplier_tp,
+            'MIN_PROFIT_BUFFER': min_profit_buffer, 'FEE_RATE': fee_rate
+        })
+    closes = np.asarray(closes, dtype=np.float64).tolist()
+    rsi = indicators['rsi'].tolist()
+    ema = indicators['ema'].tolist()
+    atr = indicators['atr'].tolist()
+    vol_confirm = indicators['vol_confirm'].tolist()
+    ready = indicators['ready'].tolist()
+    times = times.tolist() if times is not None else None
+    trend_ok = trend_ok.tolist() if trend_ok is not None else None
+    intrabar = highs is not None and lows is not None
+    if intrabar:
+        highs = np.asarray(highs, dtype=np.float64).tolist()
+        lows = np.asarray(lows, dtype=np.float64).tolist()
+    state = MarketState('BACKTEST')
+
+    qty = Decimal(str(quantity))
+    fee_rate_d = Decimal(str(fee_rate))
+    cash = Decimal(str(initial_balance))
+    peak_worth = cash
+    max_drawdown = Decimal('0.0')
+
+    trades = []
+    in_position = False
+    entry_price = Decimal('0.0')
+    entry_float = 0.0
+    entry_index = 0
+    highest_since_entry = 0
+
+    def sell(i, price, signal):
+        nonlocal cash, in_position, peak_worth, max_drawdown
+        exit_price = Decimal(str(price))
+        sell_fee = calculate_fee(exit_price, qty, fee_rate_d)
+        pnl, pnl_pct, buy_fee = calculate_round_trip(entry_price, exit_price, qty, fee_rate_d, sell_fee)
+        cash += exit_price * qty - sell_fee
+        in_position = False
+
+        trades.append({
+            'entry_time': times[entry_index] if times else entry_index,
+            'exit_time': times[i] if times else i,
+            'pnl': pnl,
+            'pnl_pct': pnl_pct,
+            'entry_price': entry_price,
+            'exit_price': exit_price,
+            'quantity': qty,
+            'fee': sell_fee + buy_fee,
+            'type': signal.replace("SELL_", "")
+        })
+
+        # Drawdown on realized equity
+        peak_worth = max(peak_worth, cash)
+        max_drawdown = max(max_drawdown, peak_worth - cash)
+
+    for i in range(len(closes)):
+        current_price = closes[i]
+
+        if intrabar and in_position and i > entry_index:
+            # Levels from the entry and the ATR of the last closed bar, as SymbolSession.update_exit_levels
+            levels = strategy.exit_levels(entry_float, atr[i - 1]) if atr[i - 1] == atr[i - 1] else None
+            if levels is not None:
+                if lows[i] < levels[0]:
+                    sell(i, levels[0], Signal.SELL_STOP_LOSS)
+                elif highs[i] > highest_since_entry:
+                    highest_since_entry = highs[i]
+
+        if in_position:
+            if current_price > highest_since_entry:
+                highest_since_entry = current_price
+        else:
+            highest_since_entry = 0
+
+        if not ready[i]:
+            continue
+
+        state.price = current_price
+        state.rsi, state.ema, state.atr, state.vol_confirm = rsi[i], ema[i], atr[i], vol_confirm[i]
+        state.trend_ok = trend_ok[i] if trend_ok is not None else True
+        state.entry_price = entry_float if in_position else 0.0
+        state.highest_since_entry = highest_since_entry
+        signal = strategy.on_bar_close(state)
+
+        if signal == "BUY" and not in_position:
+            entry_price = Decimal(str(current_price))
+            entry_float = float(entry_price)
+            entry_index = i
+            cash -= entry_price * qty + calculate_fee(entry_price, qty, fee_rate_d)
+            in_position = True
+
+        elif "SELL" in signal and in_position:
+            sell(i, current_price, signal)
+
+    wins = sum(1 for t in trades if t['pnl'] > 0)
+    return {
+        'trades': trades,
+        'total_pnl': sum((t['pnl'] for t in trades), Decimal('0.0')),
+        'final_cash': cash,
+        'open_position': in_position,
+        'win_rate': (wins / len(trades)) * 100 if trades else 0,
+        'max_drawdown': max_drawdown
+    }
+
+def run_backtest(df, config, initial_balance=1000.0, symbol=None):
+    """
+    Backtests the strategy the live bot would run for `symbol` (STRATEGY /
+    SYMBOL_STRATEGIES, with the trend filter and, with EXIT_STREAM, stops
+    crossed inside a bar) on a kline DataFrame.
+    """
+    strategy = load_strategy(strategy_name(config, symbol), config)
+    trend_ok = None
+    if 'trend' in strategy.requires:
+        trend_ok = compute_trend_ok(df, config, base_timeframe(config, symbol))
+    indicators = compute_indicators(
+        df['close'], df['volume'],
+        rsi_period=config['RSI_PERIOD'],
+        ema_period=config['EMA_PERIOD'],
+        atr_period=config['ATR_PERIOD'],
+        highs=df['high'] if 'high' in df.columns else None,
+        lows=df['low'] if 'low' in df.columns else None
+    )
+    return simulate(
+        df['close'], indicators,
+        quantity=config['QUANTITY'],
+        initial_balance=initial_balance,
+        fee_rate=config['FEE_RATE'],
+        atr_multiplier_sl=config['ATR_MULTIPLIER_SL'],
+        atr_multiplier_tp=config['ATR_MULTIPLIER_TP'],
+        min_profit_buffer=config['MIN_PROFIT_BUFFER'],
+        times=df['open_time'].to_numpy() if 'open_time' in df.columns else None,
+        strategy=strategy,
+        trend_ok=trend_ok,
+        **intrabar_prices(df, config)
+    )
+
+def print_report(result, elapsed):
+    trades = result['trades']
+    by_type = {}
+    for t in trades:
+        by_type.setdefault(t['type'], []).append(t['pnl'])
+
+    print(Style.BRIGHT + Fore.CYAN + "\n=== Backtest Results ===")
+    print(f"Trades: {len(trades)} | Win Rate: {result['win_rate']:.1f}% | Total Profit: ${result['total_pnl']:.2f}")
+    print(f"Final Cash: ${result['final_cash']:.2f} | Max Drawdown: ${result['max_drawdown']:.2f} | Open Position: {result['open_position']}")
+    for label, pnls in sorted(by_type.items()):
+        print(f"  {label}: {len(pnls)} trades | PnL: ${sum(pnls):.2f}")
+    print(Style.DIM + f"Completed in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    from config import get_config
+
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Replay historical klines through the configured strategy.")
+    parser.add_argument("path", help="CSV or Parquet kline file")
+    parser.add_argument("--initial-balance", type=float, default=1000.0)
+    parser.add_argument("--symbol", help="Symbol the klines belong to (its SYMBOL_STRATEGIES entry and SYMBOLS timeframe)")
+    args = parser.parse_args()
+
+    config = get_config()
+    started = time.perf_counter()
+    df = load_klines(args.path)
+    result = run_backtest(df, config, initial_balance=args.initial_balance, symbol=args.symbol and args.symbol.upper())
+    print_report(result, time.perf_counter() - started)
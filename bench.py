@@ -0,0 +1,401 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from colorama import init, Fore, Style
+
+from order_manager import OrderManager
+from fake_exchange import ReplayExchange, FakeAsyncClient, FakeSocketManager, load_recording, synthesize, message_price
+
+init(autoreset=True)
+
+BASELINE_FILE = "bench_baseline.json"
+
+# Metrics where a larger value is better; everything else is a cost
+HIGHER_IS_BETTER = ('ticks_per_sec',)
+
+# Modules of the bot process, cheapest dependencies first
+STARTUP_MODULES = ('instrumentation', 'indicators', 'kline_buffer', 'strategies', 'accounting', 'journal', 'config',
+                   'persistence', 'charts', 'portfolio_tracker', 'session', 'dashboard', 'order_manager',
+                   'kline_store', 'bot')
+
+# Run in a fresh interpreter: import time and peak RSS (KB) of one module. VmHWM starts
+# over at exec, unlike ru_maxrss which keeps the forking parent's peak on Linux.
+_IMPORT_PROBE = """
+import sys, time
+def peak_kb():
+    try:
+        with open('/proc/self/status') as f:
+            return int(next(l for l in f if l.startswith('VmHWM')).split()[1])
+    except (OSError, StopIteration):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+base = peak_kb()
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(elapsed, base, peak_kb(), len(sys.modules))
+"""
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_env(workdir, symbols, interval, exit_stream=''):
+    """Environment for an isolated run: no S3, no metrics logging, files under workdir."""
+    return {
+        'SYMBOLS': ",".join(f"{s}:{interval}" for s in symbols),
+        'BINANCE_TESTNET': 'True',
+        'BINANCE_TESTNET_API_KEY': 'bench',
+        'BINANCE_TESTNET_API_SECRET': 'bench',
+        'KLINE_CACHE_FILE': os.path.join(workdir, 'klines.db'),
+        'METRICS_LOG_INTERVAL': '0',
+        'METRICS_PORT': '0',
+        'EQUITY_SNAPSHOT_INTERVAL': '3600',
+        'CONFIG_RELOAD_INTERVAL': '3600',
+        'EXIT_STREAM': exit_stream or 'none'
+    }
+
+@contextlib.contextmanager
+def isolated_run(symbols, interval, exit_stream=''):
+    """Runs inside a temp dir with bench env vars and a local-only persistence pipeline."""
+    import persistence
+    from persistence import PersistencePipeline
+
+    cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    saved_pipeline = persistence._default_pipeline
+    with tempfile.TemporaryDirectory(prefix='sct_bench_') as workdir:
+        os.chdir(workdir)
+        os.environ.update(bench_env(workdir, symbols, interval, exit_stream))
+        persistence._default_pipeline = PersistencePipeline(bucket=None, log_dir=os.path.join(workdir, 'trade_logs'))
+        try:
+            yield workdir
+        finally:
+            persistence._default_pipeline.close()
+            persistence._default_pipeline = saved_pipeline
+            os.environ.clear()
+            os.environ.update(saved_env)
+            os.chdir(cwd)
+
+def load_market(args):
+    """Returns (symbols, history, messages) from a recording or a synthetic random walk."""
+    if args.recording:
+        messages = load_recording(args.recording)
+        symbols = sorted({m['data']['s'] for m in messages})
+        return symbols, {}, messages
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    history, messages = synthesize(symbols, interval=args.interval, candles=args.candles,
+                                   updates_per_candle=args.updates, seed=args.seed,
+                                   exit_stream=args.exit_stream, ticks_per_update=args.ticks)
+    return symbols, history, messages
+
+# --- Strategy + tracker path ---
+
+async def _drive(sessions_by_stream, client, messages):
+    orders = OrderManager(client)
+    for message in messages:
+        session = sessions_by_stream.get(message['stream'])
+        if session is None:
+            continue # Exit-stream messages of a recording replayed without --exit-stream
+        data = message['data']
+        price = client.exchange.last_prices[data['s']] = message_price(data)
+        if 'k' not in data:
+            # Exit stream: only the precomputed-level check, as in bot.read_exit_stream
+            signal = session.on_price(price)
+            if signal is not None:
+                await session.execute(orders, signal, price)
+            continue
+        signal, _ = session.on_kline(data['k'], data.get('E'))
+        session.tracker.record_snapshot(session.last_price)
+        await session.execute(orders, signal, session.last_price)
+
+def bench_strategy(symbols, history, messages, interval, exit_stream=''):
+    """
+    Feeds every message through SymbolSession.on_kline, the tracker snapshot and
+    order execution against the fake client, without sockets or the dashboard.
+    Returns ticks/sec, CPU time per tick and traced memory growth.
+    """
+    from config import build_config
+    from session import SymbolSession
+    from portfolio_tracker import PortfolioTracker
+
+    with isolated_run(symbols, interval, exit_stream):
+        config = build_config({})
+        exchange = ReplayExchange(messages, history=history)
+        client = FakeAsyncClient(exchange)
+
+        def build():
+            sessions = {}
+            for symbol, timeframe, quantity in config['SYMBOLS']:
+                tracker = PortfolioTracker(initial_balance=1000.0, config=config, symbol=symbol,
+                                           history_file=f"{symbol}_equity.npz")
+                session = SymbolSession(symbol, timeframe, quantity, config, tracker)
+                session.bootstrap(history.get((symbol, timeframe), []))
+                sessions[session.stream] = session
+                if session.exit_stream:
+                    sessions[session.exit_stream] = session
+            return sessions
+
+        # 1. Timed pass
+        sessions = build()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            asyncio.run(_drive(sessions, client, messages))
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+        orders = len(exchange.orders)
+
+        # 2. Memory pass: growth after a short warm-up, so one-off allocations don't count
+        sessions = build()
+        warmup = max(1, len(messages) // 10)
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(_drive(sessions, client, messages[:warmup]))
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+            asyncio.run(_drive(sessions, client, messages[warmup:]))
+            after, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    ticks = len(messages)
+    measured = max(1, ticks - warmup)
+    return {
+        'ticks': ticks,
+        'ticks_per_sec': ticks / wall if wall else 0.0,
+        'cpu_us_per_tick': cpu / ticks * 1e6 if ticks else 0.0,
+        'mem_growth_kb': (after - before) / 1024,
+        'mem_growth_bytes_per_tick': (after - before) / measured,
+        'mem_peak_kb': peak / 1024,
+        'orders': orders
+    }
+
+# --- Full bot.main loop ---
+
+def bench_end_to_end(symbols, history, messages, interval, fill_latency=0.0, timeout=600, exit_stream=''):
+    """Runs the real bot.main against the replay exchange until the recording is exhausted."""
+    import bot
+    from config import get_provider
+    from instrumentation import metrics
+
+    with isolated_run(symbols, interval, exit_stream):
+        exchange = ReplayExchange(messages, fill_latency=fill_latency, history=history)
+        get_provider().refresh()
+
+        async def run():
+            main = asyncio.create_task(bot.main(
+                client_factory=FakeAsyncClient.factory(exchange),
+                socket_manager_factory=lambda client: FakeSocketManager(client, exchange)
+            ))
+            try:
+                await asyncio.wait_for(exchange.finished.wait(), timeout)
+                # Let the workers drain what the readers already queued
+                processed = -1
+                while processed != metrics.counters.get('ticks', 0):
+                    processed = metrics.counters.get('ticks', 0)
+                    await asyncio.sleep(0.01)
+            finally:
+                main.cancel()
+                await asyncio.gather(main, return_exceptions=True)
+
+        metrics.histograms.clear()
+        metrics.counters.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            asyncio.run(run())
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+
+    ticks = metrics.counters.get('ticks', 0)
+    result = {
+        'ticks': ticks,
+        'ticks_per_sec': ticks / wall if wall else 0.0,
+        'cpu_us_per_tick': cpu / ticks * 1e6 if ticks else 0.0,
+        'coalesced_updates': metrics.counters.get('coalesced_updates', 0),
+        'fast_exits': metrics.counters.get('fast_exits', 0),
+        'orders': len(exchange.orders)
+    }
+    for stage in ('strategy', 'render', 'snapshot', 'signal_to_ack'):
+        hist = metrics.histograms.get(stage)
+        if hist is not None:
+            result[f"{stage}_p50_us"] = hist.percentile(50)
+            result[f"{stage}_p99_us"] = hist.percentile(99)
+    return result
+
+# --- Bar-close batches ---
+
+def bench_bar_batch(count=500, rounds=200, seed=0):
+    """
+    One bar-close burst of `count` symbols through the default strategy:
+    per-symbol on_bar_close() calls against one StateBatch + evaluate().
+    mismatches counts symbols where the two disagree (must be 0).
+    """
+    import random
+    from config import build_config
+    from strategies import MarketState, StateBatch, SIGNALS, load_strategy
+
+    config = build_config({})
+    strategy = load_strategy(config['STRATEGY'], config)
+    rng = random.Random(seed)
+    states = []
+    for i in range(count):
+        price = rng.uniform(10, 1000)
+        entry = price * rng.uniform(0.9, 1.1) if rng.random() < 0.3 else 0.0
+        states.append(MarketState(
+            f"SYM{i}USDT", price, rsi=rng.uniform(10, 90), ema=price * rng.uniform(0.95, 1.05),
+            atr=price * rng.uniform(0.001, 0.02), vol_confirm=rng.random() < 0.5, trend_ok=rng.random() < 0.8,
+            entry_price=entry, highest_since_entry=max(entry, price) * rng.uniform(1.0, 1.05) if entry else 0.0
+        ))
+    states[0].rsi = None # Still warming up
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        expected = [strategy.on_bar_close(state) for state in states]
+    loop = (time.perf_counter() - started) / rounds
+    started = time.perf_counter()
+    for _ in range(rounds):
+        codes = strategy.evaluate(StateBatch(states))
+    batch = (time.perf_counter() - started) / rounds
+
+    return {
+        'symbols': count,
+        'loop_us': loop * 1e6,
+        'batch_us': batch * 1e6,
+        'speedup': loop / batch if batch else 0.0,
+        'mismatches': sum(SIGNALS[code] != signal for code, signal in zip(codes, expected))
+    }
+
+# --- Startup cost ---
+
+def _python(*args):
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def import_cost(module):
+    """(seconds, base_rss_kb, rss_kb, modules_loaded) of importing `module` in a fresh interpreter."""
+    elapsed, base, rss, loaded = _python('-c', _IMPORT_PROBE.format(module=module)).stdout.split()
+    return float(elapsed), int(base), int(rss), int(loaded)
+
+def heaviest_packages(module='bot', top=10):
+    """Top-level packages by cumulative import time (ms) under `python -X importtime`."""
+    costs = {}
+    for line in _python('-X', 'importtime', '-c', f"import {module}").stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if '.' not in name: # Nested entries are already in their package's cumulative time
+            costs[name] = max(costs.get(name, 0.0), int(cumulative) / 1000)
+    return sorted(costs.items(), key=lambda item: item[1], reverse=True)[:top]
+
+def bench_startup(modules=STARTUP_MODULES):
+    """
+    Cold import cost of each module on its own (dependencies included), in a
+    fresh interpreter each time so nothing is cached between them.
+    """
+    result = {}
+    for module in modules:
+        elapsed, base, rss, loaded = import_cost(module)
+        result[f"{module}_import_ms"] = elapsed * 1000
+        result[f"{module}_rss_mb"] = (rss - base) / 1024
+        if module == modules[-1]:
+            result['python_rss_mb'] = base / 1024
+            result['modules_loaded'] = loaded
+    return result
+
+def print_packages(module='bot'):
+    print(f"{Style.BRIGHT}{Fore.CYAN}[heaviest packages under 'import {module}']")
+    for name, ms in heaviest_packages(module):
+        print(f"  {name:<26} {ms:>9.1f} ms")
+
+# --- Reporting / baselines ---
+
+def compare(results, baseline, tolerance):
+    """Prints the change against a baseline; returns the list of regressions beyond tolerance."""
+    regressions = []
+    print(f"{Style.BRIGHT}Against baseline {baseline.get('commit') or '?'} ({baseline.get('created', '?')}):")
+    for suite, values in results.items():
+        base = baseline['results'].get(suite, {})
+        for key, value in values.items():
+            old = base.get(key)
+            if not isinstance(old, (int, float)) or not old or key in ('ticks', 'orders', 'fast_exits', 'modules_loaded',
+                                                                                     'symbols', 'mismatches'):
+                continue
+            change = (value - old) / abs(old)
+            worse = -change if key in HIGHER_IS_BETTER else change
+            color = Fore.RED if worse > tolerance else (Fore.GREEN if worse < -tolerance else Fore.WHITE)
+            print(f"  {suite:<10} {key:<26} {old:>12.2f} -> {value:>12.2f} {color}{change:+.1%}")
+            if worse > tolerance and (key in HIGHER_IS_BETTER or key.startswith(('cpu_', 'mem_growth'))
+                                      or key.endswith(('_import_ms', '_rss_mb'))):
+                regressions.append(f"{suite}.{key}")
+    return regressions
+
+def print_results(results):
+    for suite, values in results.items():
+        print(f"{Style.BRIGHT}{Fore.CYAN}[{suite}]")
+        for key, value in values.items():
+            print(f"  {key:<26} {value:>12.2f}" if isinstance(value, float) else f"  {key:<26} {value:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick-to-trade benchmarks against a local replay exchange.")
+    parser.add_argument('--recording', help="JSONL of recorded combined-stream messages (default: synthetic)")
+    parser.add_argument('--symbols', type=int, default=3, help="Synthetic symbols")
+    parser.add_argument('--candles', type=int, default=300, help="Synthetic candles per symbol")
+    parser.add_argument('--updates', type=int, default=20, help="Kline updates per candle")
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--exit-stream', choices=['bookTicker', 'aggTrade'],
+                        help="Also replay (and synthesize) this stream for the sub-second exit path")
+    parser.add_argument('--ticks', type=int, default=1, help="Synthetic exit-stream ticks per kline update")
+    parser.add_argument('--fill-latency', type=float, default=0.0, help="Simulated order latency in seconds")
+    parser.add_argument('--suite', choices=['strategy', 'e2e', 'batch', 'startup', 'all'], default='all',
+                        help="batch = one bar-close burst, per-symbol vs vectorized; startup = cold import time / RSS of each bot module")
+    parser.add_argument('--batch-symbols', type=int, default=500, help="Symbols closing a bar together in the batch suite")
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE_FILE, help="Write results as the baseline")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_FILE, help="Compare against a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    results = {}
+    if args.suite in ('strategy', 'e2e', 'all'):
+        symbols, history, messages = load_market(args)
+        print(f"{Fore.YELLOW}Replaying {len(messages)} messages across {len(symbols)} symbols...")
+    if args.suite in ('strategy', 'all'):
+        results['strategy'] = bench_strategy(symbols, history, messages, args.interval, args.exit_stream)
+    if args.suite in ('e2e', 'all'):
+        results['e2e'] = bench_end_to_end(symbols, history, messages, args.interval, args.fill_latency,
+                                          exit_stream=args.exit_stream)
+    if args.suite in ('batch', 'all'):
+        results['batch'] = bench_bar_batch(args.batch_symbols, seed=args.seed)
+    if args.suite in ('startup', 'all'):
+        results['startup'] = bench_startup()
+    print_results(results)
+    if args.suite == 'startup':
+        print_packages()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'commit': git_commit(), 'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'results': results}, f, indent=2)
+        print(f"{Fore.GREEN}Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{Fore.RED}Regressions: {', '.join(regressions)}")
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
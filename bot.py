@@ -1,158 +1,376 @@
 import asyncio
 import os
-import sys
 import time
-from datetime import datetime, timedelta
 from binance import AsyncClient, BinanceSocketManager
-from config import get_config, get_sanitized_config
-from strategies import check_strategy_final
+from config import get_config, get_config_async, get_provider, get_sanitized_config
+from session import SymbolSession, BarBatcher
+from strategies import load_strategy, strategy_name
+from dashboard import Dashboard
+from order_manager import OrderManager, header_trace_config
+from accounting import filters_from_symbol_info
+from journal import StateJournal
+from kline_store import KlineStore
 from portfolio_tracker import PortfolioTracker
+from persistence import get_pipeline, close_pipeline
+from instrumentation import metrics, serve_metrics, log_metrics
 from colorama import init, Fore, Style
 
 # Initialize colorama
 init(autoreset=True)
 
-async def main():
+# Limits concurrent REST bootstraps so many symbols don't burst the request weight
+BOOTSTRAP_CONCURRENCY = 5
+
+def build_sessions(config, starting_balance, store=None, journal=None, total_symbols=None):
+    """
+    Creates one SymbolSession per configured symbol, splitting the balance evenly.
+    Symbols configured with the same strategy share one instance of it, so a
+    bar-close burst is one batch per strategy. total_symbols is the symbol
+    count across every supervisor shard (default: this one's).
+    """
+    symbols = config['SYMBOLS']
+    total_symbols = total_symbols or len(symbols)
+    allocation = starting_balance / total_symbols
+    multi = total_symbols > 1
+
+    sessions = []
+    strategies = {}
+    for symbol, timeframe, quantity in symbols:
+        name = strategy_name(config, symbol)
+        if name not in strategies:
+            strategies[name] = load_strategy(name, config)
+        tracker = PortfolioTracker(
+            initial_balance=allocation,
+            config=config,
+            symbol=symbol,
+            chart_file=f"{symbol}_{config['CHART_FILE']}" if multi else None,
+            history_file=f"{symbol}_{config['EQUITY_HISTORY_FILE']}" if multi else None
+        )
+        sessions.append(SymbolSession(symbol, timeframe, quantity, config, tracker, store, journal, strategies[name]))
+    return sessions
+
+async def bootstrap_sessions(client, sessions, store):
+    """Loads history from the local cache, fetching only missing candles, a few symbols at a time."""
+    semaphore = asyncio.Semaphore(BOOTSTRAP_CONCURRENCY)
+
+    async def bootstrap(session):
+        async with semaphore:
+            klines = await store.sync(
+                client,
+                session.symbol,
+                session.timeframe,
+                limit=session.buffer.capacity
+            )
+            # Higher timeframes: closed bars from the cache (kept current by the aggregator while running)
+            frame_klines = {}
+            for tf, frame in session.frames.items():
+                frame_klines[tf] = await store.sync(client, session.symbol, tf, limit=frame.buffer.capacity)
+            session.bootstrap(klines, frame_klines)
+
+    await asyncio.gather(*(bootstrap(s) for s in sessions))
+
+async def load_symbol_filters(client, sessions):
+    """Gives each tracker the symbol's tickSize/stepSize for fixed-point accounting."""
+    infos = await asyncio.gather(*(client.get_symbol_info(s.symbol) for s in sessions), return_exceptions=True)
+    for session, info in zip(sessions, infos):
+        filters = None if isinstance(info, Exception) else filters_from_symbol_info(info)
+        if filters:
+            session.tracker.set_filters(*filters)
+        else:
+            print(Fore.YELLOW + f"No exchange filters for {session.symbol}; using 1e-8 price/quantity steps.")
+
+def restore_sessions(journal, sessions):
+    """Resumes positions, peaks, trade stats and indicator state from the journal's snapshot + WAL."""
+    started = time.perf_counter()
+    symbols, records = journal.load()
+    by_symbol = {s.symbol: s for s in sessions}
+    for symbol, state in symbols.items():
+        if symbol in by_symbol:
+            by_symbol[symbol].restore(state)
+            journal.retained.pop(symbol)
+    for record in records:
+        session = by_symbol.get(record['s'])
+        if session is not None:
+            session.replay(record)
+    for session in sessions:
+        session.update_exit_levels()
+    if symbols or records:
+        open_positions = sum(s.in_position for s in sessions)
+        print(Fore.GREEN + f"Restored state: {len(symbols)} symbol snapshot(s) + {len(records)} journal record(s), "
+              f"{open_positions} open position(s) in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+def journal_state(journal, sessions):
+    symbols = dict(journal.retained)
+    symbols.update({s.symbol: s.state() for s in sessions})
+    return symbols
+
+async def run_journal(journal, sessions, sync_interval, snapshot_interval):
+    """Batches journal fsyncs and periodically compacts the WAL into a snapshot, off the event loop."""
+    last_snapshot = time.monotonic()
+    while True:
+        await asyncio.sleep(sync_interval)
+        journal.flush_peaks()
+        fd = journal.pending_sync() # Taken on the loop, which owns the WAL file object
+        if fd is not None:
+            await asyncio.to_thread(journal.fsync_descriptor, fd)
+        if time.monotonic() - last_snapshot >= snapshot_interval:
+            last_snapshot = time.monotonic()
+            # State is captured on the loop, in step with the WAL rotation; the write happens in a thread
+            seq = journal.rotate()
+            await asyncio.to_thread(journal.write_snapshot, journal_state(journal, sessions), seq)
+
+async def flush_kline_store(store, interval):
+    """Writes the candles the sessions queued in one SQLite transaction per interval, off the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        rows = store.take_pending()
+        if rows:
+            await asyncio.to_thread(store.write, rows)
+
+async def read_stream(bm, streams, sessions_by_stream):
+    """Reads one multiplexed websocket and only routes each kline to its symbol's inbox."""
+    async with bm.multiplex_socket(streams) as tscm:
+        while True:
+            # HEARTBEAT: Wait for data with 70s timeout (1m klines)
+            waiting = time.perf_counter_ns()
+            res = await asyncio.wait_for(tscm.recv(), timeout=70)
+            metrics.observe_ns('ws_recv', time.perf_counter_ns() - waiting)
+            if not res:
+                continue
+            if res.get('e') == 'error':
+                raise ConnectionError(res.get('m'))
+
+            session = sessions_by_stream.get(res.get('stream'))
+            if session is not None:
+                data = res['data']
+                session.enqueue(data['k'], data.get('E'))
+
+async def read_exit_stream(bm, streams, sessions_by_stream):
+    """
+    Watches bookTicker/aggTrade prices and submits a protective exit the moment a
+    precomputed stop or trailing level is crossed, instead of at the next kline.
+    """
+    async with bm.multiplex_socket(streams) as tscm:
+        while True:
+            # No heartbeat timeout: quiet symbols may not trade for minutes (the kline readers have one)
+            res = await tscm.recv()
+            if not res:
+                continue
+            if res.get('e') == 'error':
+                raise ConnectionError(res.get('m'))
+
+            session = sessions_by_stream.get(res.get('stream'))
+            if session is None or session.stop_price is None:
+                continue
+            data = res['data']
+            # bookTicker: best bid (what a market sell gets); aggTrade: trade price
+            price = float(data['b'] if 'b' in data else data['p'])
+            signal = session.on_price(price)
+            if signal is not None and session.submit_order(signal, price, time.perf_counter_ns()):
+                metrics.inc('fast_exits')
+                metrics.observe_since_event('event_to_exit', data.get('E'))
+
+async def run_strategy(session):
+    """Evaluates one symbol's kline updates; never waits on order placement or the console."""
+    tracker = session.tracker
+
+    while True:
+        kline, event_time = await session.next_update()
+        signal, rsi_value = session.on_kline(kline, event_time)
+        signal_ns = time.perf_counter_ns()
+        current_price = session.last_price
+
+        # Hand actionable signals to the execution task first
+        session.submit_order(signal, current_price, signal_ns)
+
+        # Snapshot local backup
+        tracker.record_snapshot(current_price)
+        metrics.observe_ns('snapshot', time.perf_counter_ns() - signal_ns)
+
+        # Hourly Chart Task
+        session.maybe_generate_chart()
+
+async def run_execution(orders, session):
+    """Places one symbol's orders while its strategy task keeps consuming ticks."""
+    while True:
+        signal, current_price, signal_ns = await session.next_order()
+        try:
+            await session.execute(orders, signal, current_price, signal_ns)
+        finally:
+            session.order_done()
+
+async def watch_config(sessions, interval):
+    """Hot-reloads strategy parameters from .env / Secrets Manager without restarting."""
+    provider = get_provider()
+    while True:
+        await asyncio.sleep(interval)
+        changed = await asyncio.to_thread(provider.reload_strategy_params)
+        if changed:
+            print(f"\n{Fore.YELLOW}[CONFIG] Reloaded: {', '.join(f'{k}={v}' for k, v in changed.items())}")
+            for session in sessions:
+                session.apply_config_changes(changed)
+
+async def report_backpressure(pipeline, interval=60):
+    """Warns when the persistence queue is filling up or dropping rows."""
+    last_dropped = 0
+    while True:
+        await asyncio.sleep(interval)
+        stats = pipeline.stats()
+        if stats['dropped'] > last_dropped or stats['queue_depth'] > stats['queue_capacity'] // 2:
+            print(f"\n{Fore.YELLOW}[PERSISTENCE] Queue: {stats['queue_depth']}/{stats['queue_capacity']} | Dropped: {stats['dropped']} | Pending uploads: {stats['pending_uploads']}")
+        last_dropped = stats['dropped']
+
+async def snapshot_history(sessions, interval):
+    """Periodically writes each tracker's equity history to disk off the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        for session in sessions:
+            state = session.tracker.history_state()
+            await asyncio.to_thread(session.tracker.save_history_state, state)
+
+async def main(client_factory=None, socket_manager_factory=None, link=None):
+    """
+    Runs the trading runtime. The factories default to AsyncClient.create and
+    BinanceSocketManager; fake_exchange provides local stand-ins for replays.
+    Under supervisor.py, link (coordinator.WorkerLink) limits this process to
+    its shard of SYMBOLS, shares the supervisor's rate limiter and reports
+    status to it instead of drawing a dashboard.
+    """
+    client_factory = client_factory or AsyncClient.create
+    socket_manager_factory = socket_manager_factory or BinanceSocketManager
+    store = None
+    journal = None
+    metrics_server = None
+    stopping = False
     while True: # Main Reconnection Loop
-        config = get_config()
+        config = await get_config_async()
+        if link is not None:
+            config.update(link.overrides)
+        if store is None:
+            store = KlineStore(config['KLINE_CACHE_FILE'])
+        if journal is None:
+            journal = StateJournal(config['STATE_FILE'])
+        if metrics_server is None and config['METRICS_PORT']:
+            # Lives across reconnects so scrapes keep working
+            metrics_server = asyncio.create_task(serve_metrics(config['METRICS_PORT']))
         client = None
+        tasks = []
+        sessions = []
+        batcher = None
         try:
-            # Initialize Async Client
-            client = await AsyncClient.create(
-                api_key=config["API_KEY"], 
-                api_secret=config["API_SECRET"], 
-                testnet=config["TESTNET"]
+            # Initialize Async Client (shared by every symbol)
+            client = await client_factory(
+                api_key=config["API_KEY"],
+                api_secret=config["API_SECRET"],
+                testnet=config["TESTNET"],
+                session_params={'trace_configs': [header_trace_config()]} # Per-request rate-limit headers
             )
-            
+
             print(Style.BRIGHT + Fore.CYAN + f"\n=== Binance Robust System Pro Started ===")
-            print(f"Symbol: {config['SYMBOL']} | Testnet: {config['TESTNET']}")
+            print(f"Symbols: {', '.join(f'{s}@{tf}' for s, tf, _ in config['SYMBOLS'])} | Testnet: {config['TESTNET']}")
             print(f"EMA Trend: {config['EMA_PERIOD']} | ATR Period: {config['ATR_PERIOD']}")
             print(f"SL: {config['ATR_MULTIPLIER_SL']}x ATR | TP: {config['ATR_MULTIPLIER_TP']}x ATR | Min Profit: {config['MIN_PROFIT_BUFFER']*100}%")
-
-            # Bootstrapping: Fetch enough data for EMA 200
-            print(Fore.YELLOW + f"Bootstrapping {config['EMA_PERIOD']} periods for trend analysis...")
-            klines = await client.get_klines(
-                symbol=config["SYMBOL"], 
-                interval=config["TIMEFRAME"], 
-                limit=config['EMA_PERIOD'] + 20
-            )
-            closes = [float(k[4]) for k in klines]
-            volumes = [float(k[5]) for k in klines] # New
-            print(Fore.GREEN + "Bootstrap complete.\n")
+            print(f"Strategy: {config['STRATEGY']}" + "".join(f" | {s}: {name}" for s, name in config['SYMBOL_STRATEGIES'].items()))
 
             # FETCH ACTUAL STARTING BALANCE
             res = await client.get_asset_balance(asset='USDT')
             starting_balance = float(res['free'])
             print(Fore.YELLOW + f"Initial USDT Balance: ${starting_balance:.2f}")
 
-            # Initialize Tracker
-            tracker = PortfolioTracker(initial_balance=starting_balance)
-            in_position = False
-            
-            # Dashboard state
-            spinner = ["|", "/", "-", "\\"]
-            spin_idx = 0
-            last_chart_time = datetime.now()
-
-            # WebSocket Manager
-            bm = BinanceSocketManager(client)
-            ts = bm.kline_socket(symbol=config["SYMBOL"], interval=config["TIMEFRAME"])
-
-            async with ts as tscm:
-                highest_since_entry = 0
-
-                while True:
-                    try:
-                        # HEARTBEAT: Wait for data with 70s timeout (1m klines)
-                        res = await asyncio.wait_for(tscm.recv(), timeout=70)
-                        
-                        if res:
-                            kline = res['k']
-                            is_kline_closed = kline['x']
-                            current_price = float(kline['c'])
-
-                            # Every time you receive a new price and are in a position:
-                            if in_position:
-                                highest_since_entry = max(highest_since_entry, current_price)
-                            else:
-                                highest_since_entry = 0
-
-                            if is_kline_closed:
-                                closes.append(current_price)
-                                volumes.append(float(kline['v'])) # Ensure volumes are stored too!
-                                if len(closes) > 300: # Slightly over EMA_PERIOD
-                                    closes.pop(0)
-                                    volumes.pop(0)
-                            
-                            temp_closes = closes + [current_price] if not is_kline_closed else closes
-                            temp_volumes = volumes + [float(kline['v'])] if not is_kline_closed else volumes
-                            
-                            # FINAL STRATEGY: Trend + RSI + SL/TP
-                            signal, rsi_value = check_strategy_final(
-                                temp_closes,
-                                temp_volumes,
-                                current_pos_price=float(tracker.entry_price) if in_position else 0,
-                                highest_since_entry=highest_since_entry,
-                                rsi_period=config['RSI_PERIOD'],
-                                ema_period=config['EMA_PERIOD'],
-                                atr_period=config['ATR_PERIOD'],
-                                atr_multiplier_sl=config['ATR_MULTIPLIER_SL'],
-                                atr_multiplier_tp=config['ATR_MULTIPLIER_TP'],
-                                min_profit_buffer=config['MIN_PROFIT_BUFFER'],
-                                fee_rate=config['FEE_RATE']
-                            )
-                            
-                            # Visual Feedback
-                            sig_color = Fore.GREEN if signal == "BUY" else (Fore.RED if "SELL" in signal else Fore.WHITE)
-                            rsi_color = Fore.YELLOW if rsi_value and (rsi_value > 70 or rsi_value < 30) else Fore.WHITE
-                            
-                            spin_char = spinner[spin_idx % 4]
-                            spin_idx += 1
-                            
-                            sys.stdout.write(f"\r{Fore.CYAN}{spin_char}{Style.RESET_ALL} {Style.DIM}[{time.strftime('%H:%M:%S')}] {Fore.WHITE}Price: {current_price:.2f} | {Style.DIM}RSI: {rsi_color}{rsi_value if rsi_value else 0.0:.2f} | {Style.DIM}Signal: {sig_color}{signal}{Style.RESET_ALL} | {Style.DIM}NW: ${tracker.get_net_worth(current_price):.2f}")
-                            sys.stdout.flush()
-
-                            # Snapshot local backup
-                            tracker.record_snapshot(current_price)
-
-                            # Hourly Chart Task
-                            if datetime.now() - last_chart_time > timedelta(hours=1):
-                                tracker.generate_performance_chart()
-                                last_chart_time = datetime.now()
-
-                            # --- EXECUTION ---
-                            if signal == "BUY" and not in_position:
-                                print(f"\n{Fore.GREEN}{Style.BRIGHT} [TRADE] BUY Order (Uptrend Confirmed)...")
-                                try:
-                                    await client.order_market_buy(symbol=config["SYMBOL"], quantity=config["QUANTITY"])
-                                    tracker.log_trade("BUY", current_price, config['QUANTITY'])
-                                    in_position = True
-                                except Exception as e:
-                                    print(f"{Fore.RED} [ERROR] BUY failed: {e}")
-
-                            elif "SELL" in signal and in_position:
-                                label = signal.replace("SELL_", "")
-                                print(f"\n{Fore.RED}{Style.BRIGHT} [TRADE] {signal} triggered...")
-                                try:
-                                    await client.order_market_sell(symbol=config["SYMBOL"], quantity=config["QUANTITY"])
-                                    tracker.log_trade("SELL", current_price, config['QUANTITY'], label=label)
-                                    in_position = False
-                                except Exception as e:
-                                    print(f"{Fore.RED} [ERROR] SELL failed: {e}")
-
-                    except asyncio.TimeoutError:
-                        print(f"\n{Fore.RED}[!!!] WebSocket Heartbeat Timeout. Reconnecting...")
-                        break # Exit inner loop to trigger reset
+            # Initialize per-symbol state
+            sessions = build_sessions(config, starting_balance, store, journal,
+                                      total_symbols=link.total_symbols if link is not None else None)
+            await load_symbol_filters(client, sessions)
+
+            # Bootstrapping: Fetch enough data for EMA 200
+            print(Fore.YELLOW + f"Bootstrapping {config['EMA_PERIOD']} periods for trend analysis...")
+            await bootstrap_sessions(client, sessions, store)
+            print(Fore.GREEN + "Bootstrap complete.\n")
+            restore_sessions(journal, sessions)
+
+            # Order manager: rate-limited, idempotent orders reconciled with the user data stream
+            orders = OrderManager(client, limiter=link.limiter if link is not None else None,
+                                  max_concurrent=config['ORDER_CONCURRENCY'], max_retries=config['ORDER_MAX_RETRIES'])
+            await asyncio.gather(*(s.reconcile(client, orders) for s in sessions))
+            # Baseline snapshot: every WAL record from here on applies to exactly this state
+            journal.checkpoint(journal_state(journal, sessions))
+
+            # WebSocket Manager: one manager, streams multiplexed in chunks
+            bm = socket_manager_factory(client)
+            sessions_by_stream = {s.stream: s for s in sessions}
+            streams = list(sessions_by_stream)
+            chunk = config['MAX_STREAMS_PER_SOCKET']
+
+            # Bar closes of all symbols are evaluated together, one NumPy batch per strategy
+            if config['BAR_BATCH_WINDOW'] > 0 and len(sessions) > 1:
+                batcher = BarBatcher(sessions, config['BAR_BATCH_WINDOW'])
+
+            tasks = [asyncio.create_task(run_strategy(s)) for s in sessions]
+            tasks += [asyncio.create_task(run_execution(orders, s)) for s in sessions]
+            tasks.append(asyncio.create_task(orders.read_user_stream(bm)))
+            tasks += [
+                asyncio.create_task(read_stream(bm, streams[i:i + chunk], sessions_by_stream))
+                for i in range(0, len(streams), chunk)
+            ]
+            sessions_by_exit_stream = {s.exit_stream: s for s in sessions if s.exit_stream}
+            exit_streams = list(sessions_by_exit_stream)
+            tasks += [
+                asyncio.create_task(read_exit_stream(bm, exit_streams[i:i + chunk], sessions_by_exit_stream))
+                for i in range(0, len(exit_streams), chunk)
+            ]
+            metrics.set_collector('trade_stats', lambda: [
+                row for s in sessions for row in s.tracker.stats.gauges(symbol=s.symbol)
+            ])
+            if link is None:
+                dashboard = Dashboard(sessions, config['DASHBOARD_REFRESH_HZ'], config['STATUS_INTERVAL'])
+                tasks.append(asyncio.create_task(dashboard.run()))
+            else:
+                tasks.append(asyncio.create_task(link.report_status(sessions, config['WORKER_REPORT_INTERVAL'])))
+            tasks.append(asyncio.create_task(watch_config(sessions, config['CONFIG_RELOAD_INTERVAL'])))
+            tasks.append(asyncio.create_task(report_backpressure(get_pipeline(config))))
+            tasks.append(asyncio.create_task(snapshot_history(sessions, config['EQUITY_SNAPSHOT_INTERVAL'])))
+            tasks.append(asyncio.create_task(run_journal(journal, sessions, config['STATE_SYNC_INTERVAL'], config['STATE_SNAPSHOT_INTERVAL'])))
+            tasks.append(asyncio.create_task(flush_kline_store(store, config['KLINE_FLUSH_INTERVAL'])))
+            if config['METRICS_LOG_INTERVAL']:
+                tasks.append(asyncio.create_task(log_metrics(config['METRICS_LOG_INTERVAL'])))
+
+            # Any task ending (heartbeat timeout, socket error) triggers a reconnect
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
 
+        except asyncio.TimeoutError:
+            print(f"\n{Fore.RED}[!!!] WebSocket Heartbeat Timeout. Reconnecting...")
         except Exception as e:
             print(f"\n{Fore.RED}[ERROR] Critical failure: {e}")
             await asyncio.sleep(5) # Delay before retry
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            stopping = True # Shutting down rather than reconnecting
+            raise
         finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if batcher is not None:
+                batcher.close()
+            for session in sessions:
+                session.tracker.save_history_state(session.tracker.history_state())
+            if sessions:
+                # Compact so the next start (or reconnect) restores from the snapshot alone
+                journal.checkpoint(journal_state(journal, sessions))
+            store.flush() # Candles queued since the last batch, before the next bootstrap reads the cache
             if client:
                 await client.close_connection()
+            if stopping and metrics_server is not None:
+                # Kept across reconnects; on shutdown release the port
+                metrics_server.cancel()
+                await asyncio.gather(metrics_server, return_exceptions=True)
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}System shutdown requested.")
+    finally:
+        # Flush queued trade/equity records and upload the last parts
+        close_pipeline()
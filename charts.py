@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# One background renderer for every tracker, so charts never run on the event loop
+_executor = None
+
+def get_chart_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chart')
+    return _executor
+
+def render_equity_chart(path, times, lows, highs, lasts, title='Trading Assistant Performance'):
+    """
+    Renders the downsampled equity series to a PNG with the object-oriented
+    Agg API (no pyplot global state, safe off the main thread). matplotlib is
+    imported here, so it only loads once the first chart is due.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    dates = [datetime.fromtimestamp(t) for t in times]
+
+    fig = Figure(figsize=(10, 6), facecolor='#1e1e1e')
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+
+    ax.fill_between(dates, lows, highs, color='#00ffcc', alpha=0.15, linewidth=0)
+    ax.plot(dates, lasts, label='Performance (Net Worth)', color='#00ffcc', linewidth=2)
+    ax.set_title(title, color='white', fontsize=16)
+    ax.set_xlabel('Time', color='white')
+    ax.set_ylabel('USDT Balance', color='white')
+    ax.grid(True, alpha=0.1)
+
+    # Format UI
+    ax.set_facecolor('#1e1e1e')
+    ax.tick_params(colors='white')
+    ax.legend(facecolor='#1e1e1e', labelcolor='white')
+
+    fig.savefig(path, facecolor=fig.get_facecolor())
+    return path
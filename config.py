@@ -1,14 +1,16 @@
 import os
 import json
-import boto3
-import requests
-from botocore.exceptions import ClientError
-from dotenv import load_dotenv
+import time
+import asyncio
+import threading
+from dotenv import load_dotenv, find_dotenv, dotenv_values
 
 load_dotenv()
 
 def is_running_on_ec2():
     """Detects if the code is running on an EC2 instance by checking IMDSv2."""
+    import requests
+
     try:
         # Step 1: Get Token for IMDSv2
         token_url = "http://169.254.169.254/latest/api/token"
@@ -28,6 +30,9 @@ def is_running_on_ec2():
 
 def fetch_secrets_from_aws(secret_name="sct_bot_config", region_name="us-east-1"):
     """Fetches secrets from AWS Secrets Manager."""
+    import boto3
+    from botocore.exceptions import ClientError
+
     session = boto3.session.Session()
     client = session.client(service_name='secretsmanager', region_name=region_name)
 
@@ -41,18 +46,45 @@ def fetch_secrets_from_aws(secret_name="sct_bot_config", region_name="us-east-1"
         return json.loads(get_secret_value_response['SecretString'])
     return {}
 
-def get_config():
-    # Detect environment
-    on_ec2 = is_running_on_ec2()
-    aws_secrets = {}
-    
-    if on_ec2:
-        print("[INFO] EC2 Environment detected. Fetching secrets from AWS Secrets Manager...")
-        aws_secrets = fetch_secrets_from_aws(
-            secret_name=os.getenv('AWS_SECRET_NAME', 'sct_bot_config'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
-        )
+def parse_symbols(value, default_symbol, default_timeframe, default_quantity):
+    """
+    Parses a SYMBOLS list such as "BTCUSDT,ETHUSDT:1m,SOLUSDT:5m:0.5" into
+    (symbol, timeframe, quantity) tuples. Falls back to the single SYMBOL setting.
+    """
+    entries = [e.strip() for e in (value or default_symbol).split(',') if e.strip()]
+    symbols = []
+    for entry in entries:
+        parts = entry.split(':')
+        symbol = parts[0].upper()
+        timeframe = parts[1] if len(parts) > 1 and parts[1] else default_timeframe
+        quantity = float(parts[2]) if len(parts) > 2 and parts[2] else default_quantity
+        symbols.append((symbol, timeframe, quantity))
+    return symbols
+
+def parse_timeframes(value, trend_timeframe=None):
+    """Parses a TIMEFRAMES list such as "15m,1h,4h"; the trend timeframe is always included."""
+    timeframes = [t.strip() for t in (value or '').split(',') if t.strip()]
+    if trend_timeframe and trend_timeframe not in timeframes:
+        timeframes.append(trend_timeframe)
+    return timeframes
+
+EXIT_STREAMS = {'bookticker': 'bookTicker', 'aggtrade': 'aggTrade'}
+
+def parse_exit_stream(value):
+    """Canonical exit stream name ("bookTicker" / "aggTrade"), or "" for "none"/"off"/unknown values."""
+    return EXIT_STREAMS.get((value or '').strip().lower(), '')
+
+def parse_symbol_strategies(value):
+    """Parses per-symbol strategy overrides such as "BTCUSDT=rsi_pro,ETHUSDT=my_pkg.strategies:Breakout"."""
+    strategies = {}
+    for entry in (value or '').split(','):
+        symbol, sep, name = entry.partition('=')
+        if sep and symbol.strip() and name.strip():
+            strategies[symbol.strip().upper()] = name.strip()
+    return strategies
 
+def build_config(aws_secrets):
+    """Builds the config dict from AWS secrets, then .env, then defaults."""
     # Helper to resolve value from AWS, then .env, then default
     def res(key, default=None):
         return aws_secrets.get(key) or os.getenv(key) or default
@@ -62,20 +94,33 @@ def get_config():
     if is_testnet:
         api_key = res('BINANCE_TESTNET_API_KEY')
         api_secret = res('BINANCE_TESTNET_API_SECRET')
-        print("Using Testnet API keys")
     else:
         api_key = res('BINANCE_API_KEY')
         api_secret = res('BINANCE_API_SECRET')
-        print("Using Production API keys")
+
+    symbol = res("SYMBOL", "BTCUSDT")
+    timeframe = res("TIMEFRAME", "5m")
+    quantity = float(res("QUANTITY", 0.001))
 
     return {
         "API_KEY": api_key,
         "API_SECRET": api_secret,
         "TESTNET": is_testnet,
-        "SYMBOL": res("SYMBOL", "BTCUSDT"),
-        "QUANTITY": float(res("QUANTITY", 0.001)),
+        "SYMBOL": symbol,
+        "QUANTITY": quantity,
         "FEE_RATE": float(res("FEE_RATE", 0.001)),
-        "TIMEFRAME": res("TIMEFRAME", "5m"),
+        "TIMEFRAME": timeframe,
+        # --- Multi-Symbol Runtime ---
+        "SYMBOLS": parse_symbols(res("SYMBOLS"), symbol, timeframe, quantity), # List of (symbol, timeframe, quantity)
+        "MAX_STREAMS_PER_SOCKET": int(res("MAX_STREAMS_PER_SOCKET", 200)), # Streams multiplexed over one websocket
+        "KLINE_BUFFER_SIZE": int(res("KLINE_BUFFER_SIZE", 300)), # Closed candles held in memory per symbol
+        "TIMEFRAMES": parse_timeframes(res("TIMEFRAMES"), res("TREND_TIMEFRAME")), # Higher timeframes built from each symbol's stream
+        "TREND_TIMEFRAME": res("TREND_TIMEFRAME", ""), # Only BUY above this timeframe's EMA (empty = no filter)
+        "TREND_EMA_PERIOD": int(res("TREND_EMA_PERIOD", 50)), # EMA period of the higher-timeframe engines
+        "EXIT_STREAM": parse_exit_stream(res("EXIT_STREAM", "bookTicker")), # bookTicker / aggTrade feed for sub-second stop & trailing exits (none = klines only)
+        "STRATEGY": res("STRATEGY", "trend_rsi_atr"), # Registered strategy name, or "package.module:Class" for a plugin
+        "SYMBOL_STRATEGIES": parse_symbol_strategies(res("SYMBOL_STRATEGIES")), # Per-symbol overrides of STRATEGY
+        "BAR_BATCH_WINDOW": float(res("BAR_BATCH_WINDOW", 0.05)), # Seconds to wait for every symbol's bar close before evaluating the batch (0 = per symbol)
         # --- Legacy Fallbacks ---
         "STOP_LOSS_PCT": float(res("STOP_LOSS_PCT", 0.02)),
         "TAKE_PROFIT_PCT": float(res("TAKE_PROFIT_PCT", 0.05)),
@@ -87,11 +132,151 @@ def get_config():
         "ATR_MULTIPLIER_TP": float(res("ATR_MULTIPLIER_TP", 1.5)), # How much the price must drop from its peak to trigger the Trailing Stop.
         "MIN_PROFIT_BUFFER": float(res("MIN_PROFIT_BUFFER", 0.0025)), # (0.25%) Ensures the bot doesn't exit via RSI unless fees (0.2%) are covered.
         "S3_BUCKET": res('AWS_S3_BUCKET', '032281018699-trading-bot-logs-bucket'),
-        "CSV_FILE": "trades_log.csv",
+        "TRADE_LOG_DIR": res("TRADE_LOG_DIR", "trade_logs"), # Date-partitioned Parquet trade/equity logs (see trade_log.py)
         "CHART_FILE": "performance_chart.png",
+        "EQUITY_HISTORY_FILE": res("EQUITY_HISTORY_FILE", "equity_history.npz"),
+        "EQUITY_SNAPSHOT_INTERVAL": int(res("EQUITY_SNAPSHOT_INTERVAL", 300)), # Seconds between history snapshots to disk
+        "EQUITY_LOG_INTERVAL": int(res("EQUITY_LOG_INTERVAL", 60)), # Seconds between equity rows
+        "TRADE_BUFFER_SIZE": int(res("TRADE_BUFFER_SIZE", 1000)), # Recent closed trades kept in memory/state (stats cover all of them)
+        "LOG_BATCH_SIZE": int(res("LOG_BATCH_SIZE", 50)), # Rows per flush of the persistence writer
+        "LOG_FLUSH_INTERVAL": float(res("LOG_FLUSH_INTERVAL", 5.0)), # Max seconds before buffered rows are flushed
+        "LOG_PART_INTERVAL": float(res("LOG_PART_INTERVAL", 300)), # Seconds between equity log parts and compaction scans
+        "LOG_TRADE_PART_INTERVAL": float(res("LOG_TRADE_PART_INTERVAL", 60)), # Seconds of trades buffered into one log part (or LOG_BATCH_SIZE trades)
+        "LOG_COMPACT": res("LOG_COMPACT", "True").lower() == "true", # Compact finished days of the trade log (one process per log dir)
+        "KLINE_CACHE_FILE": res("KLINE_CACHE_FILE", "klines.db"),
+        "KLINE_FLUSH_INTERVAL": float(res("KLINE_FLUSH_INTERVAL", 1.0)), # Seconds between batched kline-cache writes (off the event loop)
+        "METRICS_PORT": int(res("METRICS_PORT", 0)), # Local /metrics endpoint (0 = disabled)
+        "METRICS_LOG_INTERVAL": int(res("METRICS_LOG_INTERVAL", 300)), # Seconds between latency summaries (0 = disabled)
+        "ORDER_CONCURRENCY": int(res("ORDER_CONCURRENCY", 5)), # Orders in flight at once across all symbols
+        "ORDER_MAX_RETRIES": int(res("ORDER_MAX_RETRIES", 3)), # Retries (same newClientOrderId) for timed-out orders
+        "STATE_FILE": res("STATE_FILE", "bot_state"), # Journal prefix: <STATE_FILE>.snap + <STATE_FILE>.wal
+        "STATE_SYNC_INTERVAL": float(res("STATE_SYNC_INTERVAL", 1.0)), # Seconds between batched journal fsyncs
+        "STATE_SNAPSHOT_INTERVAL": int(res("STATE_SNAPSHOT_INTERVAL", 60)), # Seconds between journal compactions
+        "DASHBOARD_REFRESH_HZ": float(res("DASHBOARD_REFRESH_HZ", 4)), # Terminal status redraws per second
+        "STATUS_INTERVAL": int(res("STATUS_INTERVAL", 60)), # Seconds between status lines when output is not a terminal
+        "CONFIG_RELOAD_INTERVAL": int(res("CONFIG_RELOAD_INTERVAL", 30)), # Seconds between strategy parameter reload checks
+        # --- Supervisor (supervisor.py) ---
+        "WORKERS": int(res("WORKERS", 0)), # Worker processes the symbols are sharded across (0 = one per CPU core)
+        "WORKER_REPORT_INTERVAL": float(res("WORKER_REPORT_INTERVAL", 2.0)), # Seconds between worker status reports to the supervisor
+        "WORKER_MAX_BACKOFF": int(res("WORKER_MAX_BACKOFF", 60)), # Longest wait before restarting a crashed worker
+        "SUPERVISOR_SOCKET": res("SUPERVISOR_SOCKET", "sct_supervisor.sock"), # Unix socket of the shared rate limiter / status view
         "AWS_REGION": res('AWS_REGION', 'us-east-1')
     }
 
+# Strategy parameters that may change while the bot is running
+HOT_RELOAD_KEYS = (
+    "EMA_PERIOD", "RSI_PERIOD", "ATR_PERIOD",
+    "ATR_MULTIPLIER_SL", "ATR_MULTIPLIER_TP", "MIN_PROFIT_BUFFER", "FEE_RATE",
+    "STOP_LOSS_PCT", "TAKE_PROFIT_PCT"
+)
+
+class ConfigProvider:
+    """
+    Resolves the environment once and caches secrets with a TTL.
+
+    get() returns the same dict on every call, so a hot reload of strategy
+    parameters is visible to everything holding it without a restart.
+    """
+
+    def __init__(self, secrets_ttl=3600, env_file=None):
+        self.secrets_ttl = secrets_ttl
+        self.env_file = env_file or find_dotenv() or ".env"
+        self._lock = threading.Lock()
+        self._on_ec2 = None
+        self._secrets = {}
+        self._secrets_fetched_at = 0.0
+        self._env_mtime = self._read_env_mtime()
+        self._env_values = self._read_env_values() # What .env held at the last (re)load
+        self._config = None
+
+    def on_ec2(self):
+        """IMDS detection, done once per process."""
+        if self._on_ec2 is None:
+            self._on_ec2 = is_running_on_ec2()
+        return self._on_ec2
+
+    def secrets(self, force=False):
+        """Secrets Manager values, refetched only when forced or older than the TTL."""
+        if not self.on_ec2():
+            return {}
+        expired = time.monotonic() - self._secrets_fetched_at > self.secrets_ttl
+        if force or expired or not self._secrets_fetched_at:
+            print("[INFO] EC2 Environment detected. Fetching secrets from AWS Secrets Manager...")
+            self._secrets = fetch_secrets_from_aws(
+                secret_name=os.getenv('AWS_SECRET_NAME', 'sct_bot_config'),
+                region_name=os.getenv('AWS_REGION', 'us-east-1')
+            )
+            self._secrets_fetched_at = time.monotonic()
+        return self._secrets
+
+    def get(self, refresh=False):
+        """Returns the cached config, building it on first use or when refresh is requested."""
+        with self._lock:
+            if self._config is None or refresh:
+                config = build_config(self.secrets(force=refresh))
+                print("Using Testnet API keys" if config['TESTNET'] else "Using Production API keys")
+                if self._config is None:
+                    self._config = config
+                else:
+                    self._config.update(config)
+            return self._config
+
+    def refresh(self):
+        """Refetches secrets and rebuilds the config in place."""
+        return self.get(refresh=True)
+
+    async def get_async(self, refresh=False):
+        """Non-blocking get(): IMDS and Secrets Manager calls run in a worker thread."""
+        if self._config is not None and not refresh:
+            return self._config
+        return await asyncio.to_thread(self.get, refresh)
+
+    def _read_env_mtime(self):
+        try:
+            return os.path.getmtime(self.env_file)
+        except OSError:
+            return None
+
+    def _read_env_values(self):
+        return dotenv_values(self.env_file) if self._env_mtime is not None else {}
+
+    def reload_strategy_params(self):
+        """
+        Re-reads .env (and secrets, if their TTL expired) and applies changes to
+        HOT_RELOAD_KEYS in place. A key removed from .env goes back to its
+        default. Returns a dict of the keys that changed.
+        """
+        mtime = self._read_env_mtime()
+        if mtime != self._env_mtime:
+            self._env_mtime = mtime
+            values = self._read_env_values()
+            for key in HOT_RELOAD_KEYS:
+                # load_dotenv() never unsets a variable; drop the ones .env put there itself
+                if key in self._env_values and key not in values and os.environ.get(key) == self._env_values[key]:
+                    del os.environ[key]
+            self._env_values = values
+            if values:
+                load_dotenv(self.env_file, override=True)
+
+        with self._lock:
+            if self._config is None:
+                return {}
+            fresh = build_config(self.secrets())
+            changed = {k: fresh[k] for k in HOT_RELOAD_KEYS if fresh[k] != self._config[k]}
+            self._config.update(changed)
+            return changed
+
+_provider = ConfigProvider(secrets_ttl=int(os.getenv('SECRETS_TTL', 3600)))
+
+def get_provider():
+    return _provider
+
+def get_config(refresh=False):
+    return _provider.get(refresh)
+
+async def get_config_async(refresh=False):
+    return await _provider.get_async(refresh)
+
 def get_sanitized_config():
     """Returns the configuration without sensitive API keys for logging."""
     config = get_config()
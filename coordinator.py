@@ -0,0 +1,211 @@
+import asyncio
+import itertools
+import json
+import os
+import time
+from order_manager import RateLimiter
+from instrumentation import Metrics, metrics
+
+# Largest JSON line accepted over the socket (status reports carry histogram buckets)
+MAX_MESSAGE_BYTES = 4 * 1024 * 1024
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + "\n").encode()
+
+
+class Coordinator:
+    """
+    Supervisor side of the local IPC (a Unix socket, JSON lines).
+
+    - One RateLimiter for every worker: workers ask it for request weight
+      before each order/query and forward the exchange's X-MBX-* headers and
+      429/418 back-offs, so N processes share a single API-key budget.
+    - The latest status report of each worker (sessions, trade-stat gauges,
+      metrics), merged into one registry for /metrics and the status lines.
+    """
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter or RateLimiter()
+        self.reports = {} # worker index -> latest status report
+        self.metrics = Metrics()
+        self.metrics.set_collector('workers', self._gauges)
+        self.grants = 0
+        self.ready = asyncio.Event() # Set once workers can connect
+
+    async def serve(self, path):
+        if os.path.exists(path):
+            os.remove(path) # Left over by a supervisor that was killed
+        server = await asyncio.start_unix_server(self._handle, path, limit=MAX_MESSAGE_BYTES)
+        self.ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def _handle(self, reader, writer):
+        grants = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message['op']
+                if op == 'acquire':
+                    task = asyncio.create_task(self._grant(writer, message))
+                    grants.add(task)
+                    task.add_done_callback(grants.discard)
+                elif op == 'headers':
+                    self.limiter.update(message['headers'])
+                elif op == 'backoff':
+                    self.limiter.backoff(message['seconds'])
+                elif op == 'status':
+                    message['received'] = time.time()
+                    self.reports[message['worker']] = message
+                    self._merge_metrics()
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            for task in list(grants):
+                task.cancel()
+            writer.close()
+
+    async def _grant(self, writer, message):
+        # Waits here (not in the worker) when the shared window is nearly spent
+        await self.limiter.acquire(message['weight'], message['order'])
+        self.grants += 1
+        writer.write(_encode({'id': message['id']}))
+        await writer.drain()
+
+    def forget(self, worker):
+        """Drops a dead worker's report so its sessions aren't shown twice after the restart."""
+        self.reports.pop(worker, None)
+        self._merge_metrics()
+
+    def _merge_metrics(self):
+        merged = Metrics()
+        for report in self.reports.values():
+            merged.merge(report['metrics'])
+        self.metrics.counters = merged.counters
+        self.metrics.histograms = merged.histograms
+
+    def _gauges(self):
+        rows = [('rate_limit_used_weight', {}, self.limiter.used_weight),
+                ('rate_limit_orders_10s', {}, self.limiter.orders_10s)]
+        for worker, report in sorted(self.reports.items()):
+            rows.append(('worker_sessions', {'worker': worker}, len(report['sessions'])))
+            rows.extend((gauge, labels, value) for gauge, labels, value in report['gauges'])
+        return rows
+
+    def sessions(self):
+        """Every worker's session rows, ordered by symbol."""
+        return sorted((row for report in self.reports.values() for row in report['sessions']), key=lambda r: r['symbol'])
+
+
+class WorkerLink:
+    """
+    Worker side of the supervisor IPC: the shard's config overrides, the
+    shared rate limiter and status reporting. Passed to bot.main(link=...).
+    """
+
+    def __init__(self, index, overrides, total_symbols, path):
+        self.index = index
+        self.overrides = overrides # SYMBOLS of this shard, its own STATE_FILE, ...
+        self.total_symbols = total_symbols # Balance is split across every shard's symbols
+        self.path = path
+        self.limiter = SharedRateLimiter(self)
+        self.closed = asyncio.Event()
+        self._writer = None
+        self._ids = itertools.count(1)
+        self._waiters = {}
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path, limit=MAX_MESSAGE_BYTES)
+        return asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                waiter = self._waiters.pop(json.loads(line)['id'], None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(None)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.closed.set()
+            for waiter in self._waiters.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("supervisor connection lost"))
+            self._waiters = {}
+
+    def send(self, op, **fields):
+        if self.closed.is_set():
+            raise ConnectionError("supervisor connection lost")
+        fields['op'] = op
+        self._writer.write(_encode(fields))
+
+    async def request(self, op, **fields):
+        """Sends a message and waits for the supervisor's reply."""
+        request_id = next(self._ids)
+        waiter = self._waiters[request_id] = asyncio.get_running_loop().create_future()
+        self.send(op, id=request_id, **fields)
+        await waiter
+
+    async def report_status(self, sessions, interval):
+        """Pushes this shard's portfolio and metrics to the supervisor every `interval` seconds."""
+        while True:
+            self.send('status', worker=self.index, pid=os.getpid(), sessions=[{
+                'symbol': s.symbol,
+                'price': s.last_price,
+                'signal': s.last_signal,
+                'position': s.in_position,
+                'net_worth': float(s.tracker.net_worth_at(s.last_price)),
+                'pnl': float(s.tracker.stats.total.total_pnl),
+                'trades': s.tracker.stats.total.trades,
+                'wins': s.tracker.stats.total.wins
+            } for s in sessions], gauges=[
+                row for s in sessions for row in s.tracker.stats.gauges(symbol=s.symbol)
+            ], metrics=metrics.snapshot())
+            await self._writer.drain()
+            await asyncio.sleep(interval)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter of a worker process: weight is granted by the supervisor's
+    limiter, which sees every worker's requests. The local counters are kept
+    for this worker's own reporting.
+    """
+
+    def __init__(self, link):
+        super().__init__()
+        self.link = link
+
+    async def acquire(self, weight=1, order=False):
+        started = time.monotonic()
+        await self.link.request('acquire', weight=weight, order=order)
+        if time.monotonic() - started > 0.05:
+            self.waits += 1
+            metrics.inc('rate_limit_waits')
+        self._roll(time.time())
+        self.used_weight += weight
+        if order:
+            self.orders_10s += 1
+            self.orders_1d += 1
+
+    def update(self, headers):
+        super().update(headers)
+        headers = {name: value for name, value in headers.items() if name.lower().startswith('x-mbx-')}
+        if headers and not self.link.closed.is_set():
+            self.link.send('headers', headers=headers)
+
+    def backoff(self, seconds):
+        super().backoff(seconds)
+        if not self.link.closed.is_set():
+            self.link.send('backoff', seconds=seconds)
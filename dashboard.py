@@ -0,0 +1,104 @@
+import asyncio
+import sys
+import time
+from instrumentation import metrics
+from colorama import Fore, Style
+
+SPINNER = ["|", "/", "-", "\\"]
+
+
+class Dashboard:
+    """
+    Console view of every session, rendered on its own clock.
+
+    On a terminal the status line is redrawn at refresh_hz from the sessions'
+    last values, so rendering cost does not depend on the message rate. When
+    stdout is redirected (run_bot.sh -> bot_output.log) it prints one
+    structured status line per symbol every status_interval seconds instead.
+    """
+
+    def __init__(self, sessions, refresh_hz=4.0, status_interval=60, stream=None, per_line=3):
+        self.sessions = sessions
+        self.refresh_hz = refresh_hz
+        self.status_interval = status_interval
+        self.stream = stream or sys.stdout
+        self.per_line = per_line # Symbols shown at once; more than that rotate every second
+        self.frames = 0
+
+    @property
+    def interactive(self):
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+    async def run(self):
+        interval = 1.0 / self.refresh_hz if self.interactive else self.status_interval
+        while True:
+            await asyncio.sleep(interval)
+            started = time.perf_counter_ns()
+            if self.interactive:
+                self.stream.write(self.render_line())
+            else:
+                self.stream.write(self.render_status())
+            self.stream.flush()
+            self.frames += 1
+            metrics.observe_ns('render', time.perf_counter_ns() - started)
+
+    def _page(self):
+        """(sessions, page, pages) for the rotating view; one page when everything fits."""
+        if len(self.sessions) <= self.per_line:
+            return self.sessions, 0, 1
+        pages = (len(self.sessions) + self.per_line - 1) // self.per_line
+        page = int(time.time()) % pages
+        return self.sessions[page * self.per_line:(page + 1) * self.per_line], page, pages
+
+    def render_line(self):
+        """One overwritten terminal line: spinner, time, visible symbols and total net worth."""
+        spin_char = SPINNER[self.frames % 4]
+        visible, page, pages = self._page()
+        parts = []
+        for session in visible:
+            signal = session.last_signal
+            rsi_value = session.last_rsi
+            sig_color = Fore.GREEN if signal == "BUY" else (Fore.RED if "SELL" in signal else Fore.WHITE)
+            rsi_color = Fore.YELLOW if rsi_value and (rsi_value > 70 or rsi_value < 30) else Fore.WHITE
+            position = f"{Fore.GREEN}*" if session.in_position else " "
+            parts.append(
+                f"{position}{Fore.WHITE}{session.symbol} {session.last_price:.2f} {Style.DIM}RSI: {rsi_color}{rsi_value if rsi_value else 0.0:.2f} "
+                f"{sig_color}{signal}{Style.RESET_ALL}"
+            )
+        paging = f" {Style.DIM}[{page + 1}/{pages}]" if pages > 1 else ""
+        return (
+            f"\r{Fore.CYAN}{spin_char}{Style.RESET_ALL} {Style.DIM}[{time.strftime('%H:%M:%S')}]{Style.RESET_ALL} "
+            + f" {Style.DIM}|{Style.RESET_ALL} ".join(parts)
+            + f"{paging} {Style.DIM}| NW: ${self.total_net_worth():.2f} | PnL: ${self.total_pnl():+.2f}\x1b[K"
+        )
+
+    def render_status(self):
+        """Plain key=value lines for log files, one per symbol plus a total."""
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        lines = []
+        trades = wins = 0
+        for session in self.sessions:
+            rsi_value = session.last_rsi
+            stats = session.tracker.stats
+            trades += stats.total.trades
+            wins += stats.total.wins
+            lines.append(
+                f"[STATUS] {stamp} symbol={session.symbol} price={session.last_price:.8g} "
+                f"rsi={rsi_value if rsi_value else 0.0:.2f} signal={session.last_signal} "
+                f"position={int(session.in_position)} nw={session.tracker.net_worth_at(session.last_price):.2f} "
+                f"trades={stats.total.trades} win_rate={stats.total.win_rate:.1f} pnl={stats.total.total_pnl:.2f} "
+                f"max_dd={stats.max_drawdown:.2f} sharpe={stats.sharpe:.2f} sortino={stats.sortino:.2f} "
+                f"coalesced={session.coalesced}"
+            )
+        win_rate = wins / trades * 100 if trades else 0.0
+        lines.append(f"[STATUS] {stamp} symbol=ALL nw={self.total_net_worth():.2f} trades={trades} "
+                     f"win_rate={win_rate:.1f} pnl={self.total_pnl():.2f} ticks={metrics.counters.get('ticks', 0)}")
+        return "\n".join(lines) + "\n"
+
+    def total_pnl(self):
+        """Realized PnL of every session, from the running stats (no trade history walk)."""
+        return sum(float(s.tracker.stats.total.total_pnl) for s in self.sessions)
+
+    def total_net_worth(self):
+        return sum(float(s.tracker.net_worth_at(s.last_price)) for s in self.sessions)
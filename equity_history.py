@@ -0,0 +1,168 @@
+import os
+import numpy as np
+
+
+class EquitySeries:
+    """
+    Net-worth series downsampled incrementally into fixed time buckets.
+
+    Each bucket keeps min/max/last, so charting cost depends only on the
+    number of buckets (capacity), not on how many ticks were recorded or how
+    long the bot has been running. Storage is a preallocated ring.
+    """
+
+    def __init__(self, bucket_seconds=60, capacity=1440):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.size = 0
+        self._head = 0 # Slot of the current (most recent) bucket
+        self.times = np.zeros(capacity, dtype=np.float64) # Bucket start, epoch seconds
+        self.lows = np.zeros(capacity, dtype=np.float64)
+        self.highs = np.zeros(capacity, dtype=np.float64)
+        self.lasts = np.zeros(capacity, dtype=np.float64)
+
+    def record(self, timestamp, value, low=None, high=None):
+        """Folds one observation (or a pre-aggregated low/high/last) into its bucket."""
+        low = value if low is None else low
+        high = value if high is None else high
+        bucket = timestamp - (timestamp % self.bucket_seconds)
+
+        if self.size and self.times[self._head] == bucket:
+            i = self._head
+            if low < self.lows[i]:
+                self.lows[i] = low
+            if high > self.highs[i]:
+                self.highs[i] = high
+            self.lasts[i] = value
+            return False
+
+        if self.size and bucket < self.times[self._head]:
+            return False # Out of order, ignore
+
+        i = (self._head + 1) % self.capacity if self.size else 0
+        self._head = i
+        self.times[i] = bucket
+        self.lows[i] = low
+        self.highs[i] = high
+        self.lasts[i] = value
+        if self.size < self.capacity:
+            self.size += 1
+        return True
+
+    def _order(self):
+        start = (self._head - self.size + 1) % self.capacity
+        return (np.arange(self.size) + start) % self.capacity
+
+    def snapshot(self):
+        """Returns (times, lows, highs, lasts) oldest first, as copies safe to hand to another thread."""
+        order = self._order()
+        return self.times[order], self.lows[order], self.highs[order], self.lasts[order]
+
+    def last(self):
+        return self.lasts[self._head] if self.size else None
+
+    def state(self, prefix):
+        """Ordered copies of the buckets, keyed for np.savez."""
+        times, lows, highs, lasts = self.snapshot()
+        return {f"{prefix}_times": times, f"{prefix}_lows": lows, f"{prefix}_highs": highs, f"{prefix}_lasts": lasts}
+
+    def load_state(self, state, prefix):
+        """Refills the ring from state(); keeps the newest buckets if capacity shrank."""
+        times = state[f"{prefix}_times"][-self.capacity:]
+        n = len(times)
+        self.times[:n] = times
+        self.lows[:n] = state[f"{prefix}_lows"][-n:] if n else []
+        self.highs[:n] = state[f"{prefix}_highs"][-n:] if n else []
+        self.lasts[:n] = state[f"{prefix}_lasts"][-n:] if n else []
+        self.size = n
+        self._head = n - 1 if n else 0
+
+    def __len__(self):
+        return self.size
+
+
+class EquityHistory:
+    """
+    Tiered net-worth history in constant memory.
+
+    - raw: the latest individual ticks (covers minutes on a busy stream)
+    - minute: 1m min/max/last bars for a day
+    - hour: 1h min/max/last bars for months
+
+    Every tier is a fixed-size ring, so a long-running instance keeps
+    meaningful history without growing. save()/restore() persist all tiers.
+    """
+
+    def __init__(self, raw_capacity=4096, minute_capacity=1440, hour_capacity=24 * 90):
+        self.raw_capacity = raw_capacity
+        self.raw_size = 0
+        self._raw_head = 0 # Next write position
+        self.raw_times = np.zeros(raw_capacity, dtype=np.float64)
+        self.raw_values = np.zeros(raw_capacity, dtype=np.float64)
+        self.minute = EquitySeries(bucket_seconds=60, capacity=minute_capacity)
+        self.hour = EquitySeries(bucket_seconds=3600, capacity=hour_capacity)
+
+    def record(self, timestamp, value):
+        i = self._raw_head
+        self.raw_times[i] = timestamp
+        self.raw_values[i] = value
+        self._raw_head = (i + 1) % self.raw_capacity
+        if self.raw_size < self.raw_capacity:
+            self.raw_size += 1
+
+        self.minute.record(timestamp, value)
+        self.hour.record(timestamp, value)
+
+    def raw(self):
+        """Returns (times, values) of the raw ticks, oldest first."""
+        order = (np.arange(self.raw_size) + self._raw_head - self.raw_size) % self.raw_capacity
+        return self.raw_times[order], self.raw_values[order]
+
+    def last(self):
+        if not self.raw_size:
+            return None
+        return self.raw_values[(self._raw_head - 1) % self.raw_capacity]
+
+    def state(self):
+        """Copies of every tier, cheap enough to take on the event loop and write elsewhere."""
+        raw_times, raw_values = self.raw()
+        state = {'raw_times': raw_times, 'raw_values': raw_values}
+        state.update(self.minute.state('minute'))
+        state.update(self.hour.state('hour'))
+        return state
+
+    @staticmethod
+    def write_state(state, path):
+        """Atomically writes a state() dict to disk."""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp, path)
+
+    def save(self, path):
+        self.write_state(self.state(), path)
+
+    def restore(self, path):
+        """Loads a saved history; returns False if there is none."""
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as state:
+            raw_times = state['raw_times'][-self.raw_capacity:]
+            n = len(raw_times)
+            self.raw_times[:n] = raw_times
+            self.raw_values[:n] = state['raw_values'][-n:] if n else []
+            self.raw_size = n
+            self._raw_head = n % self.raw_capacity
+            self.minute.load_state(state, 'minute')
+            self.hour.load_state(state, 'hour')
+        return True
+
+    def __len__(self):
+        return self.raw_size
+
+    @property
+    def nbytes(self):
+        series = (self.minute, self.hour)
+        return self.raw_times.nbytes + self.raw_values.nbytes + sum(
+            s.times.nbytes + s.lows.nbytes + s.highs.nbytes + s.lasts.nbytes for s in series
+        )
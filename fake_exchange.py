@@ -0,0 +1,337 @@
+import asyncio
+import json
+import math
+import random
+import time
+from binance.exceptions import BinanceAPIException
+from binance.helpers import interval_to_milliseconds
+
+
+class ReplayExchange:
+    """
+    Shared state of the local stand-in for Binance: the recorded websocket
+    messages, the last traded price per symbol, balances and placed orders.
+    """
+
+    def __init__(self, messages, speed=0.0, fill_latency=0.0, balances=None, history=None, fee_rate=0.001,
+                 lost_responses=0):
+        self.messages = messages
+        self.speed = speed # 0 = as fast as possible, 1 = real time, 10 = 10x
+        self.fill_latency = fill_latency
+        self.fee_rate = fee_rate # Commission charged in the quote asset
+        self.lost_responses = lost_responses # Next N orders are filled but their response times out
+        self.user_events = asyncio.Queue() # executionReports for the user data stream
+        self.used_weight = 0
+        self.balances = {'USDT': 10000.0} if balances is None else dict(balances)
+        self.history = history or {} # (symbol, interval) -> REST klines
+        self.last_prices = {}
+        self.orders = []
+        self.delivered = 0
+        self.sockets = [] # Market-data sockets opened so far
+        self.cursor = 0 # Next message in recorded order; sockets wait for their turn
+        self.finished = asyncio.Event() # Set once every socket has replayed its streams
+        self._order_id = 0
+        self._turn = asyncio.Event()
+
+    def next_order_id(self):
+        self._order_id += 1
+        return self._order_id
+
+    async def wait_turn(self, index):
+        """Waits until every subscribed message before `index` was delivered, so streams stay in recorded order."""
+        while self.cursor < index:
+            await self._turn.wait()
+
+    def advance(self, index):
+        """Marks the messages before `index` delivered, skipping streams no socket subscribed to."""
+        subscribed = set().union(*(socket.streams for socket in self.sockets))
+        while index < len(self.messages) and self.messages[index]['stream'] not in subscribed:
+            index += 1
+        self.cursor = max(self.cursor, index)
+        turn, self._turn = self._turn, asyncio.Event()
+        turn.set()
+
+
+class FakeResponse:
+    """Carries the rate-limit headers the way aiohttp responses do on AsyncClient.response."""
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeAsyncClient:
+    """Stand-in for binance.AsyncClient backed by a ReplayExchange."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.response = None
+
+    def _weigh(self, weight, order=False):
+        self.exchange.used_weight += weight
+        headers = {'X-MBX-USED-WEIGHT-1M': str(self.exchange.used_weight)}
+        if order:
+            headers['X-MBX-ORDER-COUNT-10S'] = str(len(self.exchange.orders))
+        self.response = FakeResponse(headers)
+
+    @classmethod
+    def factory(cls, exchange):
+        """Returns an AsyncClient.create-compatible coroutine function."""
+        async def create(**kwargs):
+            return cls(exchange)
+        return create
+
+    async def get_klines(self, symbol, interval, startTime=None, limit=500, **kwargs):
+        klines = self.exchange.history.get((symbol, interval), [])
+        if startTime is not None:
+            klines = [k for k in klines if k[0] >= startTime]
+            return klines[:limit]
+        return klines[-limit:]
+
+    async def get_symbol_info(self, symbol, **kwargs):
+        self._weigh(20)
+        return {'symbol': symbol, 'status': 'TRADING', 'filters': [
+            {'filterType': 'PRICE_FILTER', 'tickSize': '0.00000001'},
+            {'filterType': 'LOT_SIZE', 'stepSize': '0.00001000'}
+        ]}
+
+    async def get_asset_balance(self, asset, **kwargs):
+        return {'asset': asset, 'free': f"{self.exchange.balances.get(asset, 0.0):.8f}", 'locked': "0.00000000"}
+
+    async def order_market_buy(self, symbol, quantity, **kwargs):
+        return await self._fill(symbol, 'BUY', quantity, **kwargs)
+
+    async def order_market_sell(self, symbol, quantity, **kwargs):
+        return await self._fill(symbol, 'SELL', quantity, **kwargs)
+
+    async def get_open_orders(self, symbol=None, **kwargs):
+        self._weigh(6 if symbol else 80)
+        return [] # Market orders never rest on the book
+
+    async def get_order(self, symbol, origClientOrderId=None, **kwargs):
+        self._weigh(4)
+        for order in self.exchange.orders:
+            if order['symbol'] == symbol and order['clientOrderId'] == origClientOrderId:
+                return {k: v for k, v in order.items() if k != 'fills'}
+        raise BinanceAPIException(FakeResponse({}), 400, json.dumps({'code': -2013, 'msg': 'Order does not exist.'}))
+
+    async def _fill(self, symbol, side, quantity, **kwargs):
+        if self.exchange.fill_latency:
+            await asyncio.sleep(self.exchange.fill_latency)
+        client_order_id = kwargs.get('newClientOrderId')
+        if client_order_id and any(o['clientOrderId'] == client_order_id for o in self.exchange.orders):
+            raise BinanceAPIException(FakeResponse({}), 400, json.dumps({'code': -2010, 'msg': 'Duplicate order sent.'}))
+        self._weigh(1, order=True)
+        price = self.exchange.last_prices.get(symbol, 0.0)
+        quantity = float(quantity)
+        commission = price * quantity * self.exchange.fee_rate
+        balances = self.exchange.balances
+        base = symbol[:-len('USDT')]
+        if side == 'SELL' and quantity > balances.get(base, 0.0) + 1e-12:
+            raise BinanceAPIException(FakeResponse({}), 400, json.dumps(
+                {'code': -2010, 'msg': 'Account has insufficient balance for requested action.'}))
+        sign = 1 if side == 'BUY' else -1
+        balances[base] = balances.get(base, 0.0) + sign * quantity
+        balances['USDT'] = balances.get('USDT', 0.0) - sign * price * quantity - commission
+        order = {
+            'symbol': symbol,
+            'orderId': self.exchange.next_order_id(),
+            'clientOrderId': kwargs.get('newClientOrderId', f"fake-{self.exchange._order_id}"),
+            'transactTime': int(time.time() * 1000),
+            'side': side,
+            'type': 'MARKET',
+            'status': 'FILLED',
+            'executedQty': f"{quantity:.8f}",
+            'cummulativeQuoteQty': f"{price * quantity:.8f}",
+            'fills': [{'price': f"{price:.8f}", 'qty': f"{quantity:.8f}", 'commission': f"{commission:.8f}", 'commissionAsset': 'USDT'}]
+        }
+        self.exchange.orders.append(order)
+        self.exchange.user_events.put_nowait({
+            'e': 'executionReport', 'E': order['transactTime'], 's': symbol, 'c': order['clientOrderId'],
+            'S': side, 'o': 'MARKET', 'i': order['orderId'], 'x': 'TRADE', 'X': 'FILLED',
+            'l': f"{quantity:.8f}", 'L': f"{price:.8f}", 'z': f"{quantity:.8f}", 'Z': f"{price * quantity:.8f}",
+            'n': f"{commission:.8f}", 'N': 'USDT'
+        })
+        self.exchange.user_events.put_nowait({
+            'e': 'outboundAccountPosition', 'E': order['transactTime'],
+            'B': [{'a': asset, 'f': f"{balances[asset]:.8f}", 'l': "0.00000000"} for asset in (base, 'USDT')]
+        })
+        if self.exchange.lost_responses:
+            self.exchange.lost_responses -= 1
+            raise asyncio.TimeoutError()
+        return order
+
+    async def close_connection(self):
+        pass
+
+
+def message_price(data):
+    """Price a market order would get after this message: kline close, best bid (bookTicker) or trade price (aggTrade)."""
+    if 'k' in data:
+        return float(data['k']['c'])
+    return float(data['b'] if 'b' in data else data['p'])
+
+
+class FakeSocket:
+    """Async context manager replaying the recorded messages of the subscribed streams."""
+
+    def __init__(self, exchange, streams):
+        self.exchange = exchange
+        self.streams = set(streams)
+        self._index = 0
+        self._last_event_time = None
+        self.exhausted = False
+        exchange.sockets.append(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def recv(self):
+        messages = self.exchange.messages
+        while self._index < len(messages):
+            message = messages[self._index]
+            if message['stream'] not in self.streams:
+                self._index += 1
+                continue
+            await self.exchange.wait_turn(self._index)
+            self._index += 1
+
+            data = message['data']
+            event_time = data.get('E')
+            if self.exchange.speed and self._last_event_time is not None and event_time:
+                await asyncio.sleep(max(0.0, (event_time - self._last_event_time) / 1000.0 / self.exchange.speed))
+            else:
+                await asyncio.sleep(0) # Yield like a real socket would
+            self._last_event_time = event_time
+
+            self.exchange.last_prices[data['s']] = message_price(data)
+            self.exchange.delivered += 1
+            self.exchange.advance(self._index)
+            return message
+
+        # Replay finished: signal it once every socket is done, and idle like a quiet socket
+        self.exhausted = True
+        self.exchange.advance(len(messages))
+        if all(socket.exhausted for socket in self.exchange.sockets):
+            self.exchange.finished.set()
+        await asyncio.Event().wait()
+
+
+class FakeUserSocket:
+    """Replays the exchange's executionReports as the user data stream."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def recv(self):
+        return await self.exchange.user_events.get()
+
+
+class FakeSocketManager:
+    """Stand-in for binance.BinanceSocketManager."""
+
+    def __init__(self, client, exchange=None):
+        self.exchange = exchange or client.exchange
+
+    def multiplex_socket(self, streams):
+        return FakeSocket(self.exchange, streams)
+
+    def kline_socket(self, symbol, interval):
+        return FakeSocket(self.exchange, [f"{symbol.lower()}@kline_{interval}"])
+
+    def user_socket(self):
+        return FakeUserSocket(self.exchange)
+
+
+def load_recording(path):
+    """Loads combined-stream messages ({"stream": ..., "data": ...}) from a JSONL file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+async def record_stream(socket_manager, streams, path, duration):
+    """Records live combined-stream messages to JSONL for later replay."""
+    deadline = time.monotonic() + duration
+    async with socket_manager.multiplex_socket(streams) as socket:
+        with open(path, 'w') as f:
+            while time.monotonic() < deadline:
+                message = await asyncio.wait_for(socket.recv(), timeout=max(0.1, deadline - time.monotonic()))
+                f.write(json.dumps(message) + "\n")
+
+def synthesize(symbols, interval='1m', candles=500, updates_per_candle=20, history=300,
+               start_price=100.0, volatility=0.002, seed=0, start_ms=None, exit_stream=None, ticks_per_update=1):
+    """
+    Generates a random-walk market: REST history per symbol plus interleaved
+    websocket kline messages (several open updates, then the closed candle).
+    History ends at start_ms (default: the current candle), so it looks
+    recent to the kline cache. With exit_stream ('bookTicker' or 'aggTrade'),
+    the walk takes ticks_per_update steps between kline updates and each step
+    is also sent on that stream. Returns (history, messages) for ReplayExchange.
+    """
+    rng = random.Random(seed)
+    interval_ms = interval_to_milliseconds(interval)
+    if start_ms is None:
+        now_ms = int(time.time() * 1000)
+        start_ms = now_ms - now_ms % interval_ms
+    history_klines = {}
+    prices = {}
+
+    for symbol in symbols:
+        price = start_price * (1 + rng.random())
+        rows = []
+        for i in range(history):
+            open_time = start_ms + (i - history) * interval_ms
+            o = price
+            price *= math.exp(rng.gauss(0, volatility * math.sqrt(updates_per_candle)))
+            h, l = max(o, price) * (1 + rng.random() * volatility), min(o, price) * (1 - rng.random() * volatility)
+            rows.append([open_time, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{price:.8f}", f"{rng.random() * 10:.8f}",
+                         open_time + interval_ms - 1, "0", 0, "0", "0", "0"])
+        history_klines[(symbol, interval)] = rows
+        prices[symbol] = price
+
+    messages = []
+    for c in range(candles):
+        open_time = start_ms + c * interval_ms
+        state = {s: {'o': prices[s], 'h': prices[s], 'l': prices[s], 'v': 0.0} for s in symbols}
+        for u in range(updates_per_candle):
+            event_time = open_time + (u + 1) * interval_ms // updates_per_candle - (1 if u == updates_per_candle - 1 else 0)
+            closed = u == updates_per_candle - 1
+            for symbol in symbols:
+                st = state[symbol]
+                for t in range(ticks_per_update):
+                    prices[symbol] *= math.exp(rng.gauss(0, volatility / math.sqrt(ticks_per_update)))
+                    price = prices[symbol]
+                    st['h'] = max(st['h'], price)
+                    st['l'] = min(st['l'], price)
+                    if exit_stream:
+                        tick_time = event_time - (ticks_per_update - 1 - t) * interval_ms // updates_per_candle // ticks_per_update
+                        messages.append(_exit_message(symbol, exit_stream, price, tick_time, len(messages)))
+                st['v'] += rng.random() * 0.5
+                messages.append({
+                    'stream': f"{symbol.lower()}@kline_{interval}",
+                    'data': {
+                        'e': 'kline', 'E': event_time, 's': symbol,
+                        'k': {
+                            't': open_time, 'T': open_time + interval_ms - 1, 's': symbol, 'i': interval,
+                            'o': f"{st['o']:.8f}", 'c': f"{price:.8f}", 'h': f"{st['h']:.8f}", 'l': f"{st['l']:.8f}",
+                            'v': f"{st['v']:.8f}", 'x': closed
+                        }
+                    }
+                })
+    return history_klines, messages
+
+def _exit_message(symbol, kind, price, event_time, update_id):
+    stream = f"{symbol.lower()}@{kind}"
+    if kind == 'bookTicker':
+        bid, ask = price * (1 - 0.00005), price * (1 + 0.00005)
+        return {'stream': stream, 'data': {'u': update_id, 's': symbol, 'b': f"{bid:.8f}", 'B': "1.00000000",
+                                           'a': f"{ask:.8f}", 'A': "1.00000000"}}
+    return {'stream': stream, 'data': {'e': 'aggTrade', 'E': event_time, 's': symbol, 'a': update_id, 'p': f"{price:.8f}",
+                                       'q': "0.10000000", 'T': event_time, 'm': False}}
@@ -0,0 +1,178 @@
+import math
+from collections import deque
+
+
+class IndicatorEngine:
+    """
+    Keeps Wilder RSI, EMA, ATR and the volume SMA as running state.
+
+    Closed candles are committed with update(); the still-open candle is
+    evaluated with peek(), which reads the committed state without mutating
+    or copying anything. Both are O(1) per call.
+
+    ATR averages the true range when high/low are given and falls back to the
+    absolute close-to-close move otherwise.
+    """
+
+    def __init__(self, rsi_period=14, ema_period=200, atr_period=14, volume_period=10):
+        self.rsi_period = rsi_period
+        self.ema_period = ema_period
+        self.atr_period = atr_period
+        self.volume_period = volume_period
+
+        self.rsi_alpha = 1.0 / rsi_period          # ewm(com=period - 1)
+        self.ema_alpha = 2.0 / (ema_period + 1)    # ewm(span=period)
+
+        self.count = 0
+        self.last_close = None
+        self.avg_gain = None
+        self.avg_loss = None
+        self.ema = None
+
+        # Small fixed windows for the rolling means
+        self._atr_window = deque(maxlen=atr_period)
+        self._atr_sum = 0.0
+        self._vol_window = deque(maxlen=volume_period)
+        self._vol_sum = 0.0
+
+    def update(self, close, volume=0.0, high=None, low=None):
+        """Commits a closed candle into the running state."""
+        close = float(close)
+        volume = float(volume)
+
+        if self.last_close is not None:
+            delta = close - self.last_close
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+            if self.avg_gain is None:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                self.avg_gain += self.rsi_alpha * (gain - self.avg_gain)
+                self.avg_loss += self.rsi_alpha * (loss - self.avg_loss)
+
+            self._atr_window.append(_true_range(close, high, low, self.last_close))
+            self._atr_sum = math.fsum(self._atr_window)
+
+        self.ema = close if self.ema is None else self.ema + self.ema_alpha * (close - self.ema)
+
+        self._vol_window.append(volume)
+        self._vol_sum = math.fsum(self._vol_window)
+
+        self.last_close = close
+        self.count += 1
+
+    def metrics(self):
+        """Returns (rsi, ema, atr, vol_confirm) for the committed candles only."""
+        if self.count < self.ema_period:
+            return None, None, None, None
+
+        rsi = _rsi(self.avg_gain, self.avg_loss)
+        atr = self._atr_sum / self.atr_period if len(self._atr_window) == self.atr_period else float('nan')
+
+        vol_confirm = True
+        if len(self._vol_window) == self.volume_period:
+            vol_confirm = self._vol_window[-1] > self._vol_sum / self.volume_period
+
+        return rsi, self.ema, atr, vol_confirm
+
+    def peek(self, price, volume=0.0, high=None, low=None):
+        """Returns (rsi, ema, atr, vol_confirm) as if the open candle closed at `price`."""
+        if self.count + 1 < self.ema_period or self.last_close is None:
+            return None, None, None, None
+
+        price = float(price)
+        volume = float(volume)
+
+        # 1. RSI
+        delta = price - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if self.avg_gain is None:
+            avg_gain, avg_loss = gain, loss
+        else:
+            avg_gain = self.avg_gain + self.rsi_alpha * (gain - self.avg_gain)
+            avg_loss = self.avg_loss + self.rsi_alpha * (loss - self.avg_loss)
+        rsi = _rsi(avg_gain, avg_loss)
+
+        # 2. EMA
+        ema = self.ema + self.ema_alpha * (price - self.ema)
+
+        # 3. ATR (swap the oldest window entry for the new one)
+        true_range = _true_range(price, high, low, self.last_close)
+        atr_len = len(self._atr_window)
+        if atr_len == self.atr_period:
+            atr = (self._atr_sum - self._atr_window[0] + true_range) / self.atr_period
+        elif atr_len + 1 == self.atr_period:
+            atr = (self._atr_sum + true_range) / self.atr_period
+        else:
+            atr = float('nan')
+
+        # 4. Volume confirmation
+        vol_confirm = True
+        vol_len = len(self._vol_window)
+        if vol_len == self.volume_period:
+            vol_confirm = volume > (self._vol_sum - self._vol_window[0] + volume) / self.volume_period
+        elif vol_len + 1 == self.volume_period:
+            vol_confirm = volume > (self._vol_sum + volume) / self.volume_period
+
+        return rsi, ema, atr, vol_confirm
+
+    def evaluate(self, price, volume=0.0, is_closed=False, high=None, low=None):
+        """Commits the candle if it is closed, otherwise peeks at it."""
+        if is_closed:
+            self.update(price, volume, high, low)
+            return self.metrics()
+        return self.peek(price, volume, high, low)
+
+    def state(self):
+        """Running state as plain values, for the state journal."""
+        return {
+            'periods': [self.rsi_period, self.ema_period, self.atr_period, self.volume_period],
+            'count': self.count,
+            'last_close': self.last_close,
+            'avg_gain': self.avg_gain,
+            'avg_loss': self.avg_loss,
+            'ema': self.ema,
+            'atr_window': list(self._atr_window),
+            'vol_window': list(self._vol_window)
+        }
+
+    def load_state(self, state):
+        """Restores state(); returns False (and changes nothing) if the periods differ."""
+        if state['periods'] != [self.rsi_period, self.ema_period, self.atr_period, self.volume_period]:
+            return False
+        self.count = state['count']
+        self.last_close = state['last_close']
+        self.avg_gain = state['avg_gain']
+        self.avg_loss = state['avg_loss']
+        self.ema = state['ema']
+        self._atr_window = deque(state['atr_window'], maxlen=self.atr_period)
+        self._atr_sum = math.fsum(self._atr_window)
+        self._vol_window = deque(state['vol_window'], maxlen=self.volume_period)
+        self._vol_sum = math.fsum(self._vol_window)
+        return True
+
+    def seed(self, buffer, start=0):
+        """Replays the closed candles held in a KlineBuffer (from index `start`) into the engine."""
+        closes = buffer.window('close')
+        volumes = buffer.window('volume')
+        highs = buffer.window('high')
+        lows = buffer.window('low')
+        for i in range(start, len(closes)):
+            self.update(closes[i], volumes[i], highs[i], lows[i])
+
+
+def _true_range(close, high, low, prev_close):
+    if high is None or low is None:
+        return abs(close - prev_close)
+    high = float(high)
+    low = float(low)
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+def _rsi(avg_gain, avg_loss):
+    if avg_gain is None:
+        return float('nan')
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else float('nan')
+    return 100 - (100 / (1 + avg_gain / avg_loss))
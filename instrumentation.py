@@ -0,0 +1,191 @@
+import asyncio
+import math
+import time
+from colorama import Style
+
+# Log-scale buckets: 8 per power of two, from 1 microsecond to ~18 minutes
+_BUCKETS_PER_OCTAVE = 8
+_OCTAVES = 30
+_NUM_BUCKETS = _BUCKETS_PER_OCTAVE * _OCTAVES + 1
+
+
+class LatencyHistogram:
+    """
+    Fixed-size log-bucketed latency histogram.
+
+    record() is O(1) and allocation-free; percentiles are read from the bucket
+    counts (about 9% relative error), which is cheap enough to leave on in
+    production.
+    """
+
+    def __init__(self):
+        self.counts = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total_us = 0.0
+        self.max_us = 0.0
+
+    def record(self, micros):
+        if micros < 1.0:
+            index = 0
+        else:
+            index = min(int(math.log2(micros) * _BUCKETS_PER_OCTAVE) + 1, _NUM_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total_us += micros
+        if micros > self.max_us:
+            self.max_us = micros
+
+    def merge(self, counts, count, total_us, max_us):
+        """Adds another histogram's buckets (e.g. from a worker process)."""
+        for index, n in enumerate(counts):
+            self.counts[index] += n
+        self.count += count
+        self.total_us += total_us
+        if max_us > self.max_us:
+            self.max_us = max_us
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, in microseconds."""
+        if not self.count:
+            return 0.0
+        target = p / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                upper = 2 ** (index / _BUCKETS_PER_OCTAVE) if index else 1.0
+                return min(upper, self.max_us)
+        return self.max_us
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50_us': self.percentile(50),
+            'p99_us': self.percentile(99),
+            'max_us': self.max_us,
+            'mean_us': self.total_us / self.count if self.count else 0.0
+        }
+
+
+class Metrics:
+    """Registry of per-stage latency histograms, simple counters and gauge collectors."""
+
+    def __init__(self, prefix="sct"):
+        self.prefix = prefix
+        self.histograms = {}
+        self.counters = {}
+        self.collectors = {} # name -> callable returning (gauge, labels, value) rows, read at scrape time
+        self.started = time.time()
+
+    def observe_ns(self, stage, elapsed_ns):
+        """Records a duration measured with time.perf_counter_ns()."""
+        self.observe_us(stage, elapsed_ns / 1000.0)
+
+    def observe_us(self, stage, micros):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            hist = self.histograms[stage] = LatencyHistogram()
+        hist.record(micros)
+
+    def observe_since_event(self, stage, event_time_ms):
+        """Records wall-clock latency since an exchange timestamp (kline E/T, transactTime)."""
+        if event_time_ms:
+            self.observe_us(stage, max(0.0, time.time() * 1000.0 - event_time_ms) * 1000.0)
+
+    def inc(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_collector(self, name, collect):
+        """Registers (or replaces) a gauge source evaluated on every scrape."""
+        self.collectors[name] = collect
+
+    def summary(self):
+        return {stage: hist.summary() for stage, hist in self.histograms.items()}
+
+    def snapshot(self):
+        """Counters and raw histogram buckets as plain values, to aggregate registries across processes."""
+        return {
+            'counters': dict(self.counters),
+            'histograms': {stage: [h.counts, h.count, h.total_us, h.max_us] for stage, h in self.histograms.items()}
+        }
+
+    def merge(self, snapshot):
+        for name, value in snapshot['counters'].items():
+            self.inc(name, value)
+        for stage, values in snapshot['histograms'].items():
+            hist = self.histograms.get(stage)
+            if hist is None:
+                hist = self.histograms[stage] = LatencyHistogram()
+            hist.merge(*values)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format."""
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines = [f"# TYPE {name} summary"]
+        for stage, hist in sorted(self.histograms.items()):
+            for quantile in (50, 99):
+                lines.append(f'{name}{{stage="{stage}",quantile="{quantile / 100}"}} {hist.percentile(quantile) / 1e6:.9f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {hist.total_us / 1e6:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+        lines.append(f"# TYPE {name}_max gauge")
+        for stage, hist in sorted(self.histograms.items()):
+            lines.append(f'{name}_max{{stage="{stage}"}} {hist.max_us / 1e6:.9f}')
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        gauges = {}
+        for collect in list(self.collectors.values()):
+            for gauge, labels, value in collect():
+                gauges.setdefault(gauge, []).append((labels, value))
+        for gauge, rows in sorted(gauges.items()):
+            lines.append(f"# TYPE {self.prefix}_{gauge} gauge")
+            for labels, value in rows:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{self.prefix}_{gauge}{{{label_text}}} {value:.6g}")
+        lines.append(f"# TYPE {self.prefix}_uptime_seconds gauge")
+        lines.append(f"{self.prefix}_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """One line per stage, for the periodic log summary."""
+        rows = []
+        for stage, s in sorted(self.summary().items()):
+            rows.append(f"  {stage:<18} n={s['count']:<8} p50={s['p50_us']:>10.1f}us p99={s['p99_us']:>10.1f}us max={s['max_us']:>10.1f}us")
+        return "\n".join(rows)
+
+
+# Process-wide registry used by the runtime
+metrics = Metrics()
+
+
+async def serve_metrics(port, registry=None, host="127.0.0.1"):
+    """Serves the registry on a local Prometheus-style /metrics endpoint."""
+    registry = registry or metrics
+
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = registry.render_prometheus().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def log_metrics(interval, registry=None):
+    """Prints a per-stage latency summary every `interval` seconds."""
+    registry = registry or metrics
+    while True:
+        await asyncio.sleep(interval)
+        if registry.histograms:
+            print(f"\n{Style.DIM}[METRICS] Stage latency since start:{Style.RESET_ALL}\n{registry.format_summary()}")
@@ -0,0 +1,138 @@
+import json
+import os
+import time
+
+
+class StateJournal:
+    """
+    Crash-safe runtime state: a compact JSON snapshot plus an append-only
+    write-ahead log (WAL) of everything that changed since.
+
+    - append() writes one JSON line and flushes it to the OS, so a killed
+      process loses nothing; sync() fsyncs the batch (once per interval, off
+      the event loop via pending_sync() + fsync_descriptor()) to survive
+      power loss too.
+    - checkpoint() rotates the WAL and writes a new snapshot atomically;
+      records are sequence-numbered, so a crash at any point replays cleanly.
+    - load() returns the snapshot and the records written after it.
+    """
+
+    def __init__(self, path='bot_state'):
+        self.snapshot_path = f"{path}.snap"
+        self.wal_path = f"{path}.wal"
+        self.rotated_path = f"{path}.wal.1"
+        self.seq = 0
+        self.records_since_checkpoint = 0
+        self.retained = {} # Snapshot state of symbols not running now, carried into the next snapshot
+        self._handle = None
+        self._dirty = False
+        self._peaks = {}
+
+    def load(self):
+        """Returns (symbols, records): per-symbol snapshot state and the newer WAL records."""
+        symbols, snapshot_seq = {}, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            symbols, snapshot_seq = snapshot['symbols'], snapshot['seq']
+        self.retained = dict(symbols)
+
+        records = []
+        for path in (self.rotated_path, self.wal_path):
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break # Torn last line from a crash mid-write
+                    if record['seq'] > snapshot_seq:
+                        records.append(record)
+
+        self.seq = max([snapshot_seq] + [r['seq'] for r in records])
+        return symbols, records
+
+    def append(self, kind, symbol, **fields):
+        self.seq += 1
+        record = {'seq': self.seq, 't': kind, 's': symbol}
+        record.update(fields)
+        if self._handle is None:
+            self._handle = open(self.wal_path, 'a')
+        self._handle.write(json.dumps(record, separators=(',', ':')) + "\n")
+        self._handle.flush()
+        self._dirty = True
+        self.records_since_checkpoint += 1
+
+    def note_peak(self, symbol, price):
+        """Peak prices change on many ticks; only the latest per symbol is written at the next sync."""
+        self._peaks[symbol] = price
+
+    def flush_peaks(self):
+        peaks, self._peaks = self._peaks, {}
+        for symbol, price in peaks.items():
+            self.append('peak', symbol, price=price)
+
+    def pending_sync(self):
+        """
+        On the thread that appends: a duplicate descriptor of the WAL covering
+        everything appended so far, or None if nothing changed since the last
+        call. The worker thread only fsyncs that copy (fsync_descriptor), so it
+        never touches the file object the loop keeps writing to, and a rotate()
+        or close() meanwhile can't invalidate it.
+        """
+        if not self._dirty or self._handle is None:
+            return None
+        self._dirty = False
+        return os.dup(self._handle.fileno())
+
+    @staticmethod
+    def fsync_descriptor(fd):
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def sync(self):
+        """fsyncs everything appended since the last call, on the calling thread."""
+        fd = self.pending_sync()
+        if fd is not None:
+            self.fsync_descriptor(fd)
+
+    def rotate(self):
+        """Starts a new WAL; returns the sequence number the next snapshot covers."""
+        self.flush_peaks()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if os.path.exists(self.wal_path):
+            if os.path.exists(self.rotated_path):
+                # A previous checkpoint never finished: keep its records too
+                with open(self.wal_path) as src, open(self.rotated_path, 'a') as dst:
+                    dst.write(src.read())
+                os.remove(self.wal_path)
+            else:
+                os.replace(self.wal_path, self.rotated_path)
+        self._dirty = False
+        self.records_since_checkpoint = 0
+        return self.seq
+
+    def write_snapshot(self, symbols, seq):
+        """Atomically writes the snapshot for `seq` and drops the rotated WAL it covers."""
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'seq': seq, 'written': time.time(), 'symbols': symbols}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def checkpoint(self, symbols):
+        """Synchronous rotate + snapshot, for shutdown."""
+        self.write_snapshot(symbols, self.rotate())
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
@@ -0,0 +1,92 @@
+import numpy as np
+
+FIELDS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+_INDEX = {name: i for i, name in enumerate(FIELDS)}
+
+
+class KlineBuffer:
+    """
+    Fixed-capacity OHLCV ring buffer backed by preallocated float64 arrays.
+
+    Every closed candle is written twice (at i and i + capacity) so the most
+    recent n candles are always one contiguous slice: window() returns a view,
+    never a copy. The still-open candle lives in its own slot and is
+    overwritten in place on every tick.
+    """
+
+    def __init__(self, capacity=300):
+        self.capacity = capacity
+        self.size = 0
+        self._head = 0 # Next write position in [0, capacity)
+        self._data = np.zeros((len(FIELDS), 2 * capacity), dtype=np.float64)
+        self._open = np.zeros(len(FIELDS), dtype=np.float64)
+        self.has_open = False
+
+    def append(self, open_time, open_, high, low, close, volume):
+        """Commits a closed candle, evicting the oldest one when full."""
+        data = self._data
+        i = self._head
+        j = i + self.capacity
+        data[0, i] = data[0, j] = open_time
+        data[1, i] = data[1, j] = open_
+        data[2, i] = data[2, j] = high
+        data[3, i] = data[3, j] = low
+        data[4, i] = data[4, j] = close
+        data[5, i] = data[5, j] = volume
+
+        self._head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        self.has_open = False
+
+    def set_open(self, open_time, open_, high, low, close, volume):
+        """Overwrites the open-candle slot in place."""
+        slot = self._open
+        slot[0] = open_time
+        slot[1] = open_
+        slot[2] = high
+        slot[3] = low
+        slot[4] = close
+        slot[5] = volume
+        self.has_open = True
+
+    def update(self, kline):
+        """Applies a websocket kline payload (closed or still open)."""
+        values = (kline['t'], float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v']))
+        if kline['x']:
+            self.append(*values)
+        else:
+            self.set_open(*values)
+
+    def extend(self, klines):
+        """Appends REST klines ([open_time, open, high, low, close, volume, ...])."""
+        for k in klines:
+            self.append(k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+
+    def window(self, field, n=None):
+        """Zero-copy view of the last n closed values of a field, oldest first."""
+        n = self.size if n is None else min(n, self.size)
+        end = self._head + self.capacity
+        return self._data[_INDEX[field], end - n:end]
+
+    def last(self, field):
+        """Most recent closed value of a field."""
+        if self.size == 0:
+            return None
+        return self._data[_INDEX[field], self._head + self.capacity - 1]
+
+    def open_value(self, field):
+        """Value of a field in the open-candle slot, or None if there is no open candle."""
+        return self._open[_INDEX[field]] if self.has_open else None
+
+    @property
+    def last_open_time(self):
+        value = self.last('open_time')
+        return int(value) if value is not None else None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes + self._open.nbytes
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from binance.helpers import interval_to_milliseconds
+
+# Binance returns at most 1000 klines per REST call
+MAX_KLINES_PER_REQUEST = 1000
+
+
+class KlineStore:
+    """
+    On-disk cache of closed klines, keyed by (symbol, interval, open_time).
+
+    Startup and reconnects load history from here and only fetch the range
+    missing since the last stored candle, instead of re-downloading it.
+    Candles closing while running are only queued (append/queue); flush() or
+    write() stores them in one transaction, from a worker thread.
+    """
+
+    def __init__(self, path="klines.db"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock() # One user of the connection at a time
+        self._pending = [] # Rows queued on the event loop, not written yet
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS klines (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                open_time INTEGER NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, interval, open_time)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def last_open_time(self, symbol, interval):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT MAX(open_time) FROM klines WHERE symbol = ? AND interval = ?",
+                (symbol, interval)
+            ).fetchone()
+        return row[0]
+
+    def load(self, symbol, interval, limit):
+        """Returns the latest `limit` klines as [open_time, open, high, low, close, volume], oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT open_time, open, high, low, close, volume FROM klines "
+                "WHERE symbol = ? AND interval = ? ORDER BY open_time DESC LIMIT ?",
+                (symbol, interval, limit)
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    @staticmethod
+    def _rows(symbol, interval, klines):
+        return [(symbol, interval, int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in klines]
+
+    def save(self, symbol, interval, klines):
+        """Stores REST-style klines ([open_time, open, high, low, close, volume, ...]) right away."""
+        self.write(self._rows(symbol, interval, klines))
+
+    def queue(self, symbol, interval, klines):
+        """Queues REST-style klines for the next flush(); no I/O."""
+        self._pending.extend(self._rows(symbol, interval, klines))
+
+    def append(self, symbol, interval, kline):
+        """Queues one closed websocket kline payload for the next flush()."""
+        self.queue(symbol, interval, [(kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'])])
+
+    def take_pending(self):
+        """The queued rows, handed over for write() (call on the thread that queues)."""
+        rows, self._pending = self._pending, []
+        return rows
+
+    def write(self, rows):
+        """Inserts rows in one transaction; safe to run in a worker thread."""
+        if not rows:
+            return
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO klines VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def flush(self):
+        """Writes everything queued, on the calling thread."""
+        self.write(self.take_pending())
+
+    async def sync(self, client, symbol, interval, limit):
+        """
+        Fetches only the closed klines missing since the last stored one
+        (never more than `limit` back) and returns the latest `limit` from disk.
+        """
+        interval_ms = interval_to_milliseconds(interval)
+        now_ms = int(time.time() * 1000)
+        window_start = now_ms - (limit + 1) * interval_ms
+
+        last = self.last_open_time(symbol, interval)
+        start = window_start if last is None else max(last + interval_ms, window_start)
+
+        while start + interval_ms <= now_ms:
+            klines = await client.get_klines(
+                symbol=symbol,
+                interval=interval,
+                startTime=start,
+                limit=MAX_KLINES_PER_REQUEST
+            )
+            # Only closed candles go to disk; the open one arrives over the websocket
+            closed = [k for k in klines if int(k[6]) < now_ms]
+            if closed:
+                self.save(symbol, interval, closed)
+            if len(klines) < MAX_KLINES_PER_REQUEST:
+                break
+            start = int(klines[-1][0]) + interval_ms
+
+        return self.load(symbol, interval, limit)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
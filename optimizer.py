@@ -0,0 +1,238 @@
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import shared_memory
+import numpy as np
+from backtest import (
+    load_klines, compute_rsi, compute_ema, compute_atr, compute_volume_confirm, compute_trend_ok, base_timeframe, simulate
+)
+from strategies import load_strategy, strategy_name
+from colorama import init, Fore, Style
+
+# Knobs exposed by config.get_config that the sweep can tune
+INDICATOR_PARAMS = ('EMA_PERIOD', 'RSI_PERIOD', 'ATR_PERIOD')
+EXIT_PARAMS = ('ATR_MULTIPLIER_SL', 'ATR_MULTIPLIER_TP', 'MIN_PROFIT_BUFFER')
+INT_PARAMS = ('EMA_PERIOD', 'RSI_PERIOD', 'ATR_PERIOD')
+
+# Per-worker view of the shared price arrays
+_worker = {}
+
+def _init_worker(shm_names, length, settings):
+    """Attaches the worker to the shared price arrays instead of unpickling them per task."""
+    for key, name in shm_names.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _worker[f"{key}_shm"] = shm # Keep the mapping alive
+        _worker[key] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+    _worker['settings'] = settings
+
+# Indicators that depend on a single parameter are cached per worker and
+# reused by every combination that shares that period.
+@lru_cache(maxsize=32)
+def _cached_rsi(period):
+    return compute_rsi(_worker['close'], period)
+
+@lru_cache(maxsize=32)
+def _cached_ema(period):
+    return compute_ema(_worker['close'], period)
+
+@lru_cache(maxsize=32)
+def _cached_atr(period):
+    return compute_atr(_worker['close'], period, _worker.get('high'), _worker.get('low'))
+
+@lru_cache(maxsize=1)
+def _cached_volume_confirm():
+    return compute_volume_confirm(_worker['volume'])
+
+def _evaluate_group(indicator_params, exit_combos):
+    """Evaluates every exit-parameter combination for one set of indicator periods."""
+    settings = _worker['settings']
+    closes = _worker['close']
+    indicators = {
+        'rsi': _cached_rsi(indicator_params['RSI_PERIOD']),
+        'ema': _cached_ema(indicator_params['EMA_PERIOD']),
+        'atr': _cached_atr(indicator_params['ATR_PERIOD']),
+        'vol_confirm': _cached_volume_confirm(),
+        'ready': np.arange(len(closes)) >= indicator_params['EMA_PERIOD'] - 1
+    }
+
+    trend = _worker.get('trend')
+    trend_ok = trend > 0 if trend is not None else None
+    # Stops crossed inside bars, as run_backtest models them with an exit stream
+    intrabar = {}
+    if settings['CONFIG'].get('EXIT_STREAM') and _worker.get('high') is not None and _worker.get('low') is not None:
+        intrabar = {'highs': _worker['high'], 'lows': _worker['low']}
+
+    results = []
+    for exit_params in exit_combos:
+        # The live strategy, reading this combination's parameters from its config
+        strategy = load_strategy(settings['STRATEGY'], dict(settings['CONFIG'], **indicator_params, **exit_params))
+        result = simulate(
+            closes, indicators,
+            quantity=settings['QUANTITY'],
+            initial_balance=settings['INITIAL_BALANCE'],
+            fee_rate=settings['FEE_RATE'],
+            strategy=strategy,
+            trend_ok=trend_ok,
+            **intrabar
+        )
+        results.append({
+            **indicator_params,
+            **exit_params,
+            'pnl': float(result['total_pnl']),
+            'max_drawdown': float(result['max_drawdown']),
+            'trades': len(result['trades']),
+            'win_rate': result['win_rate']
+        })
+    return results
+
+def parse_param(spec):
+    """
+    Parses NAME=v1,v2,... (choices) or NAME=low:high (range, random search only).
+    """
+    name, values = spec.split('=', 1)
+    name = name.strip().upper()
+    cast = int if name in INT_PARAMS else float
+    if ':' in values:
+        low, high = values.split(':', 1)
+        return name, (cast(low), cast(high))
+    return name, [cast(v) for v in values.split(',')]
+
+def grid_combinations(space):
+    """Every combination of the choice lists in `space`."""
+    names = list(space)
+    for values in itertools.product(*(space[n] for n in names)):
+        yield dict(zip(names, values))
+
+def random_combinations(space, samples, seed=None):
+    """Samples combinations from choice lists and (low, high) ranges."""
+    rng = random.Random(seed)
+    seen = set()
+    for _ in range(samples * 10):
+        if len(seen) >= samples:
+            break
+        combo = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                low, high = values
+                combo[name] = rng.randint(low, high) if name in INT_PARAMS else round(rng.uniform(low, high), 4)
+            else:
+                combo[name] = rng.choice(values)
+        key = tuple(sorted(combo.items()))
+        if key not in seen:
+            seen.add(key)
+            yield combo
+
+def group_by_indicators(combos):
+    """Groups combinations by indicator periods so each worker task computes them once."""
+    groups = {}
+    for combo in combos:
+        key = tuple(combo[p] for p in INDICATOR_PARAMS)
+        groups.setdefault(key, []).append({p: combo[p] for p in EXIT_PARAMS})
+    return [(dict(zip(INDICATOR_PARAMS, key)), exits) for key, exits in groups.items()]
+
+def rank_results(results):
+    """Highest PnL first, then smallest drawdown, then most trades."""
+    return sorted(results, key=lambda r: (-r['pnl'], r['max_drawdown'], -r['trades']))
+
+def run_sweep(df, combos, settings, workers=None, trend_ok=None):
+    """
+    Evaluates combinations across a process pool sharing the price arrays (and
+    the trend filter, which no swept parameter changes).
+    """
+    length = len(df)
+    blocks = {}
+    columns = {key: df[key].to_numpy(dtype=np.float64) for key in ('close', 'volume', 'high', 'low') if key in df.columns}
+    if trend_ok is not None:
+        columns['trend'] = trend_ok.astype(np.float64)
+    try:
+        for key, values in columns.items():
+            data = np.ascontiguousarray(values)
+            shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+            np.ndarray(data.shape, dtype=np.float64, buffer=shm.buf)[:] = data
+            blocks[key] = shm
+
+        tasks = group_by_indicators(combos)
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=({k: b.name for k, b in blocks.items()}, length, settings)
+        ) as pool:
+            futures = [pool.submit(_evaluate_group, params, exits) for params, exits in tasks]
+            for future in futures:
+                results.extend(future.result())
+        return rank_results(results)
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+
+def write_results(results, path):
+    if not results:
+        return
+    with open(path, mode='w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+if __name__ == "__main__":
+    from config import get_config
+
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Sweep ATR/RSI/EMA parameters over historical klines.")
+    parser.add_argument("path", help="CSV or Parquet kline file")
+    parser.add_argument("--param", action="append", default=[],
+                        help="NAME=v1,v2 for choices or NAME=low:high for a range (random search)")
+    parser.add_argument("--random", type=int, default=0, help="Number of random samples instead of a full grid")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--initial-balance", type=float, default=1000.0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default=None, help="Write the ranked results to a CSV file")
+    parser.add_argument("--symbol", help="Symbol the klines belong to (its SYMBOL_STRATEGIES entry and SYMBOLS timeframe)")
+    args = parser.parse_args()
+
+    config = get_config()
+    space = {name: [config[name]] for name in INDICATOR_PARAMS + EXIT_PARAMS}
+    space.update(parse_param(spec) for spec in args.param)
+
+    if args.random:
+        combos = list(random_combinations(space, args.random, args.seed))
+    else:
+        ranges = [name for name, values in space.items() if isinstance(values, tuple)]
+        if ranges:
+            parser.error(f"Ranges need --random: {', '.join(ranges)}")
+        combos = list(grid_combinations(space))
+
+    symbol = args.symbol and args.symbol.upper()
+    name = strategy_name(config, symbol)
+    settings = {
+        'QUANTITY': config['QUANTITY'],
+        'FEE_RATE': config['FEE_RATE'],
+        'INITIAL_BALANCE': args.initial_balance,
+        'STRATEGY': name,
+        'CONFIG': {k: v for k, v in config.items() if k not in ('API_KEY', 'API_SECRET')}
+    }
+
+    started = time.perf_counter()
+    df = load_klines(args.path)
+    trend_ok = None
+    if 'trend' in load_strategy(name, config).requires:
+        trend_ok = compute_trend_ok(df, config, base_timeframe(config, symbol))
+    print(Fore.YELLOW + f"Evaluating {len(combos)} combinations of {name} on {len(df)} klines...")
+    results = run_sweep(df, combos, settings, workers=args.workers, trend_ok=trend_ok)
+    elapsed = time.perf_counter() - started
+
+    print(Style.BRIGHT + Fore.CYAN + "\n=== Top Parameter Sets ===")
+    for rank, r in enumerate(results[:args.top], 1):
+        params = " ".join(f"{name}={r[name]}" for name in INDICATOR_PARAMS + EXIT_PARAMS)
+        print(f"{rank:>3}. PnL: ${r['pnl']:.2f} | DD: ${r['max_drawdown']:.2f} | Trades: {r['trades']} | Win: {r['win_rate']:.1f}% | {params}")
+    print(Style.DIM + f"Completed in {elapsed:.2f}s")
+
+    if args.out:
+        write_results(results, args.out)
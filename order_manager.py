@@ -0,0 +1,357 @@
+import asyncio
+import contextvars
+import itertools
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from aiohttp import ClientError, TraceConfig
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from instrumentation import metrics
+
+# Request weights of the endpoints used here (Binance spot)
+ORDER_WEIGHT = 1
+QUERY_ORDER_WEIGHT = 4
+ACCOUNT_WEIGHT = 20
+
+# Error codes meaning "the exchange may or may not have the order"
+UNKNOWN_STATUS_CODES = (-1007, -1006) # Timeout waiting for backend / unexpected response
+
+TERMINAL_STATUSES = ('FILLED', 'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH')
+
+# Headers of the HTTP responses received by the current task (see header_trace_config)
+_response_headers = contextvars.ContextVar('response_headers', default=None)
+
+def header_trace_config():
+    """
+    aiohttp TraceConfig handing each response's headers to the task that made
+    the request. AsyncClient keeps only the last response of the shared
+    session, which concurrent requests overwrite; pass this through
+    session_params={'trace_configs': [...]} so OrderManager reads its own.
+    """
+    async def on_request_end(session, context, params):
+        sink = _response_headers.get()
+        if sink is not None:
+            sink.append(params.response.headers)
+
+    trace = TraceConfig()
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+class OrderError(Exception):
+    """An order was rejected or its outcome could not be established."""
+
+
+class RateLimiter:
+    """
+    Request-weight and order-count budget for one API key.
+
+    Requests reserve their cost locally before being sent; the
+    X-MBX-USED-WEIGHT-1M / X-MBX-ORDER-COUNT-* response headers then replace
+    the local estimate with the exchange's own count. When a window is nearly
+    spent, acquire() waits for it to roll over instead of risking a 429/418.
+    """
+
+    def __init__(self, weight_limit=6000, orders_per_10s=100, orders_per_day=200000, headroom=0.9):
+        self.weight_limit = weight_limit
+        self.orders_per_10s = orders_per_10s
+        self.orders_per_day = orders_per_day
+        self.headroom = headroom # Fraction of each limit we allow ourselves
+        self.used_weight = 0
+        self.orders_10s = 0
+        self.orders_1d = 0
+        self.blocked_until = 0.0 # Set from Retry-After on 429/418
+        self.waits = 0
+        self._windows = (None, None, None) # Current (minute, 10s, day) window ids
+
+    def _roll(self, now):
+        minute, ten, day = int(now // 60), int(now // 10), int(now // 86400)
+        last_minute, last_ten, last_day = self._windows
+        if minute != last_minute:
+            self.used_weight = 0
+        if ten != last_ten:
+            self.orders_10s = 0
+        if day != last_day:
+            self.orders_1d = 0
+        self._windows = (minute, ten, day)
+
+    def delay(self, weight=1, order=False, now=None):
+        """Seconds to wait before a request of this cost fits the budget (0 = send now)."""
+        now = time.time() if now is None else now
+        self._roll(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.used_weight + weight > self.weight_limit * self.headroom:
+            return 60 - now % 60
+        if order and self.orders_10s + 1 > self.orders_per_10s * self.headroom:
+            return 10 - now % 10
+        if order and self.orders_1d + 1 > self.orders_per_day * self.headroom:
+            return 86400 - now % 86400
+        return 0.0
+
+    async def acquire(self, weight=1, order=False):
+        while True:
+            wait = self.delay(weight, order)
+            if wait <= 0:
+                break
+            self.waits += 1
+            metrics.inc('rate_limit_waits')
+            await asyncio.sleep(wait)
+        self.used_weight += weight
+        if order:
+            self.orders_10s += 1
+            self.orders_1d += 1
+
+    def update(self, headers):
+        """Syncs the counters with the exchange's view from response headers."""
+        for name, value in headers.items():
+            name = name.lower()
+            if name == 'x-mbx-used-weight-1m':
+                self.used_weight = int(value)
+            elif name == 'x-mbx-order-count-10s':
+                self.orders_10s = int(value)
+            elif name == 'x-mbx-order-count-1d':
+                self.orders_1d = int(value)
+
+    def backoff(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+
+class OrderManager:
+    """
+    Places market orders for every symbol over the client's pooled session.
+
+    - Requests are scheduled through a RateLimiter fed by response headers.
+    - Each order gets a newClientOrderId up front; retries reuse it and check
+      the exchange first, so a timed-out order is never placed twice.
+    - Fills are built from the actual executions (price, quantity,
+      commission), from the order response or, when it has none, from
+      user-data-stream execution reports (on_execution_report).
+    """
+
+    def __init__(self, client, limiter=None, max_concurrent=5, max_retries=3, retry_delay=0.5,
+                 fill_timeout=5.0, quote_asset='USDT'):
+        self.client = client
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.fill_timeout = fill_timeout
+        self.quote_asset = quote_asset
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._ids = itertools.count(1)
+        self._prefix = f"sct{int(time.time()) % 1000000}"
+        self._reports = OrderedDict() # client order id -> fills aggregated from execution reports
+        self._waiters = {} # client order id -> Future resolved on a terminal execution report
+        self.balances = {} # asset -> free balance (Decimal), from outboundAccountPosition events
+
+    def base_asset(self, symbol):
+        return symbol[:-len(self.quote_asset)] if symbol.endswith(self.quote_asset) else symbol
+
+    def new_client_order_id(self, symbol):
+        return f"{self._prefix}-{symbol}-{next(self._ids)}"[:36]
+
+    # --- Requests ---
+
+    async def _request(self, weight, order, method, **params):
+        await self.limiter.acquire(weight, order)
+        sink = []
+        token = _response_headers.set(sink)
+        try:
+            return await method(**params)
+        except BinanceAPIException as e:
+            if e.status_code in (418, 429):
+                retry_after = e.response.headers.get('Retry-After') if e.response is not None else None
+                self.limiter.backoff(float(retry_after) if retry_after else 60.0)
+            raise
+        finally:
+            _response_headers.reset(token)
+            if sink:
+                self.limiter.update(sink[-1])
+            else:
+                # Client without header_trace_config: only safe while requests don't overlap
+                response = getattr(self.client, 'response', None)
+                if response is not None:
+                    self.limiter.update(response.headers)
+
+    async def _find_order(self, symbol, client_order_id):
+        """The order as the exchange knows it, or None if it was never accepted."""
+        try:
+            return await self._request(QUERY_ORDER_WEIGHT, False, self.client.get_order,
+                                       symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == -2013: # Order does not exist
+                return None
+            raise
+
+    async def free_balance(self, asset):
+        """Free balance of an asset: the user data stream's latest value, else an account query."""
+        balance = self.balances.get(asset)
+        if balance is None:
+            response = await self._request(ACCOUNT_WEIGHT, False, self.client.get_asset_balance, asset=asset)
+            balance = Decimal(response['free']) if response else Decimal('0')
+        return balance
+
+    async def market_order(self, symbol, side, quantity, client_order_id=None):
+        """
+        Places a market order and returns its fill:
+        {'symbol', 'side', 'client_order_id', 'order_id', 'status', 'quantity',
+         'price', 'quote', 'commission', 'commission_asset', 'fee'}.
+        'fee' is the commission in quote currency, or None when it was paid in
+        another asset (e.g. BNB). Raises OrderError if nothing was filled.
+        """
+        client_order_id = client_order_id or self.new_client_order_id(symbol)
+        method = self.client.order_market_buy if side == 'BUY' else self.client.order_market_sell
+        # Cached balances are stale until the account update for this order arrives
+        self.balances.pop(self.base_asset(symbol), None)
+        self.balances.pop(self.quote_asset, None)
+
+        async with self._semaphore:
+            response = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._request(ORDER_WEIGHT, True, method, symbol=symbol, quantity=quantity,
+                                                   newClientOrderId=client_order_id, newOrderRespType='FULL')
+                    break
+                except BinanceAPIException as e:
+                    if e.status_code in (418, 429):
+                        pass # Rejected for rate limits; the limiter waits out the ban before the retry
+                    elif e.code in UNKNOWN_STATUS_CODES or e.status_code >= 500 or 'Duplicate' in (e.message or ''):
+                        response = await self._find_order(symbol, client_order_id)
+                        if response is not None:
+                            break
+                    else:
+                        raise OrderError(f"{symbol} {side} rejected: {e}") from e
+                    error = e
+                except (BinanceRequestException, ClientError, asyncio.TimeoutError, OSError) as e:
+                    # Transport failure: the request may still have reached the exchange
+                    try:
+                        response = await self._find_order(symbol, client_order_id)
+                    except (BinanceAPIException, BinanceRequestException, ClientError, asyncio.TimeoutError, OSError):
+                        response = None
+                    if response is not None:
+                        break
+                    error = e
+
+                metrics.inc('order_retries')
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+            else:
+                raise OrderError(f"{symbol} {side} failed after {self.max_retries + 1} attempts: {error}")
+
+        return await self._reconcile(symbol, side, client_order_id, response)
+
+    async def recover(self, symbol, side, client_order_id):
+        """
+        Looks up an order whose outcome was lost (e.g. a crash mid-request).
+        Returns its fill, or None if the exchange never filled it. Commission
+        isn't in the order query, so the fill's fee is None (FEE_RATE estimate).
+        """
+        response = await self._find_order(symbol, client_order_id)
+        if response is None or Decimal(response.get('executedQty', '0')) <= 0:
+            return None
+        return self._fill(symbol, side, client_order_id, response.get('orderId'), response.get('status'),
+                          Decimal(response['executedQty']), Decimal(response['cummulativeQuoteQty']), Decimal('0'), None)
+
+    # --- Fill reconciliation ---
+
+    async def _reconcile(self, symbol, side, client_order_id, response):
+        fill = None
+        if response.get('fills'):
+            fill = self._fill_from_executions(symbol, side, client_order_id, response.get('orderId'), response.get('status'),
+                                              [(f['qty'], f['price'], f['commission'], f['commissionAsset']) for f in response['fills']])
+        else:
+            # ACK/RESULT or a recovered order: wait for the execution reports
+            report = self._reports.get(client_order_id)
+            if report is None or report['status'] not in TERMINAL_STATUSES:
+                waiter = self._waiters.setdefault(client_order_id, asyncio.get_running_loop().create_future())
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter), self.fill_timeout)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    self._waiters.pop(client_order_id, None)
+                report = self._reports.get(client_order_id)
+            if report is not None and report['executions']:
+                fill = self._fill_from_executions(symbol, side, client_order_id, report['order_id'], report['status'],
+                                                  report['executions'])
+            elif Decimal(response.get('executedQty', '0')) > 0:
+                # No per-fill data: average price from the order totals, commission unknown
+                qty = Decimal(response['executedQty'])
+                quote = Decimal(response['cummulativeQuoteQty'])
+                fill = self._fill(symbol, side, client_order_id, response.get('orderId'), response.get('status'),
+                                  qty, quote, Decimal('0'), None)
+        self._reports.pop(client_order_id, None)
+
+        if fill is None or fill['quantity'] <= 0:
+            raise OrderError(f"{symbol} {side} {client_order_id} was not filled (status {response.get('status')})")
+        return fill
+
+    def _fill_from_executions(self, symbol, side, client_order_id, order_id, status, executions):
+        qty = quote = commission = Decimal('0')
+        assets = set()
+        for exec_qty, exec_price, exec_commission, asset in executions:
+            exec_qty = Decimal(str(exec_qty))
+            qty += exec_qty
+            quote += exec_qty * Decimal(str(exec_price))
+            commission += Decimal(str(exec_commission))
+            assets.add(asset)
+        asset = assets.pop() if len(assets) == 1 else None
+        return self._fill(symbol, side, client_order_id, order_id, status, qty, quote, commission, asset)
+
+    def _fill(self, symbol, side, client_order_id, order_id, status, qty, quote, commission, asset):
+        price = quote / qty if qty else Decimal('0')
+        quantity = qty
+        if asset == self.quote_asset:
+            fee = commission
+        elif asset is not None and symbol == asset + self.quote_asset:
+            # Paid in the base asset, valued at the fill price
+            fee = commission * price
+            if side == 'BUY':
+                # Deducted from the coins received: book what the account holds, so quantity * price + fee == quote
+                quantity = qty - commission
+        else:
+            fee = None # BNB or mixed assets: the tracker falls back to FEE_RATE
+        return {
+            'symbol': symbol,
+            'side': side,
+            'client_order_id': client_order_id,
+            'order_id': order_id,
+            'status': status,
+            'quantity': quantity,
+            'price': price,
+            'quote': quote,
+            'commission': commission,
+            'commission_asset': asset,
+            'fee': fee
+        }
+
+    def on_execution_report(self, event):
+        """Folds a user-data-stream executionReport into the per-order fill state."""
+        client_order_id = event.get('c')
+        report = self._reports.get(client_order_id)
+        if report is None:
+            report = self._reports[client_order_id] = {'order_id': event.get('i'), 'status': None, 'executions': []}
+            while len(self._reports) > 1000:
+                self._reports.popitem(last=False) # Orders nobody is waiting for
+        if event.get('x') == 'TRADE':
+            report['executions'].append((event['l'], event['L'], event.get('n') or '0', event.get('N')))
+        report['status'] = event.get('X')
+
+        waiter = self._waiters.get(client_order_id)
+        if waiter is not None and not waiter.done() and report['status'] in TERMINAL_STATUSES:
+            waiter.set_result(report)
+
+    async def read_user_stream(self, socket_manager):
+        """Consumes execution reports and balance updates from the user data stream."""
+        async with socket_manager.user_socket() as stream:
+            while True:
+                event = await stream.recv()
+                if not event:
+                    continue
+                if event.get('e') == 'error':
+                    raise ConnectionError(event.get('m'))
+                if event.get('e') == 'executionReport':
+                    self.on_execution_report(event)
+                elif event.get('e') == 'outboundAccountPosition':
+                    for balance in event.get('B', []):
+                        self.balances[balance['a']] = Decimal(balance['f'])
@@ -0,0 +1,269 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from trade_log import TABLES, TradeLog, partition_date
+
+_STOP = object()
+
+
+class PersistencePipeline:
+    """
+    Batched, asynchronous persistence for trade and equity logs.
+
+    Producers put records on a bounded queue and return immediately. A single
+    background writer flushes them to the date-partitioned TradeLog: trades
+    as one part per trade_part_interval (or batch_size trades), best-effort
+    equity records every part_interval. Any finished day still holding more
+    than one part, including parts written after it was first compacted, is
+    compacted into one file. Parts (and whole files such as the chart) are
+    uploaded to S3 through one reused client and a small bounded worker pool.
+    """
+
+    def __init__(self, bucket=None, region_name='us-east-1', s3_client=None, batch_size=50,
+                 flush_interval=5.0, queue_size=10000, upload_workers=2, max_pending_uploads=8,
+                 log_dir='trade_logs', part_interval=300.0, trade_part_interval=60.0, compact=True):
+        self.bucket = bucket
+        self.region_name = region_name
+        self._s3 = s3_client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending_uploads = max_pending_uploads
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.trade_log = TradeLog(log_dir)
+        self.part_interval = part_interval
+        self.trade_part_interval = trade_part_interval
+        self.compact = compact # Only one process sharing log_dir may compact it
+        self._records = {} # table -> records not yet written as a part
+        self._urgent = set() # Tables holding trade (blocking) records, written every trade_part_interval
+        self._last_part = {} # table -> monotonic time of its last part
+        self._started = time.monotonic()
+        self._last_compaction = None # First flush scans for days left uncompacted by a previous run
+        self._unsent = [] # (local_path, key, replaces) waiting for an upload slot, or a retry
+        self._pending_uploads = 0
+        self._upload_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix='s3-upload')
+
+        # Backpressure / health counters
+        self.rows_written = 0
+        self.dropped = 0
+        self.blocked_puts = 0
+        self.high_watermark = 0
+        self.upload_errors = 0
+        self.uploads = 0
+
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='persistence-writer', daemon=True)
+        self._writer.start()
+
+    # --- Producer side (called from the event loop) ---
+
+    def write_record(self, table, record, block=True, timeout=1.0):
+        """
+        Queues a TradeLog record (dict keyed by column). Trade records block
+        briefly when the queue is full; best-effort ones (block=False) are
+        dropped and counted instead, and written less often. Returns False if
+        the record was not accepted.
+        """
+        return self._put(('record', table, (record, block)), block, timeout)
+
+    def _put(self, item, block, timeout):
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if not block:
+                self.dropped += 1
+                return False
+            self.blocked_puts += 1
+            try:
+                self._queue.put(item, timeout=timeout)
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+        depth = self._queue.qsize()
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        return True
+
+    def upload_file(self, path, key=None):
+        """Uploads a whole file (e.g. the chart) in the background."""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(('file', path, key or os.path.basename(path)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stats(self):
+        """Queue depth and counters, for backpressure reporting."""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'high_watermark': self.high_watermark,
+            'rows_written': self.rows_written,
+            'dropped': self.dropped,
+            'blocked_puts': self.blocked_puts,
+            'pending_uploads': self._pending_uploads + len(self._unsent),
+            'uploads': self.uploads,
+            'upload_errors': self.upload_errors
+        }
+
+    def close(self, timeout=10.0):
+        """Flushes everything still queued, uploads the last parts and stops the workers."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join(timeout)
+        self._pool.shutdown(wait=True)
+
+    # --- Writer thread ---
+
+    def _run(self):
+        batch = 0
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(final=True)
+                return
+
+            if item is not None:
+                kind, path, payload = item
+                if kind == 'record':
+                    record, urgent = payload
+                    self._records.setdefault(path, []).append(record)
+                    if urgent:
+                        self._urgent.add(path)
+                        batch += 1
+                else:
+                    self._submit_upload(path, payload)
+
+            if batch >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                if batch or self._unsent or self._records or self._compaction_due():
+                    self._flush()
+                batch = 0
+                last_flush = time.monotonic()
+
+    def _flush(self, final=False):
+        self._write_parts(final)
+        self._retry_unsent()
+
+    def _write_parts(self, final=False):
+        """Writes buffered records as TradeLog parts once their table's interval is up, then compacts."""
+        now = time.monotonic()
+        for table in list(self._records):
+            interval = self.trade_part_interval if table in self._urgent else self.part_interval
+            records = self._records[table]
+            if not (final or len(records) >= self.batch_size or now - self._last_part.get(table, self._started) >= interval):
+                continue # Keep buffering: one part per interval rather than one per record
+            del self._records[table]
+            self._urgent.discard(table)
+            self._last_part[table] = now
+            self.rows_written += len(records)
+            for path in self.trade_log.write(table, records):
+                self._submit_upload(path, self.trade_log.key(path))
+
+        if final or self._compaction_due():
+            self._compact_days()
+
+    def _compaction_due(self):
+        return self.compact and (self._last_compaction is None or time.monotonic() - self._last_compaction >= self.part_interval)
+
+    def _compact_days(self):
+        """
+        Compacts every finished day that holds more than one part: days not
+        compacted yet, and days that got a part since (a late flush after
+        midnight, another worker's, or one left by a restarted process).
+        """
+        if not self.compact:
+            return
+        self._last_compaction = time.monotonic()
+        today = partition_date(datetime.now(timezone.utc).timestamp() * 1000)
+        for table in TABLES:
+            for date in self.trade_log.dates(table):
+                if date >= today:
+                    break
+                path, removed = self.trade_log.compact(table, date)
+                if path:
+                    self._submit_upload(path, self.trade_log.key(path), replaces=[self.trade_log.key(p) for p in removed])
+
+    def _submit_upload(self, path, key, replaces=None):
+        """Uploads path as key; `replaces` are keys deleted once it is in place (compacted parts)."""
+        if not self.bucket:
+            return
+        with self._upload_lock:
+            if self._pending_uploads >= self.max_pending_uploads:
+                # Pool is saturated: keep it for the next flush instead of queueing without bound
+                if (path, key, replaces) not in self._unsent:
+                    self._unsent.append((path, key, replaces))
+                return
+            self._pending_uploads += 1
+        self._pool.submit(self._upload, path, key, replaces)
+
+    def _retry_unsent(self):
+        with self._upload_lock:
+            unsent, self._unsent = self._unsent, []
+        for path, key, replaces in unsent:
+            self._submit_upload(path, key, replaces)
+
+    def _client(self):
+        if self._s3 is None:
+            import boto3 # Loaded on the first upload; local-only runs never pay for it
+            self._s3 = boto3.client('s3', region_name=self.region_name)
+        return self._s3
+
+    def _upload(self, path, key, replaces=None):
+        try:
+            if not os.path.exists(path):
+                return # Compacted into a new part since, which has its own upload
+            self._client().upload_file(path, self.bucket, key)
+            self.uploads += 1
+            if replaces:
+                self._client().delete_objects(Bucket=self.bucket, Delete={'Objects': [{'Key': k} for k in replaces]})
+        except Exception:
+            # Local files are the source of truth; the part stays on disk and is retried at the next flush
+            self.upload_errors += 1
+            with self._upload_lock:
+                if (path, key, replaces) not in self._unsent:
+                    self._unsent.append((path, key, replaces))
+        finally:
+            with self._upload_lock:
+                self._pending_uploads -= 1
+
+
+_default_pipeline = None
+
+def get_pipeline(config):
+    """Process-wide pipeline shared by every tracker."""
+    global _default_pipeline
+    if _default_pipeline is None:
+        _default_pipeline = PersistencePipeline(
+            bucket=config['S3_BUCKET'],
+            region_name=config['AWS_REGION'],
+            batch_size=config['LOG_BATCH_SIZE'],
+            flush_interval=config['LOG_FLUSH_INTERVAL'],
+            log_dir=config['TRADE_LOG_DIR'],
+            part_interval=config['LOG_PART_INTERVAL'],
+            trade_part_interval=config['LOG_TRADE_PART_INTERVAL'],
+            compact=config['LOG_COMPACT']
+        )
+    return _default_pipeline
+
+def close_pipeline():
+    """Flushes and stops the shared pipeline, if one was started."""
+    if _default_pipeline is not None:
+        _default_pipeline.close()
@@ -1,164 +1,252 @@
-import os
-import csv
-import boto3
-import threading
+import time
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
 from config import get_config
-import matplotlib.pyplot as plt
-import pandas as pd
+from persistence import get_pipeline
+from equity_history import EquityHistory
+from accounting import Ledger, Instrument
+from trade_stats import TradeStats
+from charts import get_chart_executor, render_equity_chart
+
+def calculate_fee(price, quantity, fee_rate):
+    """Exchange fee for one fill, rounded to the cent like the live account."""
+    return (price * quantity * fee_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def calculate_round_trip(entry_price, exit_price, quantity, fee_rate, sell_fee):
+    """Returns (pnl, pnl_pct, buy_fee) for closing a position opened at entry_price."""
+    buy_value = entry_price * quantity
+    sell_value = exit_price * quantity
+    buy_fee = calculate_fee(entry_price, quantity, fee_rate)
+
+    # PnL = (Sell Value - Buy Value) - (Buy Fee + Sell Fee)
+    pnl = (sell_value - buy_value) - (buy_fee + sell_fee)
+    pnl_pct = (((sell_value - sell_fee) / (buy_value + buy_fee)) - 1) * 100
+    return pnl, pnl_pct, buy_fee
+
+def _epoch(timestamp):
+    """Epoch seconds of a "%Y-%m-%d %H:%M:%S" fill timestamp (None stays None)."""
+    return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp() if timestamp else None
 
 class PortfolioTracker:
-    def __init__(self, initial_balance=1000.0):
-        self.config = get_config()
-        # Financial Precision using Decimal
+    def __init__(self, initial_balance=1000.0, config=None, symbol=None, chart_file=None,
+                 history_file=None, persistence=None):
+        self.config = config if config is not None else get_config()
+        self.symbol = symbol or self.config['SYMBOL']
+        self.chart_file = chart_file or self.config['CHART_FILE']
+        self.history_file = history_file or self.config['EQUITY_HISTORY_FILE']
+        # Fixed-point ledger for all balance math; the Decimal fields below are its reporting view
+        self.ledger = Ledger(initial_balance)
+        self.ledger.register(Instrument(self.symbol))
         self.initial_balance = Decimal(str(initial_balance))
-        self.current_cash = Decimal(str(initial_balance))
+        self.current_cash = self.ledger.to_decimal(self.ledger.cash_units)
         self.crypto_held = Decimal('0.0')
-        self.trades = [] # List of trade results
+        self.stats = TradeStats(capacity=self.config.get('TRADE_BUFFER_SIZE', 1000)) # Running performance stats + recent trades
         self.entry_price = Decimal('0.0')
+        self.entry_price_value = 0.0 # Float copy for the per-tick strategy check
         self.entry_time = None
         self.stop_loss_pct = Decimal(str(self.config.get('STOP_LOSS_PCT', 0.02)))
         self.take_profit_pct = Decimal(str(self.config.get('TAKE_PROFIT_PCT', 0.05)))
         self.is_active = False # Track if we are currently in a trade
         
-        self.nw_history = [] # List of (timestamp, net_worth)
-        
-        # S3 Client initialization
-        self.s3 = boto3.client('s3', region_name=self.config['AWS_REGION'])
+        # Tiered net-worth history (raw ticks, 1m bars, 1h bars) in constant memory
+        self.equity = EquityHistory()
+        self.equity.restore(self.history_file)
+        self._chart_future = None
+        self._last_equity_log = 0.0
         
-        # Initialize CSV file if it doesn't exist
-        if not os.path.exists(self.config['CSV_FILE']):
-            with open(self.config['CSV_FILE'], mode='w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['Timestamp', 'Side', 'Price', 'Quantity', 'Fee', 'PnL', 'PnL_Pct', 'Net_Worth', 'Type'])
+        # Background writer + S3 uploader, shared by all trackers; trades/equity go to its TradeLog
+        self.persistence = persistence or get_pipeline(self.config)
 
-    def log_trade(self, side, price, quantity, label="STRATEGY"):
+    def set_filters(self, tick_size, step_size):
+        """Uses the exchange's price/quantity grid for this symbol (only while flat)."""
+        if self.crypto_held == 0:
+            self.ledger.register(Instrument(self.symbol, tick_size, step_size))
+
+    def log_trade(self, side, price, quantity, label="STRATEGY", fee=None):
+        """
+        Books a (possibly partial) fill. `fee` is the actual commission in quote
+        currency (from the exchange fill); without it the configured FEE_RATE is used.
+        Returns the fee that was booked.
+        """
+        now = datetime.now()
+        price, quantity, fee, trade_info = self._book(side, price, quantity, fee, label, now.strftime("%Y-%m-%d %H:%M:%S"))
+        instrument = self.ledger.instrument(self.symbol)
+        net_worth = self.get_net_worth(price)
+        pnl, pnl_pct = (trade_info['pnl'], trade_info['pnl_pct']) if side == "SELL" else (0, 0)
+
+        self._write_trade({
+            'ts': int(now.timestamp() * 1000),
+            'symbol': self.symbol,
+            'side': side,
+            'price': float(instrument.price(instrument.price_ticks(price))),
+            'quantity': float(instrument.quantity(instrument.qty_steps(quantity))),
+            'fee': float(fee),
+            'pnl': float(pnl),
+            'pnl_pct': float(pnl_pct),
+            'net_worth': float(net_worth),
+            'label': label
+        })
+        if side == "SELL":
+            self._print_performance(pnl, pnl_pct)
+
+        # Record Net Worth History
+        self.record_snapshot(price)
+        return fee
+
+    def replay_fill(self, side, price, quantity, fee, label="STRATEGY", timestamp=None):
+        """Re-books a journaled fill into the ledger and stats, without CSV rows or output."""
+        self._book(side, price, quantity, fee, label, timestamp)
+
+    def _book(self, side, price, quantity, fee, label, timestamp):
         price = Decimal(str(price))
         quantity = Decimal(str(quantity))
         fee_rate = Decimal(str(self.config['FEE_RATE']))
-        
-        fee = (price * quantity * fee_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        pnl = Decimal('0.0')
-        pnl_pct = Decimal('0.0')
-        
+        fee = calculate_fee(price, quantity, fee_rate) if fee is None else Decimal(str(fee))
+        entry_price = self.entry_price
+        entry_time = self.entry_time
+
+        realized, basis, proceeds = self.ledger.apply_fill(self.symbol, side, quantity, price, fee)
+        self._sync_balances()
+
+        trade_info = None
         if side == "BUY":
-            self.entry_price = price
-            self.entry_time = timestamp
-            self.crypto_held = quantity
-            # Cost = Price * Quantity + Fee
-            self.current_cash -= (price * quantity + fee)
+            if self.entry_time is None:
+                self.entry_time = timestamp
             self.is_active = True
-            
-            # Log to CSV
-            self._write_to_csv([timestamp, 'BUY', f"{price:.8f}", f"{quantity:.8f}", f"{fee:.4f}", "0.00", "0.00", f"{self.get_net_worth(price):.2f}", label])
-            
         elif side == "SELL":
-            exit_price = price
-            buy_value = self.entry_price * quantity
-            sell_value = exit_price * quantity
-            buy_fee = (buy_value * fee_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            
-            # PnL = (Sell Value - Buy Value) - (Buy Fee + Sell Fee)
-            pnl = (sell_value - buy_value) - (buy_fee + fee)
-            pnl_pct = (((sell_value - fee) / (buy_value + buy_fee)) - 1) * 100
-            
-            self.current_cash += (sell_value - fee)
-            self.crypto_held = Decimal('0.0')
-            self.is_active = False
-            
+            self.is_active = self.crypto_held > 0
+            if not self.is_active:
+                self.entry_time = None
             trade_info = {
-                'timestamp': timestamp,
-                'pnl': pnl,
-                'pnl_pct': pnl_pct,
-                'entry_price': self.entry_price,
-                'exit_price': exit_price,
-                'quantity': quantity,
-                'fee': fee + buy_fee,
-                'type': label
+                'pnl': self.ledger.to_decimal(realized),
+                'pnl_pct': (Decimal(proceeds) / Decimal(basis) - 1) * 100 if basis else Decimal('0.0')
             }
-            self.trades.append(trade_info)
-            
-            # Log to CSV
-            self._write_to_csv([timestamp, 'SELL', f"{price:.8f}", f"{quantity:.8f}", f"{fee:.4f}", f"{pnl:.2f}", f"{pnl_pct:.2f}", f"{self.current_cash:.2f}", label])
-            self._print_performance(pnl, pnl_pct)
+            self.stats.record_trade(
+                trade_info['pnl'], trade_info['pnl_pct'], label,
+                entry_time=_epoch(entry_time), exit_time=_epoch(timestamp),
+                entry_price=entry_price, exit_price=price, quantity=quantity,
+                fee=fee + (self.ledger.to_decimal(basis) - entry_price * quantity if basis else Decimal('0.0'))
+            )
+        return price, quantity, fee, trade_info
 
-        # Record Net Worth History
-        self.record_snapshot(price)
-        
-        # Upload CSV to S3
-        self._sync_to_s3(self.config['CSV_FILE'])
+    def close_position(self):
+        """Drops a position that no longer exists on the exchange (no fill, no PnL booked)."""
+        self.ledger.close_position(self.symbol)
+        self._sync_balances()
+        self.is_active = False
+        self.entry_time = None
+
+    def state(self):
+        """Ledger, trade stats and entry time as plain values, for the state journal."""
+        return {
+            'initial_balance': str(self.initial_balance),
+            'ledger': self.ledger.state(),
+            'entry_time': self.entry_time,
+            'stats': self.stats.state()
+        }
+
+    def load_state(self, state):
+        self.initial_balance = Decimal(state['initial_balance'])
+        self.ledger.load_state(state['ledger'])
+        self._sync_balances()
+        self.is_active = self.crypto_held > 0
+        self.entry_time = state['entry_time']
+        if 'stats' in state:
+            self.stats.load_state(state['stats'])
+        else:
+            # Snapshot from before TradeStats: fold its full trade list in once
+            for timestamp, pnl, pnl_pct, entry, exit_, qty, fee, label in state.get('trades', []):
+                self.stats.record_trade(Decimal(pnl), Decimal(pnl_pct), label, exit_time=_epoch(timestamp),
+                                        entry_price=entry, exit_price=exit_, quantity=qty, fee=fee)
+
+    def _sync_balances(self):
+        """Refreshes the Decimal reporting view after a fill."""
+        self.current_cash = self.ledger.to_decimal(self.ledger.cash_units)
+        position = self.ledger.position(self.symbol)
+        self.crypto_held = self.ledger.instrument(self.symbol).quantity(position.steps)
+        self.entry_price = self.ledger.average_entry(self.symbol)
+        self.entry_price_value = float(self.entry_price)
 
     def record_snapshot(self, current_price):
         """Records the current net worth for history and charting."""
-        self.nw_history.append((datetime.now(), float(self.get_net_worth(Decimal(str(current_price))))))
-        # Keep history manageable (last 1440 entries = 24 hours of 1m data)
-        if len(self.nw_history) > 1440:
-            self.nw_history.pop(0)
+        # Integer valuation only: this runs on every tick
+        self.ledger.mark(self.symbol, current_price)
+        net_worth = self.ledger.net_worth_units() / 10 ** self.ledger.cash_decimals
+        now = time.time()
+        self.equity.record(now, net_worth)
+        self.stats.record_equity(now, net_worth)
+
+        # Periodic equity record (best effort: dropped rather than blocking under backpressure)
+        if time.monotonic() - self._last_equity_log >= self.config['EQUITY_LOG_INTERVAL']:
+            self._last_equity_log = time.monotonic()
+            self.persistence.write_record(
+                'equity',
+                {'ts': int(now * 1000), 'symbol': self.symbol, 'price': float(current_price), 'net_worth': net_worth},
+                block=False
+            )
 
     def get_net_worth(self, current_price):
-        current_price = Decimal(str(current_price))
-        return self.current_cash + (self.crypto_held * current_price)
+        self.ledger.mark(self.symbol, current_price)
+        return self.ledger.to_decimal(self.ledger.net_worth_units())
 
-    def _write_to_csv(self, row):
-        with open(self.config['CSV_FILE'], mode='a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row)
+    def net_worth_at(self, current_price):
+        """
+        Net worth at current_price for displays and status reports: the ledger's
+        mark is left alone, and before the first tick (price 0) the position is
+        valued at its last mark rather than at zero.
+        """
+        if not current_price:
+            return self.ledger.to_decimal(self.ledger.net_worth_units())
+        return self.ledger.to_decimal(self.ledger.net_worth_units_at(self.symbol, current_price))
 
-    def _sync_to_s3(self, filename):
-        def upload():
-            try:
-                self.s3.upload_file(filename, self.config['S3_BUCKET'], filename)
-            except Exception as e:
-                # Silent failure is fine here, local CSV is the source of truth
-                pass
+    def position_summary(self):
+        """Quantity, average entry and realized/unrealized PnL per symbol, as Decimals."""
+        return self.ledger.summary()
 
-        thread = threading.Thread(target=upload)
-        thread.start()
+    def _write_trade(self, record):
+        # Queued for the background writer; buffered into the next trades part and uploaded with it
+        self.persistence.write_record('trades', record)
+
+    def _sync_to_s3(self, filename):
+        self.persistence.upload_file(filename)
 
     def generate_performance_chart(self):
-        """Generates a PNG chart of Net Worth over time and uploads to S3."""
-        if not self.nw_history:
-            return
+        """
+        Renders the Net Worth chart on the background chart thread and uploads it to S3.
+        Returns immediately; a render already in progress is not queued twice.
+        """
+        if not len(self.equity.minute):
+            return None
+        if self._chart_future is not None and not self._chart_future.done():
+            return self._chart_future
+
+        times, lows, highs, lasts = self.equity.minute.snapshot()
+        future = get_chart_executor().submit(render_equity_chart, self.chart_file, times, lows, highs, lasts)
+        future.add_done_callback(self._on_chart_rendered)
+        self._chart_future = future
+        return future
 
-        try:
-            df = pd.DataFrame(self.nw_history, columns=['Timestamp', 'NetWorth'])
-            df.set_index('Timestamp', inplace=True)
-
-            plt.figure(figsize=(10, 6))
-            plt.plot(df.index, df['NetWorth'], label='Performance (Net Worth)', color='#00ffcc', linewidth=2)
-            plt.title('Trading Assistant Performance', color='white', fontsize=16)
-            plt.xlabel('Time', color='white')
-            plt.ylabel('USDT Balance', color='white')
-            plt.grid(True, alpha=0.1)
-            
-            # Format UI
-            plt.gcf().set_facecolor('#1e1e1e')
-            plt.gca().set_facecolor('#1e1e1e')
-            plt.gca().tick_params(colors='white')
-            plt.legend(facecolor='#1e1e1e', labelcolor='white')
-            
-            plt.savefig(self.config['CHART_FILE'])
-            plt.close()
-            
+    def _on_chart_rendered(self, future):
+        if future.exception() is None:
             # Upload Chart to S3
-            self._sync_to_s3(self.config['CHART_FILE'])
-        except Exception:
-            pass
+            self._sync_to_s3(self.chart_file)
+
+    def history_state(self):
+        """Copy of the equity history for save_history_state() on another thread."""
+        return self.equity.state()
+
+    def save_history_state(self, state):
+        EquityHistory.write_state(state, self.history_file)
 
     def _print_performance(self, pnl, pnl_pct):
-        if not self.trades:
+        stats = self.stats.total
+        if not stats.trades:
             return
-            
-        wins = [t for t in self.trades if t['pnl'] > 0]
-        win_rate = (len(wins) / len(self.trades)) * 100 if self.trades else 0
-        total_pnl = sum(t['pnl'] for t in self.trades)
-        
+
         print(f"\n>> TRADE CLOSED | PnL: ${pnl:.2f} ({pnl_pct:.2f}%)")
-        print(f">> STRATEGY STATS | Win Rate: {win_rate:.1f}% | Total Profit: ${total_pnl:.2f}")
-        print(f">> NET WORTH: ${self.current_cash:.2f}\n")
+        print(f">> STRATEGY STATS | Win Rate: {stats.win_rate:.1f}% | Total Profit: ${stats.total_pnl:.2f} "
+              f"| Max DD: ${self.stats.max_drawdown:.2f} | Sharpe: {self.stats.sharpe:.2f}")
+        print(f">> NET WORTH: ${self.ledger.to_decimal(self.ledger.net_worth_units()):.2f}\n")
 
     def check_exit_conditions(self, current_price):
         if not self.is_active or self.entry_price == 0:
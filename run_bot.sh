@@ -7,10 +7,12 @@ cd "$(dirname "$0")"
 echo "Starting Binance Trading Bot..."
 
 # Use nohup to keep running after logout, and redirect logs to bot_output.log
-nohup ./venv/bin/python bot.py > bot_output.log 2>&1 &
+# The supervisor shards SYMBOLS across worker processes (WORKERS, default one per core)
+# and restarts crashed workers; run bot.py directly for a single process.
+nohup ./venv/bin/python supervisor.py > bot_output.log 2>&1 &
 
 echo "------------------------------------------------"
 echo "Bot started in the background (PID: $!)"
 echo "To view logs, run: tail -f bot_output.log"
-echo "To stop the bot, find the PID and kill it: ps aux | grep bot.py"
+echo "To stop the bot, find the PID and kill it: ps aux | grep supervisor.py"
 echo "------------------------------------------------"
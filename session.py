@@ -0,0 +1,511 @@
+import asyncio
+from collections import deque
+from time import perf_counter_ns
+from datetime import datetime, timedelta
+from indicators import IndicatorEngine
+from kline_buffer import KlineBuffer
+from aggregator import TimeframeView
+from strategies import Signal, SIGNALS, MarketState, StateBatch, load_strategy, strategy_name
+from instrumentation import metrics
+from colorama import Fore, Style
+
+
+def stream_name(symbol, timeframe):
+    """Binance combined-stream name for a symbol's kline feed."""
+    return f"{symbol.lower()}@kline_{timeframe}"
+
+def exit_stream_name(symbol, kind):
+    """Binance combined-stream name for a symbol's bookTicker or aggTrade feed."""
+    return f"{symbol.lower()}@{kind}"
+
+
+class SymbolSession:
+    """Per-symbol strategy, position and portfolio state for the shared runtime."""
+
+    def __init__(self, symbol, timeframe, quantity, config, tracker, store=None, journal=None, strategy=None):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.quantity = quantity
+        self.config = config
+        self.tracker = tracker
+        self.store = store
+        self.journal = journal
+        self.stream = stream_name(symbol, timeframe)
+        self.exit_stream = exit_stream_name(symbol, config['EXIT_STREAM']) if config.get('EXIT_STREAM') else None
+
+        # Fixed-size OHLCV history (enough for the EMA warm-up)
+        self.buffer = KlineBuffer(capacity=max(config['KLINE_BUFFER_SIZE'], config['EMA_PERIOD'] + 20))
+        self.engine = self._new_engine()
+        # Higher timeframes derived from this stream (no extra sockets), each with its own engine
+        self.frames = {}
+        for tf in config.get('TIMEFRAMES', []):
+            try:
+                self.frames[tf] = TimeframeView(tf, timeframe, self._new_engine(config['TREND_EMA_PERIOD']),
+                                                capacity=config['TREND_EMA_PERIOD'] + 20)
+            except ValueError as e:
+                print(Fore.YELLOW + f"[WARN] {symbol}: {e}; skipping that timeframe.")
+        self.trend_frame = self.frames.get(config.get('TREND_TIMEFRAME'))
+        # Strategy plugin (shared between sessions by build_sessions) and the state handed to it
+        self.strategy = strategy or load_strategy(strategy_name(config, symbol), config)
+        self.batcher = None # BarBatcher evaluating closed bars across symbols, if any
+        self._state = MarketState(symbol)
+        self.in_position = False
+        self.highest_since_entry = 0
+
+        # Protective exit levels, precomputed so each exit-stream price costs a few comparisons
+        self.stop_price = None # None while flat or before the ATR is warm
+        self.trail_offset = 0.0 # ATR * ATR_MULTIPLIER_TP
+        self.trail_price = 0.0 # highest_since_entry - trail_offset
+        self.min_exit = 0.0 # Minimum profitable exit (fees + MIN_PROFIT_BUFFER)
+
+        # Coalescing inbox: every closed candle, plus only the latest open-candle update
+        self._closed = deque()
+        self._latest = None
+        self._updates = asyncio.Event()
+        self.coalesced = 0
+
+        # Single order slot: at most one order in flight per symbol
+        self._order = None
+        self._orders = asyncio.Event()
+        self.order_pending = False
+        self.pending_orders = {} # client order id -> journaled order whose fill wasn't booked yet
+
+        # Last values, for the dashboard
+        self.last_price = 0.0
+        self.last_signal = Signal.HOLD
+        self.last_rsi = None
+        self.last_chart_time = datetime.now()
+
+    def _new_engine(self, ema_period=None):
+        return IndicatorEngine(
+            rsi_period=self.config['RSI_PERIOD'],
+            ema_period=ema_period or self.config['EMA_PERIOD'],
+            atr_period=self.config['ATR_PERIOD']
+        )
+
+    def apply_config_changes(self, changed):
+        """
+        Multipliers and buffers are read from config on every tick; period
+        changes need a fresh engine replayed from the kline buffer.
+        """
+        if any(key in changed for key in ('RSI_PERIOD', 'EMA_PERIOD', 'ATR_PERIOD')):
+            engine = self._new_engine()
+            engine.seed(self.buffer)
+            self.engine = engine
+        if any(key in changed for key in ('RSI_PERIOD', 'ATR_PERIOD')):
+            for frame in self.frames.values():
+                frame.reseed(self._new_engine(self.config['TREND_EMA_PERIOD']))
+        self.update_exit_levels()
+
+    def bootstrap(self, klines, frame_klines=None):
+        """
+        Fills the kline buffer from REST klines and seeds the indicator engine from it.
+        frame_klines optionally maps a higher timeframe to its cached closed bars;
+        the bar in progress (and, without cached bars, the whole history) is
+        rebuilt from the base candles.
+        """
+        self.buffer.extend(klines)
+        self.engine.seed(self.buffer)
+        for tf, frame in self.frames.items():
+            frame.bootstrap((frame_klines or {}).get(tf, []), self.buffer)
+
+    def update_exit_levels(self):
+        """
+        Recomputes the stop, trailing and minimum-exit prices from the entry and the
+        ATR of the closed candles, through the strategy's exit_levels(). Called on
+        entry, on every closed candle, after a restore and on config changes;
+        cleared when flat.
+        """
+        atr = self.engine.metrics()[2]
+        entry = float(self.tracker.entry_price_value) if self.in_position else 0.0
+        levels = None
+        if entry > 0 and atr is not None and atr == atr:
+            levels = self.strategy.exit_levels(entry, atr)
+        if levels is None:
+            self.stop_price = None
+            return
+        self.stop_price, self.trail_offset, self.min_exit = levels
+        self.trail_price = self.highest_since_entry - self.trail_offset
+
+    def _note_peak(self, price):
+        self.highest_since_entry = price
+        self.trail_price = price - self.trail_offset
+        if self.journal is not None:
+            self.journal.note_peak(self.symbol, price)
+
+    def on_price(self, price):
+        """
+        Checks one bookTicker/aggTrade price against the precomputed levels and
+        returns "SELL_STOP_LOSS", "SELL_TRAILING_TP" or None. The peak tracks
+        these prices, so the trailing stop follows trades rather than kline closes.
+        """
+        if self.stop_price is None:
+            return None
+        if price > self.highest_since_entry:
+            self._note_peak(price)
+        if price < self.stop_price:
+            return "SELL_STOP_LOSS"
+        if self.min_exit < price < self.trail_price:
+            return "SELL_TRAILING_TP"
+        return None
+
+    def timeframe_indicators(self):
+        """(rsi, ema, atr, vol_confirm) of each higher timeframe, bar in progress included."""
+        return {tf: frame.indicators for tf, frame in self.frames.items()}
+
+    # --- State journal ---
+
+    def state(self):
+        """Everything needed to resume this symbol after a restart, as plain values."""
+        return {
+            'tracker': self.tracker.state(),
+            'in_position': self.in_position,
+            'highest_since_entry': self.highest_since_entry,
+            'pending_orders': dict(self.pending_orders),
+            'engine': self.engine.state(),
+            'engine_open_time': self.buffer.last_open_time
+        }
+
+    def restore(self, state):
+        """
+        Resumes from a journal snapshot. Call after bootstrap(): the engine state
+        is reused if its last candle is still in the buffer (later candles are
+        replayed on top); otherwise the freshly seeded engine is kept.
+        """
+        self.tracker.load_state(state['tracker'])
+        self.in_position = state['in_position']
+        self.highest_since_entry = state['highest_since_entry']
+        self.pending_orders = dict(state['pending_orders'])
+
+        open_times = self.buffer.window('open_time')
+        matches = (open_times == state['engine_open_time']).nonzero()[0] if state['engine_open_time'] is not None else []
+        if len(matches):
+            engine = self._new_engine()
+            if engine.load_state(state['engine']):
+                engine.seed(self.buffer, start=int(matches[-1]) + 1)
+                self.engine = engine
+
+    def replay(self, record):
+        """Applies one WAL record written after the snapshot."""
+        kind = record['t']
+        if kind == 'order':
+            self.pending_orders[record['id']] = {'side': record['side'], 'qty': record['qty']}
+        elif kind == 'fill':
+            self.pending_orders.pop(record.get('id'), None)
+            self.tracker.replay_fill(record['side'], record['price'], record['qty'], record['fee'], record['label'], record['ts'])
+            self.in_position = record['side'] == "BUY"
+            if not self.in_position:
+                self.highest_since_entry = 0
+        elif kind == 'drop':
+            self.pending_orders.pop(record['id'], None)
+        elif kind == 'close':
+            self.tracker.close_position()
+            self.in_position = False
+            self.highest_since_entry = 0
+        elif kind == 'peak' and self.in_position:
+            self.highest_since_entry = max(self.highest_since_entry, record['price'])
+
+    def _journal(self, kind, **fields):
+        if self.journal is not None:
+            self.journal.append(kind, self.symbol, **fields)
+
+    def enqueue(self, kline, event_time=None):
+        """
+        Hands a kline update to this symbol's strategy task without blocking the
+        reader. Closed candles are always kept; an open-candle update replaces
+        the one still waiting, so a busy symbol skips stale ticks instead of
+        processing them late.
+        """
+        if kline['x']:
+            self._closed.append((kline, event_time))
+            if self._latest is not None and self._latest[0]['t'] <= kline['t']:
+                self._skip_latest() # Superseded by the close of its own candle
+        else:
+            if self._latest is not None:
+                self._skip_latest()
+            self._latest = (kline, event_time)
+        self._updates.set()
+
+    def _skip_latest(self):
+        self._latest = None
+        self.coalesced += 1
+        metrics.inc('coalesced_updates')
+
+    async def next_update(self):
+        """Waits for the next (kline, event_time): closed candles first, in order, then the latest tick."""
+        while True:
+            if self._closed:
+                return self._closed.popleft()
+            if self._latest is not None:
+                update, self._latest = self._latest, None
+                return update
+            self._updates.clear()
+            await self._updates.wait()
+
+    @property
+    def pending_updates(self):
+        return len(self._closed) + (self._latest is not None)
+
+    def on_kline(self, kline, event_time=None):
+        """Runs the strategy for one kline update and returns (signal, rsi)."""
+        started = perf_counter_ns()
+        is_kline_closed = kline['x']
+        current_price = float(kline['c'])
+        volume = float(kline['v'])
+        high = float(kline['h'])
+        low = float(kline['l'])
+        if is_kline_closed:
+            self.buffer.append(kline['t'], float(kline['o']), high, low, current_price, volume)
+        else:
+            self.buffer.set_open(kline['t'], float(kline['o']), high, low, current_price, volume)
+        parsed = perf_counter_ns()
+        metrics.observe_ns('parse', parsed - started)
+
+        if is_kline_closed and self.store is not None:
+            self.store.append(self.symbol, self.timeframe, kline) # Queued; written by bot.flush_kline_store
+            parsed = perf_counter_ns()
+            metrics.observe_ns('kline_store', parsed - started)
+
+        if self.frames:
+            open_time = kline['t']
+            open_ = float(kline['o'])
+            for tf, frame in self.frames.items():
+                completed = frame.update(open_time, open_, high, low, current_price, volume, is_kline_closed)
+                if completed and self.store is not None:
+                    self.store.queue(self.symbol, tf, completed) # Keeps the cache current without REST calls
+            aggregated = perf_counter_ns()
+            metrics.observe_ns('timeframes', aggregated - parsed)
+            parsed = aggregated
+
+        # Every time you receive a new price and are in a position:
+        if self.in_position:
+            if current_price > self.highest_since_entry:
+                self._note_peak(current_price)
+        else:
+            self.highest_since_entry = 0
+
+        state = self._state
+        state.price = current_price
+        state.rsi, state.ema, state.atr, state.vol_confirm = self.engine.evaluate(current_price, volume, is_kline_closed, high, low)
+        state.entry_price = self.tracker.entry_price_value if self.in_position else 0.0
+        state.highest_since_entry = self.highest_since_entry
+        # Optional higher-timeframe trend filter: only buy above its EMA
+        state.trend_ok = True
+        if self.trend_frame is not None and 'trend' in self.strategy.requires:
+            trend_ema = self.trend_frame.indicators[1]
+            state.trend_ok = trend_ema is not None and current_price > trend_ema
+
+        batched = is_kline_closed and self.batcher is not None
+        if not is_kline_closed:
+            signal = self.strategy.on_tick(state)
+        elif batched:
+            signal = Signal.HOLD # Decided with every other symbol closing this bar, see below
+        else:
+            signal = self.strategy.on_bar_close(state)
+        rsi_value = state.rsi
+        if is_kline_closed and self.in_position:
+            self.update_exit_levels() # ATR moved with the closed candle
+        metrics.observe_ns('strategy', perf_counter_ns() - parsed)
+        metrics.observe_since_event('event_to_signal', event_time)
+        metrics.inc('ticks')
+
+        self.last_price = current_price
+        self.last_signal = signal
+        self.last_rsi = rsi_value
+        if batched:
+            self.batcher.add(self, kline['t'], state) # May evaluate the burst (and submit) right away
+        return signal, rsi_value
+
+    def on_bar_signal(self, signal, current_price):
+        """Takes the decision for a closed bar from the BarBatcher."""
+        self.last_signal = signal
+        self.submit_order(signal, current_price, perf_counter_ns())
+
+    def submit_order(self, signal, current_price, signal_ns=None):
+        """
+        Hands an actionable signal to the execution task. Returns False for HOLD,
+        signals that don't match the position, or while an order is in flight,
+        so strategy evaluation never waits on the exchange.
+        """
+        if self.order_pending:
+            return False
+        if not ((signal == "BUY" and not self.in_position) or ("SELL" in signal and self.in_position)):
+            return False
+        self.order_pending = True
+        self._order = (signal, current_price, signal_ns)
+        self._orders.set()
+        return True
+
+    async def next_order(self):
+        """Waits for the signal handed over by submit_order()."""
+        while self._order is None:
+            self._orders.clear()
+            await self._orders.wait()
+        order, self._order = self._order, None
+        return order
+
+    def order_done(self):
+        self.order_pending = False
+
+    async def execute(self, orders, signal, current_price, signal_ns=None):
+        """
+        Places the market order for a signal through the OrderManager and books
+        the actual fill (price, quantity, commission) in the tracker. The order
+        is journaled before it is sent, so a crash mid-order is reconciled on restart.
+        """
+        if signal == "BUY" and not self.in_position:
+            print(f"\n{Fore.GREEN}{Style.BRIGHT} [TRADE] {self.symbol} BUY Order (Uptrend Confirmed)...")
+            try:
+                client_order_id = self._journal_order(orders, 'BUY', self.quantity)
+                sent = perf_counter_ns()
+                fill = await orders.market_order(self.symbol, 'BUY', self.quantity, client_order_id=client_order_id)
+                self._observe_order('order_buy', sent, signal_ns)
+                self._log_fill("BUY", fill, current_price)
+            except Exception as e:
+                print(f"{Fore.RED} [ERROR] {self.symbol} BUY failed: {e}")
+
+        elif "SELL" in signal and self.in_position:
+            label = signal.replace("SELL_", "")
+            print(f"\n{Fore.RED}{Style.BRIGHT} [TRADE] {self.symbol} {signal} triggered...")
+            try:
+                # Sell what was actually bought (a market buy can fill partially), but never more
+                # than the account holds: base-asset commissions and dust leave it short
+                quantity = await self._sellable(orders)
+                if quantity <= 0:
+                    print(f"{Fore.RED} [ERROR] {self.symbol} SELL skipped: no free {orders.base_asset(self.symbol)} balance")
+                    return
+                client_order_id = self._journal_order(orders, 'SELL', quantity)
+                sent = perf_counter_ns()
+                fill = await orders.market_order(self.symbol, 'SELL', quantity, client_order_id=client_order_id)
+                self._observe_order('order_sell', sent, signal_ns)
+                self._log_fill("SELL", fill, current_price, label=label)
+            except Exception as e:
+                print(f"{Fore.RED} [ERROR] {self.symbol} SELL failed: {e}")
+
+    async def _sellable(self, orders):
+        """The tracked position, clamped to the free base balance rounded down to the lot step."""
+        held = self.tracker.crypto_held
+        free = await orders.free_balance(orders.base_asset(self.symbol))
+        if free < held:
+            instrument = self.tracker.ledger.instrument(self.symbol)
+            clamped = instrument.quantity(instrument.floor_steps(free))
+            print(f"{Fore.YELLOW} [WARN] {self.symbol} holds {free:f} free, tracked {held:f}; selling {clamped:f}")
+            held = clamped
+        return float(held)
+
+    def _journal_order(self, orders, side, quantity):
+        client_order_id = orders.new_client_order_id(self.symbol)
+        self.pending_orders[client_order_id] = {'side': side, 'qty': quantity}
+        self._journal('order', id=client_order_id, side=side, qty=quantity)
+        return client_order_id
+
+    def _log_fill(self, side, fill, signal_price, label="STRATEGY"):
+        slippage = (float(fill['price']) / signal_price - 1) * 100 if signal_price else 0.0
+        print(f"{Style.DIM} [FILL] {self.symbol} {side} {fill['quantity']:f} @ {fill['price']:.8f} (slippage {slippage:+.3f}%)")
+        fee = self.tracker.log_trade(side, fill['price'], fill['quantity'], label=label, fee=fill['fee'])
+        self.pending_orders.pop(fill['client_order_id'], None)
+        self._journal('fill', id=fill['client_order_id'], side=side, qty=str(fill['quantity']), price=str(fill['price']),
+                      fee=str(fee), label=label, ts=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.in_position = side == "BUY"
+        if not self.in_position:
+            self.highest_since_entry = 0
+        self.update_exit_levels()
+
+    async def reconcile(self, client, orders):
+        """
+        Checks restored state against the exchange: books fills of orders that
+        were in flight at the crash, and drops a position the account no longer holds.
+        """
+        if not self.in_position and not self.pending_orders:
+            return
+        for client_order_id, order in list(self.pending_orders.items()):
+            fill = await orders.recover(self.symbol, order['side'], client_order_id)
+            if fill is None:
+                self.pending_orders.pop(client_order_id, None)
+                self._journal('drop', id=client_order_id)
+            else:
+                print(Fore.YELLOW + f"[RECOVERY] {self.symbol} {order['side']} {client_order_id} filled before the restart; booking it.")
+                self._log_fill(order['side'], fill, float(fill['price']), label="RECOVERED")
+
+        if self.in_position:
+            base_asset = self.symbol[:-len(orders.quote_asset)] if self.symbol.endswith(orders.quote_asset) else self.symbol
+            balance = await client.get_asset_balance(asset=base_asset)
+            on_exchange = float(balance['free']) + float(balance['locked']) if balance else 0.0
+            held = float(self.tracker.crypto_held)
+            if on_exchange < held * 0.5:
+                print(Fore.RED + f"[RECOVERY] {self.symbol}: journal holds {held} {base_asset}, account has {on_exchange}; dropping the position.")
+                self.tracker.close_position()
+                self._journal('close')
+                self.in_position = False
+                self.highest_since_entry = 0
+                self.update_exit_levels()
+
+        open_orders = await client.get_open_orders(symbol=self.symbol)
+        if open_orders:
+            print(Fore.YELLOW + f"[RECOVERY] {self.symbol} has {len(open_orders)} open order(s) on the exchange.")
+
+    def _observe_order(self, stage, sent, signal_ns):
+        acked = perf_counter_ns()
+        metrics.observe_ns(stage, acked - sent)
+        if signal_ns is not None:
+            metrics.observe_ns('signal_to_ack', acked - signal_ns)
+
+    def maybe_generate_chart(self):
+        """Hourly chart task."""
+        if datetime.now() - self.last_chart_time > timedelta(hours=1):
+            self.tracker.generate_performance_chart()
+            self.last_chart_time = datetime.now()
+
+
+class BarBatcher:
+    """
+    Evaluates bar-close bursts (every symbol of a timeframe closing the same
+    candle) with one Strategy.evaluate() call per strategy instead of one
+    Python call per symbol. A burst is evaluated as soon as every session of
+    the timeframe has reported, or `window` seconds after its first bar close,
+    so a late or silent symbol never holds the others up.
+    """
+
+    def __init__(self, sessions, window):
+        self.window = window
+        self.expected = {} # timeframe -> sessions reporting its bar closes
+        for session in sessions:
+            self.expected[session.timeframe] = self.expected.get(session.timeframe, 0) + 1
+            session.batcher = self
+        self._pending = {} # (timeframe, open_time) -> [(session, state)]
+        self._timers = {}
+
+    def add(self, session, open_time, state):
+        key = (session.timeframe, open_time)
+        rows = self._pending.get(key)
+        if rows is None:
+            rows = self._pending[key] = []
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window, self.flush, key)
+        rows.append((session, state.copy())) # The session reuses its state for the next candle
+        if len(rows) >= self.expected[session.timeframe]:
+            self.flush(key)
+
+    def flush(self, key):
+        rows = self._pending.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if not rows:
+            return
+        started = perf_counter_ns()
+        groups = {}
+        for row in rows:
+            groups.setdefault(row[0].strategy, []).append(row)
+        for strategy, group in groups.items():
+            codes = strategy.evaluate(StateBatch([state for _, state in group]))
+            for (session, state), code in zip(group, codes):
+                session.on_bar_signal(SIGNALS[code], state.price)
+        metrics.observe_ns('bar_batch', perf_counter_ns() - started)
+        metrics.inc('batched_bars', len(rows))
+
+    def close(self):
+        """Drops pending bursts, e.g. when the sessions are rebuilt after a reconnect."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        self._pending = {}
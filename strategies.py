@@ -1,4 +1,6 @@
-import pandas as pd
+import importlib
+from enum import Enum
+import numpy as np
 
 # def calculate_rsi(prices, period=14):
 #     """
@@ -31,6 +33,8 @@ import pandas as pd
 #         return "HOLD", rsi
 
 def calculate_rsi_robust(prices, period=14):
+    import pandas as pd # Only the list-based helpers need pandas; the live path uses IndicatorEngine
+
     if len(prices) < period + 1:
         return None
     
@@ -67,10 +71,11 @@ def check_rsi_strategy_pro(prices, current_pos_price=0):
         
     return "HOLD", rsi
 
-def calculate_metrics(prices, volumes=None, rsi_period=14, ema_period=200, atr_period=14):
+def calculate_metrics(prices, volumes=None, rsi_period=14, ema_period=200, atr_period=14, highs=None, lows=None):
     if len(prices) < ema_period:
         return None, None, None, None
-    
+    import pandas as pd
+
     series = pd.Series(prices)
     
     # 1. Calculate RSI with Wilder's Smoothing
@@ -83,9 +88,15 @@ def calculate_metrics(prices, volumes=None, rsi_period=14, ema_period=200, atr_p
     # 2. Calculate 200 EMA (The Trend Filter)
     ema_200 = series.ewm(span=ema_period, adjust=False).mean()
     
-    # 3. ATR (Volatility Filter)
-    high_low = series.diff().abs()
-    atr = high_low.rolling(window=atr_period).mean()
+    # 3. ATR (Volatility Filter): true range when highs/lows are known
+    prev_close = series.shift(1)
+    if highs is not None and lows is not None:
+        high, low = pd.Series(highs), pd.Series(lows)
+        true_range = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+        true_range = true_range.where(prev_close.notna())
+    else:
+        true_range = series.diff().abs()
+    atr = true_range.rolling(window=atr_period).mean()
     
     # 4. Volume Confirmation (Wait for buying pressure)
     vol_confirm = True
@@ -97,14 +108,12 @@ def calculate_metrics(prices, volumes=None, rsi_period=14, ema_period=200, atr_p
 
     return rsi.iloc[-1], ema_200.iloc[-1], atr.iloc[-1], vol_confirm
 
-def check_strategy_final(prices, volumes, current_pos_price=0, highest_since_entry=0, 
-                         rsi_period=14, ema_period=200, atr_period=14, 
-                         atr_multiplier_sl=2.0, atr_multiplier_tp=1.5, 
-                         min_profit_buffer=0.0025, fee_rate=0.001):
-    rsi, ema_200, atr, vol_confirm = calculate_metrics(prices, volumes, rsi_period, ema_period, atr_period)
-    if rsi is None: return "HOLD", None
-
-    current_price = prices[-1]
+def evaluate_signal(current_price, rsi, ema_200, atr, vol_confirm, current_pos_price=0, highest_since_entry=0,
+                    atr_multiplier_sl=2.0, atr_multiplier_tp=1.5, min_profit_buffer=0.0025, fee_rate=0.001, trend_ok=True):
+    """
+    Entry/exit rules of the final strategy, applied to precomputed indicator values.
+    trend_ok is the optional higher-timeframe filter: entries need it, exits ignore it.
+    """
     # Calculate break-even price (covers buy and sell fees)
     break_even = float(current_pos_price) * (1 + (fee_rate * 2))
     # Calculate minimum profitable exit (break-even + min profit buffer)
@@ -130,7 +139,249 @@ def check_strategy_final(prices, volumes, current_pos_price=0, highest_since_ent
     # --- 2. ENTRY LOGIC (Trend + RSI + Volume) ---
     else:
         # Only buy if: Uptrend (Price > EMA200) AND Oversold (RSI < 30) AND Volume is Rising
-        if current_price > ema_200 and rsi < 30 and vol_confirm:
+        if current_price > ema_200 and rsi < 30 and vol_confirm and trend_ok:
             return "BUY", rsi
         
-    return "HOLD", rsi
\ No newline at end of file
+    return "HOLD", rsi
+
+def check_strategy_final(prices, volumes, current_pos_price=0, highest_since_entry=0, 
+                         rsi_period=14, ema_period=200, atr_period=14, 
+                         atr_multiplier_sl=2.0, atr_multiplier_tp=1.5, 
+                         min_profit_buffer=0.0025, fee_rate=0.001, highs=None, lows=None):
+    rsi, ema_200, atr, vol_confirm = calculate_metrics(prices, volumes, rsi_period, ema_period, atr_period, highs, lows)
+    if rsi is None: return "HOLD", None
+
+    return evaluate_signal(prices[-1], rsi, ema_200, atr, vol_confirm, current_pos_price, highest_since_entry,
+                           atr_multiplier_sl, atr_multiplier_tp, min_profit_buffer, fee_rate)
+
+def check_strategy_engine(engine, current_price, current_volume=0.0, is_closed=False,
+                          current_pos_price=0, highest_since_entry=0,
+                          atr_multiplier_sl=2.0, atr_multiplier_tp=1.5,
+                          min_profit_buffer=0.0025, fee_rate=0.001, high=None, low=None, trend_ok=True):
+    """
+    Same rules as check_strategy_final, but reads indicators from an IndicatorEngine.
+    Closed candles are committed to the engine, open candles are only peeked at.
+    """
+    rsi, ema_200, atr, vol_confirm = engine.evaluate(current_price, current_volume, is_closed, high, low)
+    if rsi is None: return "HOLD", None
+
+    return evaluate_signal(current_price, rsi, ema_200, atr, vol_confirm, current_pos_price, highest_since_entry,
+                           atr_multiplier_sl, atr_multiplier_tp, min_profit_buffer, fee_rate, trend_ok)
+
+
+# --- Strategy plugins ---
+
+class Signal(str, Enum):
+    """Typed strategy decision. Values are the signal strings used by orders, trade labels and the dashboard."""
+    HOLD = "HOLD"
+    BUY = "BUY"
+    SELL_STOP_LOSS = "SELL_STOP_LOSS"
+    SELL_TRAILING_TP = "SELL_TRAILING_TP"
+    SELL_TAKE_PROFIT = "SELL_TAKE_PROFIT"
+    SELL_RSI_EXIT = "SELL_RSI_EXIT"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+# Strategy.evaluate() returns one int8 code per symbol, an index into SIGNALS
+SIGNALS = tuple(Signal)
+CODES = {signal: code for code, signal in enumerate(SIGNALS)}
+
+# Indicators a strategy can declare in `requires`; 'trend' is the TREND_TIMEFRAME filter
+INDICATORS = ('rsi', 'ema', 'atr', 'vol_confirm', 'trend')
+
+
+class MarketState:
+    """What a strategy sees of one symbol: price, indicators and position (entry_price 0 when flat)."""
+
+    __slots__ = ('symbol', 'price', 'rsi', 'ema', 'atr', 'vol_confirm', 'trend_ok', 'entry_price', 'highest_since_entry')
+
+    def __init__(self, symbol, price=0.0, rsi=None, ema=None, atr=None, vol_confirm=True, trend_ok=True,
+                 entry_price=0.0, highest_since_entry=0.0):
+        self.symbol = symbol
+        self.price = price
+        self.rsi = rsi
+        self.ema = ema
+        self.atr = atr
+        self.vol_confirm = vol_confirm
+        self.trend_ok = trend_ok
+        self.entry_price = entry_price
+        self.highest_since_entry = highest_since_entry
+
+    def copy(self):
+        return MarketState(*(getattr(self, name) for name in self.__slots__))
+
+
+class StateBatch:
+    """The MarketStates of many symbols as float64/bool columns (NaN for indicators still warming up)."""
+
+    def __init__(self, states):
+        nan = float('nan')
+        self.states = states
+        self.symbols = [s.symbol for s in states]
+        self.price = np.array([s.price for s in states], dtype=np.float64)
+        self.rsi = np.array([nan if s.rsi is None else s.rsi for s in states], dtype=np.float64)
+        self.ema = np.array([nan if s.ema is None else s.ema for s in states], dtype=np.float64)
+        self.atr = np.array([nan if s.atr is None else s.atr for s in states], dtype=np.float64)
+        self.vol_confirm = np.array([bool(s.vol_confirm) for s in states], dtype=bool)
+        self.trend_ok = np.array([bool(s.trend_ok) for s in states], dtype=bool)
+        self.entry_price = np.array([s.entry_price for s in states], dtype=np.float64)
+        self.highest_since_entry = np.array([s.highest_since_entry for s in states], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.states)
+
+
+class Strategy:
+    """
+    Base class of strategy plugins. A subclass sets `name` and `requires` (a
+    subset of INDICATORS) and overrides:
+
+    - on_tick(state): decision on an open-candle update (default HOLD).
+    - on_bar_close(state): decision when a candle closes.
+    - evaluate(batch): on_bar_close for every symbol of a StateBatch at once,
+      as an array of SIGNALS codes. The default loops over on_bar_close;
+      override it with NumPy expressions for large symbol universes.
+    - exit_levels(entry_price, atr): (stop_price, trail_offset, min_exit) for
+      the exit stream, or None to leave exits to the kline path.
+
+    One instance serves every symbol using it, so per-symbol state belongs in
+    the MarketState. Parameters are read from self.config on each call, so hot
+    reloads apply without rebuilding the strategy.
+    """
+
+    name = None
+    requires = ()
+
+    def __init__(self, config):
+        unknown = set(self.requires) - set(INDICATORS)
+        if unknown:
+            raise ValueError(f"{type(self).__name__} requires unknown indicator(s): {', '.join(sorted(unknown))}")
+        self.config = config
+
+    def on_tick(self, state):
+        return Signal.HOLD
+
+    def on_bar_close(self, state):
+        return Signal.HOLD
+
+    def evaluate(self, batch):
+        return np.array([CODES[self.on_bar_close(state)] for state in batch.states], dtype=np.int8)
+
+    def exit_levels(self, entry_price, atr):
+        return None
+
+
+STRATEGIES = {}
+
+def register_strategy(cls):
+    """Class decorator making a strategy selectable by its name in STRATEGY / SYMBOL_STRATEGIES."""
+    STRATEGIES[cls.name] = cls
+    return cls
+
+def strategy_name(config, symbol):
+    return config['SYMBOL_STRATEGIES'].get(symbol, config['STRATEGY'])
+
+def load_strategy(name, config):
+    """Instantiates a registered strategy, or a plugin class given as "package.module:ClassName"."""
+    if ':' in name:
+        module, _, attr = name.partition(':')
+        cls = getattr(importlib.import_module(module), attr)
+    else:
+        cls = STRATEGIES.get(name)
+        if cls is None:
+            raise ValueError(f"Unknown strategy '{name}' (available: {', '.join(sorted(STRATEGIES))})")
+    return cls(config)
+
+
+@register_strategy
+class TrendRsiAtrStrategy(Strategy):
+    """
+    The final strategy (evaluate_signal): buy oversold RSI above the EMA with
+    rising volume and the trend filter; exit on the ATR stop, the ATR trailing
+    stop or overbought RSI once fees are covered.
+    """
+
+    name = "trend_rsi_atr"
+    requires = ('rsi', 'ema', 'atr', 'vol_confirm', 'trend')
+
+    def on_bar_close(self, state):
+        # Indicators still warming up are NaN: their rules never match, the others still do
+        # (an open position keeps its ATR stops while RSI is unavailable)
+        nan = float('nan')
+        rsi = nan if state.rsi is None else state.rsi
+        ema = nan if state.ema is None else state.ema
+        atr = nan if state.atr is None else state.atr
+        config = self.config
+        signal, _ = evaluate_signal(state.price, rsi, ema, atr, state.vol_confirm, state.entry_price,
+                                    state.highest_since_entry, config['ATR_MULTIPLIER_SL'], config['ATR_MULTIPLIER_TP'],
+                                    config['MIN_PROFIT_BUFFER'], config['FEE_RATE'], state.trend_ok)
+        return Signal(signal)
+
+    on_tick = on_bar_close # Stops and trailing exits also fire on open-candle prices
+
+    def evaluate(self, batch):
+        """Same rules as on_bar_close, as array expressions over the whole batch."""
+        config = self.config
+        in_position = batch.entry_price > 0
+        min_exit = batch.entry_price * (1 + config['FEE_RATE'] * 2 + config['MIN_PROFIT_BUFFER'])
+        price = batch.price
+        # NaN (warming up) compares False, so only the rules needing that indicator are skipped
+        stop = in_position & (price < batch.entry_price - batch.atr * config['ATR_MULTIPLIER_SL'])
+        trailing = in_position & (price > min_exit) & (price < batch.highest_since_entry - batch.atr * config['ATR_MULTIPLIER_TP'])
+        rsi_exit = in_position & (batch.rsi > 70) & (price > min_exit)
+        buy = ~in_position & (price > batch.ema) & (batch.rsi < 30) & batch.vol_confirm & batch.trend_ok
+        # First matching rule wins, in the order evaluate_signal checks them
+        return np.select(
+            [stop, trailing, rsi_exit, buy],
+            [CODES[Signal.SELL_STOP_LOSS], CODES[Signal.SELL_TRAILING_TP], CODES[Signal.SELL_RSI_EXIT], CODES[Signal.BUY]],
+            CODES[Signal.HOLD]
+        ).astype(np.int8)
+
+    def exit_levels(self, entry_price, atr):
+        config = self.config
+        return (entry_price - atr * config['ATR_MULTIPLIER_SL'], atr * config['ATR_MULTIPLIER_TP'],
+                entry_price * (1 + config['FEE_RATE'] * 2 + config['MIN_PROFIT_BUFFER']))
+
+
+@register_strategy
+class RsiProStrategy(Strategy):
+    """
+    check_rsi_strategy_pro on the engine's RSI: buy below 30, stop out
+    STOP_LOSS_PCT under the entry, take profit above RSI 70 or TAKE_PROFIT_PCT.
+    """
+
+    name = "rsi_pro"
+    requires = ('rsi',)
+
+    def on_bar_close(self, state):
+        config = self.config
+        rsi = state.rsi
+        # 1. EXIT LOGIC (Risk Management), price rules also while RSI warms up
+        if state.entry_price > 0:
+            if state.price < state.entry_price * (1 - config['STOP_LOSS_PCT']):
+                return Signal.SELL_STOP_LOSS
+            if (rsi is not None and rsi > 70) or state.price > state.entry_price * (1 + config['TAKE_PROFIT_PCT']):
+                return Signal.SELL_TAKE_PROFIT
+        # 2. ENTRY LOGIC
+        if rsi is not None and rsi < 30:
+            return Signal.BUY
+        return Signal.HOLD
+
+    on_tick = on_bar_close
+
+    def evaluate(self, batch):
+        config = self.config
+        in_position = batch.entry_price > 0
+        stop = in_position & (batch.price < batch.entry_price * (1 - config['STOP_LOSS_PCT']))
+        take_profit = in_position & ((batch.rsi > 70) | (batch.price > batch.entry_price * (1 + config['TAKE_PROFIT_PCT'])))
+        return np.select(
+            [stop, take_profit, batch.rsi < 30],
+            [CODES[Signal.SELL_STOP_LOSS], CODES[Signal.SELL_TAKE_PROFIT], CODES[Signal.BUY]],
+            CODES[Signal.HOLD]
+        ).astype(np.int8)
+
+    def exit_levels(self, entry_price, atr):
+        # Fixed stop only; the take-profit is above the price, which the exit stream doesn't watch
+        return entry_price * (1 - self.config['STOP_LOSS_PCT']), float('inf'), float('inf')
+
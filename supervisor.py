@@ -0,0 +1,264 @@
+import argparse
+import asyncio
+import glob
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from colorama import init, Fore, Style
+from config import get_config
+from coordinator import Coordinator, WorkerLink
+from journal import StateJournal
+from instrumentation import serve_metrics
+
+# Seconds a stopping worker gets to checkpoint its journal before it is killed
+STOP_TIMEOUT = 20
+
+def shard_symbols(symbols, workers):
+    """Round-robin split of the (symbol, timeframe, quantity) entries; stable while SYMBOLS and the worker count are."""
+    return [shard for shard in (symbols[i::workers] for i in range(workers)) if shard]
+
+def worker_file(path, index):
+    """A worker's own copy of a per-process file (journal prefix, kline cache)."""
+    return f"{path}.w{index}"
+
+def seed_kline_caches(cache_file, workers):
+    """
+    Starts missing worker kline caches from the single-process cache, so the
+    first sharded start doesn't refetch every symbol's history over REST.
+    """
+    if not os.path.exists(cache_file):
+        return
+    source = None
+    for index in range(workers):
+        path = worker_file(cache_file, index)
+        if os.path.exists(path):
+            continue
+        source = source or sqlite3.connect(cache_file)
+        target = sqlite3.connect(path)
+        source.backup(target)
+        target.close()
+    if source is not None:
+        source.close()
+
+def distribute_journals(state_file, shards):
+    """
+    Gives each worker a journal snapshot holding exactly its shard's symbols,
+    collected from the single-process journal and the worker journals of any
+    previous layout (so switching to the supervisor, or changing WORKERS,
+    keeps open positions). Only done when every journal was shut down cleanly:
+    WAL records would have to be replayed by their own process first.
+    """
+    prefixes = [state_file] + sorted(path[:-len('.snap')] for path in glob.glob(f"{glob.escape(state_file)}.w*.snap"))
+    symbols, seq = {}, 0
+    for prefix in prefixes:
+        journal = StateJournal(prefix)
+        if not os.path.exists(journal.snapshot_path):
+            continue
+        state, records = journal.load()
+        if records:
+            print(Fore.YELLOW + f"[SUPERVISOR] {journal.wal_path} has {len(records)} unreplayed record(s); "
+                                f"keeping the journals as they are.")
+            return
+        symbols.update(state) # Worker journals are newer than the single-process one
+        seq = max(seq, journal.seq)
+    if not symbols:
+        return
+
+    configured = {symbol for shard in shards for symbol, _, _ in shard}
+    for index, shard in enumerate(shards):
+        state = {symbol: symbols[symbol] for symbol, _, _ in shard if symbol in symbols}
+        if index == 0:
+            # Symbols no longer configured are carried along, as bot.py's journal does
+            state.update({symbol: value for symbol, value in symbols.items() if symbol not in configured})
+        StateJournal(worker_file(state_file, index)).write_snapshot(state, seq)
+    layout = {worker_file(state_file, i) for i in range(len(shards))}
+    for prefix in prefixes:
+        if prefix not in layout:
+            journal = StateJournal(prefix)
+            for path in (journal.snapshot_path, journal.wal_path, journal.rotated_path):
+                if os.path.exists(path):
+                    os.replace(path, f"{path}.sharded") # Superseded; kept for reference
+    print(Fore.GREEN + f"[SUPERVISOR] Journal state of {len(symbols)} symbol(s) assigned to {len(shards)} worker(s).")
+
+def worker_main(index, overrides, total_symbols, socket_path):
+    """Process entry of one shard: bot.main with a WorkerLink, until SIGTERM or the supervisor goes away."""
+    # Ctrl+C reaches the whole process group; the supervisor stops workers with SIGTERM instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init(autoreset=True)
+    from persistence import close_pipeline
+    try:
+        asyncio.run(_run_worker(index, overrides, total_symbols, socket_path))
+    finally:
+        close_pipeline()
+
+async def _run_worker(index, overrides, total_symbols, socket_path):
+    import bot # Loaded in the worker only; the supervisor never pays for it
+
+    link = WorkerLink(index, overrides, total_symbols, socket_path)
+    reader = await link.connect()
+    main = asyncio.create_task(bot.main(link=link))
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main.cancel)
+    await asyncio.wait([main, reader], return_when=asyncio.FIRST_COMPLETED)
+    if not main.done():
+        print(Fore.RED + f"[WORKER {index}] Lost the supervisor; stopping.")
+        main.cancel()
+    await asyncio.gather(main, return_exceptions=True)
+
+
+class Supervisor:
+    """
+    Runs the bot as worker processes (one per core by default), each owning a
+    shard of SYMBOLS: its websockets, sessions, journal, kline cache and
+    persistence.
+
+    - Workers share the supervisor's Coordinator: one rate limiter for the
+      API key, and one aggregated portfolio/metrics view (status lines and
+      /metrics on METRICS_PORT).
+    - A worker that dies is restarted with exponential back-off; it resumes
+      its positions from its own journal (<STATE_FILE>.w<index>).
+    """
+
+    def __init__(self, config, workers=None, target=None):
+        self.config = config
+        count = workers or config['WORKERS'] or os.cpu_count() or 1
+        self.shards = shard_symbols(config['SYMBOLS'], count)
+        self.total_symbols = len(config['SYMBOLS'])
+        self.socket_path = os.path.abspath(config['SUPERVISOR_SOCKET'])
+        self.target = target or worker_main # Process entry, (index, overrides, total_symbols, socket_path)
+        self.coordinator = Coordinator()
+        self.processes = [None] * len(self.shards)
+        self.started = [0.0] * len(self.shards)
+        self.next_start = [0.0] * len(self.shards)
+        self.failures = [0] * len(self.shards) # Consecutive early exits, for the back-off
+        self.restarts = [0] * len(self.shards)
+        self._context = multiprocessing.get_context('spawn') # No inherited event loop or sockets
+
+    def overrides(self, index):
+        """Config values of one worker process."""
+        return {
+            'SYMBOLS': self.shards[index],
+            'STATE_FILE': worker_file(self.config['STATE_FILE'], index),
+            # Each worker's SQLite cache has a single writer: with a shared file every worker's
+            # batched insert would wait on the others' write locks at each common bar close
+            'KLINE_CACHE_FILE': worker_file(self.config['KLINE_CACHE_FILE'], index),
+            'METRICS_PORT': 0, # Served by the supervisor for every worker
+            'LOG_COMPACT': index == 0 # One compacting writer per trade-log directory
+        }
+
+    def start_worker(self, index):
+        process = self._context.Process(
+            target=self.target, name=f"sct-worker-{index}",
+            args=(index, self.overrides(index), self.total_symbols, self.socket_path)
+        )
+        process.start()
+        self.processes[index] = process
+        self.started[index] = time.monotonic()
+        symbols = ", ".join(symbol for symbol, _, _ in self.shards[index])
+        print(Fore.CYAN + f"[SUPERVISOR] Worker {index} (pid {process.pid}): {symbols}")
+
+    async def run(self):
+        print(Style.BRIGHT + Fore.CYAN + f"\n=== Supervisor: {self.total_symbols} symbol(s) across {len(self.shards)} worker(s) ===")
+        distribute_journals(self.config['STATE_FILE'], self.shards)
+        seed_kline_caches(self.config['KLINE_CACHE_FILE'], len(self.shards))
+        # `kill <pid>` stops the workers cleanly too
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        tasks = [asyncio.create_task(self.coordinator.serve(self.socket_path))]
+        await asyncio.wait([tasks[0], asyncio.create_task(self.coordinator.ready.wait())], return_when=asyncio.FIRST_COMPLETED)
+        if self.config['METRICS_PORT']:
+            tasks.append(asyncio.create_task(serve_metrics(self.config['METRICS_PORT'], self.coordinator.metrics)))
+        tasks.append(asyncio.create_task(self.report_status(self.config['STATUS_INTERVAL'])))
+        tasks.append(asyncio.create_task(self.monitor(self.config['WORKER_MAX_BACKOFF'])))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            self.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def monitor(self, max_backoff, interval=0.5):
+        """Starts the workers and restarts any that exit."""
+        while True:
+            now = time.monotonic()
+            for index, process in enumerate(self.processes):
+                if process is not None and process.exitcode is not None:
+                    uptime = now - self.started[index]
+                    if uptime > max_backoff:
+                        self.failures[index] = 0 # Ran fine for a while: restart right away
+                    delay = min(max_backoff, 2 ** self.failures[index] - 1)
+                    self.failures[index] += 1
+                    print(Fore.RED + f"[SUPERVISOR] Worker {index} exited with code {process.exitcode} after {uptime:.0f}s; "
+                                     f"restarting in {delay}s.")
+                    self.coordinator.forget(index)
+                    self.processes[index] = None
+                    self.next_start[index] = now + delay
+                    self.restarts[index] += 1
+                if self.processes[index] is None and now >= self.next_start[index]:
+                    self.start_worker(index)
+            await asyncio.sleep(interval)
+
+    def stop(self):
+        """SIGTERM every worker (they checkpoint their journals), then kill stragglers."""
+        running = [p for p in self.processes if p is not None and p.exitcode is None]
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.exitcode is None:
+                print(Fore.RED + f"[SUPERVISOR] {process.name} did not stop in time; killing it.")
+                process.kill()
+                process.join()
+        self.processes = [None] * len(self.shards)
+
+    async def report_status(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            print(self.render_status(), end='', flush=True)
+
+    def render_status(self):
+        """Status lines for the whole portfolio: one per symbol, one per worker and a total."""
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        lines = []
+        net_worth = pnl = 0.0
+        trades = wins = 0
+        for row in self.coordinator.sessions():
+            net_worth += row['net_worth']
+            pnl += row['pnl']
+            trades += row['trades']
+            wins += row['wins']
+            lines.append(
+                f"[STATUS] {stamp} symbol={row['symbol']} price={row['price']:.8g} signal={row['signal']} "
+                f"position={int(row['position'])} nw={row['net_worth']:.2f} trades={row['trades']} pnl={row['pnl']:.2f}"
+            )
+        for index, process in enumerate(self.processes):
+            report = self.coordinator.reports.get(index)
+            age = f"{time.time() - report['received']:.0f}s" if report else "-"
+            lines.append(
+                f"[WORKER] {stamp} worker={index} pid={process.pid if process else '-'} "
+                f"alive={int(process is not None and process.exitcode is None)} symbols={len(self.shards[index])} "
+                f"restarts={self.restarts[index]} last_report={age}"
+            )
+        win_rate = wins / trades * 100 if trades else 0.0
+        limiter = self.coordinator.limiter
+        lines.append(
+            f"[STATUS] {stamp} symbol=ALL nw={net_worth:.2f} trades={trades} win_rate={win_rate:.1f} pnl={pnl:.2f} "
+            f"ticks={self.coordinator.metrics.counters.get('ticks', 0)} weight={limiter.used_weight} waits={limiter.waits}"
+        )
+        return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Runs the bot sharded across worker processes.")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: WORKERS, or one per CPU core)")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(get_config(), args.workers)
+    try:
+        asyncio.run(supervisor.run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print(f"\n{Fore.YELLOW}System shutdown requested.")
@@ -0,0 +1,100 @@
+from decimal import Decimal
+from accounting import Instrument, Ledger, filters_from_symbol_info
+
+SYMBOL = 'BTCUSDT'
+
+def ledger(cash=1000, tick_size='0.01', step_size='0.001'):
+    book = Ledger(cash=cash)
+    book.register(Instrument(SYMBOL, tick_size, step_size))
+    return book
+
+def test_prices_and_quantities_round_to_the_grid():
+    instrument = Instrument(SYMBOL, '0.01000000', '0.00001000')
+    assert (instrument.price_decimals, instrument.qty_decimals) == (2, 5)
+    assert instrument.price_ticks('100.005') == 10001 # Half up
+    assert instrument.price_ticks(Decimal('100.004')) == 10000
+    assert instrument.price_ticks(100.01) == 10001 # Float path
+    assert instrument.qty_steps('0.123456') == 12346
+    assert instrument.qty_steps(0.12345) == 12345
+    assert instrument.floor_steps(0.123459) == 12345 # Never rounds a balance up
+    assert instrument.price(10001) == Decimal('100.01')
+    assert instrument.quantity(12345) == Decimal('0.12345')
+    # 0.12345 BTC at 100.01 = 12.3462345 USDT, in 10^-8 units
+    assert instrument.value_units(12345, 10001) == 1234623450
+
+def test_value_truncates_below_the_cash_precision():
+    instrument = Instrument(SYMBOL, '0.01', '0.001', cash_decimals=2)
+    # 0.007 x 1.23 = 0.00861 -> 0 cents; 0.7 x 1.23 = 0.861 -> 86 cents
+    assert instrument.value_units(7, 123) == 0
+    assert instrument.value_units(700, 123) == 86
+
+def test_buy_debits_value_and_fee():
+    book = ledger()
+    assert book.apply_fill(SYMBOL, 'BUY', '0.003', '100.00', '0.01') == (0, 0, 0)
+    position = book.positions[SYMBOL]
+    assert book.cash_units == 100000000000 - 30000000 - 1000000
+    assert (position.steps, position.cost_units, position.notional_units, position.fees_units) == (3, 31000000, 30000000, 1000000)
+    assert book.average_entry(SYMBOL) == Decimal('100.00')
+
+def test_partial_sells_release_the_basis_pro_rata():
+    book = ledger()
+    book.apply_fill(SYMBOL, 'BUY', '0.003', '100.00', '0.01')
+
+    # A third of 31_000_000, rounded down; the remainder stays with the open quantity
+    assert book.apply_fill(SYMBOL, 'SELL', '0.001', '110.00') == (666667, 10333333, 11000000)
+    assert book.positions[SYMBOL].cost_units == 20666667
+    assert book.positions[SYMBOL].notional_units == 20000000
+
+    assert book.apply_fill(SYMBOL, 'SELL', '0.002', '110.00') == (1333333, 20666667, 22000000)
+    position = book.positions[SYMBOL]
+    assert (position.steps, position.cost_units, position.notional_units) == (0, 0, 0)
+    assert position.realized_units == 2000000 # 33_000_000 proceeds - 31_000_000 cost, nothing lost to rounding
+    assert book.cash_units == 100000000000 + 2000000
+
+def test_sell_fee_reduces_proceeds():
+    book = ledger()
+    book.apply_fill(SYMBOL, 'BUY', '0.002', '100.00')
+    assert book.apply_fill(SYMBOL, 'SELL', '0.002', '100.00', '0.02') == (-2000000, 20000000, 18000000)
+    assert book.positions[SYMBOL].fees_units == 2000000
+
+def test_oversell_clamps_the_position():
+    book = ledger()
+    book.apply_fill(SYMBOL, 'BUY', '0.002', '100.00')
+    # Sold more than tracked: the whole basis is released, the cash is what the exchange paid
+    assert book.apply_fill(SYMBOL, 'SELL', '0.003', '100.00') == (10000000, 20000000, 30000000)
+    position = book.positions[SYMBOL]
+    assert (position.steps, position.cost_units, position.notional_units) == (0, 0, 0)
+    assert book.cash_units == 100000000000 + 10000000
+    # Selling while flat books the proceeds without a basis
+    assert book.apply_fill(SYMBOL, 'SELL', '0.001', '100.00') == (10000000, 0, 10000000)
+    assert book.positions[SYMBOL].steps == 0
+
+def test_net_worth_at_leaves_the_mark():
+    book = ledger()
+    book.apply_fill(SYMBOL, 'BUY', '0.003', '100.00', '0.01')
+    marked = book.net_worth_units()
+    assert marked == 100000000000 - 1000000
+    assert book.net_worth_units_at(SYMBOL, '120.00') == 100000000000 - 31000000 + 36000000
+    assert book.net_worth_units() == marked
+    assert book.positions[SYMBOL].last_ticks == 10000
+    assert book.net_worth_units_at('ETHUSDT', '5.00') == marked # No position: nothing to revalue
+
+    book.mark(SYMBOL, '120.00')
+    assert book.net_worth_units() == book.net_worth_units_at(SYMBOL, '120.00')
+    assert book.unrealized_units(SYMBOL) == 36000000 - 31000000
+
+def test_state_round_trip():
+    book = ledger()
+    book.apply_fill(SYMBOL, 'BUY', '0.003', '100.00', '0.01')
+    book.apply_fill(SYMBOL, 'SELL', '0.001', '110.00')
+    restored = Ledger()
+    restored.load_state(book.state())
+    assert restored.state() == book.state()
+    assert restored.summary() == book.summary()
+
+def test_filters_from_symbol_info():
+    info = {'filters': [{'filterType': 'PRICE_FILTER', 'tickSize': '0.01000000'},
+                        {'filterType': 'LOT_SIZE', 'stepSize': '0.00001000'}]}
+    assert filters_from_symbol_info(info) == ('0.01000000', '0.00001000')
+    assert filters_from_symbol_info({'filters': []}) is None
+    assert filters_from_symbol_info(None) is None
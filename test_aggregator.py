@@ -0,0 +1,109 @@
+import random
+import pandas as pd
+import pytest
+from aggregator import CandleAggregator, TimeframeView
+from indicators import IndicatorEngine
+from kline_buffer import KlineBuffer
+from kline_store import KlineStore
+
+MINUTE = 60 * 1000
+START = 1767225600000 + 7 * MINUTE # 2026-01-01 00:07 UTC: the first 5m and 1h bars are partial
+
+def base_klines(count, seed=3, missing=()):
+    """1m klines (open_time, o, h, l, c, v) of a random walk, minus the `missing` indexes."""
+    rng = random.Random(seed)
+    price = 100.0
+    rows = []
+    for i in range(count):
+        close = price * (1 + rng.gauss(0, 0.002))
+        if i not in missing:
+            rows.append((START + i * MINUTE, price, max(price, close) * (1 + rng.random() * 0.001),
+                         min(price, close) * (1 - rng.random() * 0.001), close, rng.uniform(1, 10)))
+        price = close
+    return rows
+
+def resampled(rows, rule):
+    df = pd.DataFrame(rows, columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
+    df.index = pd.to_datetime(df['open_time'], unit='ms')
+    bars = df.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+    return [(int(t.value // 10 ** 6), *row) for t, row in zip(bars.index, bars.itertuples(index=False))]
+
+def assert_bars(actual, expected):
+    assert [bar[0] for bar in actual] == [bar[0] for bar in expected]
+    for got, want in zip(actual, expected):
+        assert got[1:] == pytest.approx(want[1:], rel=1e-12)
+
+def aggregate(rows, timeframe, updates=3):
+    """Feeds each 1m candle as a few open updates then its close; returns (completed, aggregator)."""
+    aggregator = CandleAggregator(timeframe, '1m')
+    completed = []
+    for open_time, o, h, l, c, v in rows:
+        for u in range(1, updates + 1):
+            # Partial candles never count twice; after a gap, the first update completes the previous bar
+            completed += aggregator.add(open_time, o, h, l, o + (c - o) * u / (updates + 1), v * u / (updates + 1), False)
+        completed += aggregator.add(open_time, o, h, l, c, v, True)
+    return completed, aggregator
+
+@pytest.mark.parametrize('timeframe, rule', [('5m', '5min'), ('1h', '1h')])
+def test_bars_match_pandas_resample(timeframe, rule):
+    rows = base_klines(60 * 5 + 21)
+    completed, aggregator = aggregate(rows, timeframe)
+    expected = resampled(rows, rule)
+    # Every bucket but the one in progress completes; only the first misses base candles
+    assert_bars([bar for bar, _ in completed], expected[:-1])
+    assert [full for _, full in completed] == [False] + [True] * (len(expected) - 2)
+    assert_bars([aggregator.current()], expected[-1:])
+
+def test_open_candle_is_overlaid_not_folded():
+    rows = base_klines(3)
+    aggregator = CandleAggregator('5m', '1m')
+    aggregator.add(*rows[0], True)
+    aggregator.add(rows[1][0], rows[1][1], 200.0, 50.0, 150.0, 5.0, False)
+    assert aggregator.current()[2:] == (200.0, 50.0, 150.0, rows[0][5] + 5.0)
+    aggregator.add(*rows[1], True) # The close replaces the open update
+    assert_bars([aggregator.current()], resampled(rows[:2], '5min'))
+    assert aggregator.add(*rows[1], True) == [] # Duplicate close
+
+def test_gaps_are_flagged_but_still_aggregated():
+    rows = base_klines(23 + 31, missing={25, 26, 47}) # 00:32 and 00:33 gone, then 00:54 (the last of its bar)
+    completed, _ = aggregate(rows, '5m', updates=1)
+    expected = resampled(rows, '5min')
+    assert_bars([bar for bar, _ in completed], expected[:-1])
+    partial = {bar[0] for bar, full in completed if not full}
+    assert partial == {START - 2 * MINUTE, START + 23 * MINUTE, START + 43 * MINUTE}
+
+def test_invalid_timeframes():
+    for timeframe, base in (('1m', '1m'), ('7m', '5m'), ('1M', '1m'), ('15m', '1x')):
+        with pytest.raises(ValueError):
+            CandleAggregator(timeframe, base)
+
+def view():
+    return TimeframeView('5m', '1m', IndicatorEngine(rsi_period=5, ema_period=10, atr_period=5), capacity=100)
+
+def test_restore_from_the_kline_store(tmp_path):
+    rows = base_klines(60 * 4 + 12)
+    store = KlineStore(str(tmp_path / 'klines.db'))
+    live = view()
+    for row in rows:
+        # As SymbolSession.on_kline: only complete bars are cached
+        store.save('BTCUSDT', '5m', live.update(*row, True))
+
+    # Restart: cached 5m bars plus the newest 1m candles from the base buffer
+    base = KlineBuffer(capacity=30)
+    base.extend([list(row) for row in rows[-30:]])
+    restored = view()
+    restored.bootstrap(store.load('BTCUSDT', '5m', 100), base)
+    store.close()
+
+    assert restored.buffer.window('open_time').tolist() == live.buffer.window('open_time').tolist()[1:] # Partial first bar never cached
+    assert restored.buffer.window('close').tolist() == live.buffer.window('close').tolist()[1:]
+    assert restored.aggregator.current() == pytest.approx(live.aggregator.current())
+    assert restored.indicators[1] == pytest.approx(live.indicators[1], rel=1e-3) # EMA seeded one bar later
+    assert_bars(store_rows(tmp_path), resampled(rows, '5min')[1:-1])
+
+def store_rows(tmp_path):
+    store = KlineStore(str(tmp_path / 'klines.db'))
+    try:
+        return store.load('BTCUSDT', '5m', 100)
+    finally:
+        store.close()
@@ -0,0 +1,112 @@
+import asyncio
+import contextlib
+import io
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import compute_indicators, compute_trend_ok, has_header, load_klines, simulate
+from bench import isolated_run
+from config import build_config
+from fake_exchange import ReplayExchange, FakeAsyncClient, synthesize, message_price
+from order_manager import OrderManager
+from portfolio_tracker import PortfolioTracker
+from session import SymbolSession
+from strategies import load_strategy, strategy_name
+
+SYMBOL = 'BTCUSDT'
+# Short RSI for frequent entries; a trailing offset too wide to trigger, since
+# simulate() can't tell where inside a bar the exit stream would have trailed out
+ENV = {'RSI_PERIOD': '5', 'ATR_MULTIPLIER_TP': '1000', 'TREND_TIMEFRAME': ''}
+
+def market(seed, exit_stream):
+    # One (closed) kline message per candle: open-candle on_tick decisions have no OHLC equivalent
+    return synthesize([SYMBOL], candles=600, updates_per_candle=1, seed=seed, volatility=0.004,
+                      exit_stream=exit_stream, ticks_per_update=10)
+
+async def drive(session, client, messages):
+    orders = OrderManager(client)
+    for message in messages:
+        data = message['data']
+        price = client.exchange.last_prices[data['s']] = message_price(data)
+        if 'k' not in data:
+            signal = session.on_price(price)
+        else:
+            signal, _ = session.on_kline(data['k'], data.get('E'))
+            price = session.last_price
+        if signal is not None:
+            await session.execute(orders, signal, price)
+
+def live_fills(history, messages, exit_stream, monkeypatch):
+    """(side, price, label) of every fill SymbolSession books on the replay exchange."""
+    fills = []
+    log_fill = SymbolSession._log_fill
+
+    def record(self, side, fill, signal_price, label="STRATEGY"):
+        fills.append((side, float(fill['price']), label))
+        log_fill(self, side, fill, signal_price, label)
+
+    monkeypatch.setattr(SymbolSession, '_log_fill', record)
+    with isolated_run([SYMBOL], '1m', exit_stream):
+        os.environ.update(ENV)
+        config = build_config({})
+        symbol, timeframe, quantity = config['SYMBOLS'][0]
+        tracker = PortfolioTracker(initial_balance=1000.0, config=config, symbol=symbol, history_file='equity.npz')
+        session = SymbolSession(symbol, timeframe, quantity, config, tracker)
+        session.bootstrap(history[(symbol, timeframe)])
+        client = FakeAsyncClient(ReplayExchange(messages, history=history))
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(drive(session, client, messages))
+    return fills, session.in_position, config
+
+def backtest_fills(history, messages, config):
+    """The same klines through simulate(), trading from the first replayed bar."""
+    rows = history[(SYMBOL, '1m')]
+    klines = [[float(r[i]) for i in range(6)] for r in rows]
+    klines += [[m['data']['k'][f] for f in 'tohlcv'] for m in messages if 'k' in m['data'] and m['data']['k']['x']]
+    df = pd.DataFrame(np.array(klines, dtype=np.float64), columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
+    indicators = compute_indicators(df['close'], df['volume'], config['RSI_PERIOD'], config['EMA_PERIOD'],
+                                    config['ATR_PERIOD'], highs=df['high'], lows=df['low'])
+    strategy = load_strategy(strategy_name(config, SYMBOL), config)
+    trend_ok = compute_trend_ok(df, config, '1m') if 'trend' in strategy.requires else None
+    start = len(rows)
+    intrabar = {'highs': df['high'][start:], 'lows': df['low'][start:]} if config['EXIT_STREAM'] else {}
+    result = simulate(df['close'][start:], {k: v[start:] for k, v in indicators.items()}, fee_rate=config['FEE_RATE'],
+                      strategy=strategy, trend_ok=trend_ok[start:] if trend_ok is not None else None, **intrabar)
+    fills = []
+    for trade in result['trades']:
+        fills.append(('BUY', float(trade['entry_price']), 'STRATEGY'))
+        fills.append(('SELL', float(trade['exit_price']), trade['type']))
+    if result['open_position']:
+        fills.append(('BUY', None, 'STRATEGY'))
+    return fills, result['open_position']
+
+@pytest.mark.parametrize('exit_stream', ['', 'bookTicker'])
+def test_simulate_matches_the_live_session(exit_stream, monkeypatch):
+    history, messages = market(seed=4, exit_stream=exit_stream)
+    live, live_open, config = live_fills(history, messages, exit_stream, monkeypatch)
+    simulated, simulated_open = backtest_fills(history, messages, config)
+
+    assert len([f for f in live if f[0] == 'SELL']) >= 3
+    assert [(side, label) for side, _, label in live] == [(side, label) for side, _, label in simulated]
+    assert live_open == simulated_open
+    stops = 0
+    for (side, live_price, label), (_, simulated_price, _) in zip(live, simulated):
+        if simulated_price is None:
+            continue # Still open at the end of the replay
+        if exit_stream and label == 'STOP_LOSS':
+            # Live fills at the first tick through the stop, simulate() at the stop itself
+            assert simulated_price * 0.995 < live_price <= simulated_price
+            stops += 1
+        else:
+            assert live_price == pytest.approx(simulated_price, rel=1e-9)
+    if exit_stream:
+        assert stops >= 1
+
+def test_header_detection(tmp_path):
+    assert has_header('open_time') and not has_header('1700000000000') and not has_header(1.5)
+    path = tmp_path / 'klines.csv'
+    path.write_text("Open_Time,Open,High,Low,Close,Volume\n60000,2,3,1,2.5,10\n0,1,2,1,2,11\n")
+    df = load_klines(path)
+    assert df['open_time'].tolist() == [0, 60000]
+    assert df['close'].dtype == np.float64
@@ -0,0 +1,68 @@
+import asyncio
+import contextlib
+import io
+import pytest
+import bot
+from bench import isolated_run
+from config import build_config, get_provider
+from fake_exchange import ReplayExchange, FakeAsyncClient, FakeSocketManager, synthesize, message_price, _exit_message
+from instrumentation import metrics
+from journal import StateJournal
+
+SYMBOL = 'BTCUSDT'
+
+def kline_message(open_time, price, closed, event_time):
+    return {'stream': f"{SYMBOL.lower()}@kline_1m", 'data': {
+        'e': 'kline', 'E': event_time, 's': SYMBOL,
+        'k': {'t': open_time, 'T': open_time + 59999, 's': SYMBOL, 'i': '1m', 'o': f"{price:.8f}", 'c': f"{price:.8f}",
+              'h': f"{price:.8f}", 'l': f"{price:.8f}", 'v': "1.00000000", 'x': closed}
+    }}
+
+async def replay(exchange, timeout=10):
+    main = asyncio.create_task(bot.main(
+        client_factory=FakeAsyncClient.factory(exchange),
+        socket_manager_factory=lambda client: FakeSocketManager(client, exchange)
+    ))
+    try:
+        await asyncio.wait_for(exchange.finished.wait(), timeout)
+        processed = -1
+        while processed != metrics.counters.get('ticks', 0): # Let the workers drain their inboxes
+            processed = metrics.counters.get('ticks', 0)
+            await asyncio.sleep(0.05)
+    finally:
+        main.cancel()
+        await asyncio.gather(main, return_exceptions=True)
+
+@pytest.mark.parametrize('exit_stream', ['bookTicker', 'aggTrade'])
+def test_tick_through_the_stop_sells_once(exit_stream):
+    history, _ = synthesize([SYMBOL], candles=0, seed=3)
+    rows = history[(SYMBOL, '1m')]
+    entry = float(rows[-1][4])
+    open_time = rows[-1][0] + 60000
+
+    # Open position from a previous run, then: an in-range update, a tick far below
+    # any ATR stop, and the candle closing even lower
+    tick = _exit_message(SYMBOL, exit_stream, entry * 0.9, open_time + 20000, 1)
+    messages = [
+        kline_message(open_time, entry, False, open_time + 10000),
+        tick,
+        kline_message(open_time, entry * 0.88, True, open_time + 59999)
+    ]
+
+    with isolated_run([SYMBOL], '1m', exit_stream):
+        config = build_config({})
+        quantity = config['SYMBOLS'][0][2]
+        journal = StateJournal(config['STATE_FILE'])
+        journal.append('fill', SYMBOL, id='previous-run', side='BUY', qty=str(quantity), price=str(entry), fee='0',
+                       label='STRATEGY', ts='2026-01-01 00:00:00')
+        journal.close()
+
+        exchange = ReplayExchange(messages, history=history, balances={'USDT': 10000.0, 'BTC': quantity})
+        get_provider().refresh()
+        metrics.counters.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(replay(exchange))
+
+    assert [o['side'] for o in exchange.orders] == ['SELL']
+    assert float(exchange.orders[0]['fills'][0]['price']) == pytest.approx(message_price(tick['data']))
+    assert metrics.counters.get('fast_exits') == 1
@@ -0,0 +1,39 @@
+import os
+import pytest
+from dotenv import load_dotenv
+from config import HOT_RELOAD_KEYS, ConfigProvider
+
+@pytest.fixture
+def env_file(tmp_path):
+    saved_env = dict(os.environ)
+    for key in HOT_RELOAD_KEYS:
+        os.environ.pop(key, None)
+    path = tmp_path / '.env'
+    path.write_text("RSI_PERIOD=7\nATR_MULTIPLIER_SL=3.0\nEMA_PERIOD=20\n")
+    try:
+        yield path
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+def reload(provider, path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime)) # Distinct mtime even within the filesystem's timestamp granularity
+    return provider.reload_strategy_params()
+
+def test_removed_keys_reset_to_their_defaults(env_file):
+    load_dotenv(env_file) # As at import of config.py
+    provider = ConfigProvider(env_file=str(env_file))
+    provider._on_ec2 = False
+    config = provider.get()
+    assert (config['RSI_PERIOD'], config['ATR_MULTIPLIER_SL'], config['EMA_PERIOD']) == (7, 3.0, 20)
+
+    changed = reload(provider, env_file, "RSI_PERIOD=9\n", 1000000000)
+    assert changed == {'RSI_PERIOD': 9, 'ATR_MULTIPLIER_SL': 2.0, 'EMA_PERIOD': 200}
+    assert provider.get() is config and config['EMA_PERIOD'] == 200
+
+    os.environ['STOP_LOSS_PCT'] = '0.05' # Set by the process environment, not .env
+    provider.get(refresh=True)
+    changed = reload(provider, env_file, "", 1000000100)
+    assert changed == {'RSI_PERIOD': 14}
+    assert config['STOP_LOSS_PCT'] == 0.05
@@ -0,0 +1,76 @@
+import random
+import pytest
+from backtest import compute_indicators
+from indicators import IndicatorEngine
+from strategies import calculate_metrics
+
+PERIODS = {'rsi_period': 14, 'ema_period': 50, 'atr_period': 14}
+
+def bars(count=400, seed=7):
+    """(close, volume, high, low) of a random walk."""
+    rng = random.Random(seed)
+    price = 100.0
+    rows = []
+    for _ in range(count):
+        close = price * (1 + rng.gauss(0, 0.01))
+        rows.append((close, rng.uniform(1, 10), max(price, close) * (1 + rng.random() * 0.004),
+                     min(price, close) * (1 - rng.random() * 0.004)))
+        price = close
+    return rows
+
+def assert_metrics(actual, expected):
+    rsi, ema, atr, vol_confirm = actual
+    assert rsi == pytest.approx(expected[0], rel=1e-9)
+    assert ema == pytest.approx(expected[1], rel=1e-9)
+    assert atr == pytest.approx(expected[2], rel=1e-9)
+    assert vol_confirm == expected[3]
+
+@pytest.mark.parametrize('with_range', [True, False])
+def test_engine_matches_the_vectorized_backtest(with_range):
+    rows = bars()
+    closes, volumes, highs, lows = (list(column) for column in zip(*rows))
+    if not with_range:
+        highs = lows = None # ATR falls back to the close-to-close move
+    vectorized = compute_indicators(closes, volumes, highs=highs, lows=lows, **PERIODS)
+
+    committed = IndicatorEngine(**PERIODS)
+    for i, (close, volume, high, low) in enumerate(rows):
+        high, low = (high, low) if with_range else (None, None)
+        expected = tuple(vectorized[k][i] for k in ('rsi', 'ema', 'atr', 'vol_confirm'))
+        # The open candle at its final price, from the state committed so far
+        before = committed.state()
+        peeked = committed.peek(close, volume, high, low)
+        assert committed.state() == before # peek() never mutates
+        committed.update(close, volume, high, low)
+        if not vectorized['ready'][i]:
+            assert committed.metrics() == (None, None, None, None)
+            continue
+        assert_metrics(committed.metrics(), expected)
+        assert_metrics(peeked, expected)
+
+def test_engine_matches_calculate_metrics():
+    rows = bars()
+    engine = IndicatorEngine(**PERIODS)
+    for i, (close, volume, high, low) in enumerate(rows):
+        engine.update(close, volume, high, low)
+        if i + 1 < PERIODS['ema_period'] or i % 25:
+            continue
+        window = rows[:i + 1]
+        expected = calculate_metrics([r[0] for r in window], [r[1] for r in window],
+                                     highs=[r[2] for r in window], lows=[r[3] for r in window], **PERIODS)
+        assert_metrics(engine.metrics(), expected)
+
+def test_seed_and_restore_continue_identically():
+    rows = bars(120)
+    reference = IndicatorEngine(**PERIODS)
+    for row in rows:
+        reference.update(*row)
+    restored = IndicatorEngine(**PERIODS)
+    for row in rows[:80]:
+        restored.update(*row)
+    resumed = IndicatorEngine(**PERIODS)
+    assert resumed.load_state(restored.state())
+    for row in rows[80:]:
+        resumed.update(*row)
+    assert resumed.metrics() == reference.metrics()
+    assert not IndicatorEngine(rsi_period=7).load_state(reference.state()) # Periods changed: nothing to reuse
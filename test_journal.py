@@ -0,0 +1,116 @@
+import contextlib
+import io
+import os
+from datetime import datetime
+from decimal import Decimal
+import pytest
+import portfolio_tracker
+import session as session_module
+from bench import isolated_run
+from bot import journal_state, restore_sessions
+from config import build_config
+from fake_exchange import synthesize
+from journal import StateJournal
+from order_manager import OrderManager
+from portfolio_tracker import PortfolioTracker
+from session import SymbolSession
+
+SYMBOL = 'BTCUSDT'
+
+
+class FrozenDatetime(datetime):
+    """Fill timestamps are taken separately by the session and the tracker; pin them to one second."""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 1, 2, 3, 4, 5)
+
+
+@pytest.fixture
+def workdir(monkeypatch):
+    monkeypatch.setattr(portfolio_tracker, 'datetime', FrozenDatetime)
+    monkeypatch.setattr(session_module, 'datetime', FrozenDatetime)
+    with isolated_run([SYMBOL], '1m') as path:
+        yield path
+
+def start(config, history):
+    """A bot start: bootstrap, restore from the journal, baseline checkpoint."""
+    journal = StateJournal(config['STATE_FILE'])
+    symbol, timeframe, quantity = config['SYMBOLS'][0]
+    tracker = PortfolioTracker(initial_balance=1000.0, config=config, symbol=symbol, history_file='equity.npz')
+    session = SymbolSession(symbol, timeframe, quantity, config, tracker, journal=journal)
+    session.bootstrap(history[(symbol, timeframe)])
+    with contextlib.redirect_stdout(io.StringIO()):
+        restore_sessions(journal, [session])
+    journal.checkpoint(journal_state(journal, [session]))
+    return journal, session
+
+def fill(session, orders, side, quantity, price, label="STRATEGY"):
+    client_order_id = session._journal_order(orders, side, quantity)
+    with contextlib.redirect_stdout(io.StringIO()):
+        session._log_fill(side, {'client_order_id': client_order_id, 'quantity': Decimal(quantity),
+                                 'price': Decimal(price), 'fee': Decimal('0.01')}, float(price), label=label)
+
+def test_crash_before_checkpoint_restores_the_session(workdir):
+    config = build_config({})
+    history, _ = synthesize([SYMBOL], candles=0, seed=5)
+    orders = OrderManager(client=None)
+
+    journal, session = start(config, history)
+    fill(session, orders, 'BUY', '0.01', '100.00')
+    fill(session, orders, 'SELL', '0.01', '105.00', label="TRAILING_TP")
+    # Periodic compaction (run_journal) in the middle of the run
+    journal.write_snapshot(journal_state(journal, [session]), journal.rotate())
+    fill(session, orders, 'BUY', '0.02', '101.00')
+    session._note_peak(110.0)
+    journal.flush_peaks()
+    session._journal_order(orders, 'SELL', 0.02) # In flight at the crash
+    journal.sync()
+    expected = session.state()
+    assert session.in_position and session.pending_orders
+    # Crash: no shutdown checkpoint
+
+    restored_journal, restored = start(config, history)
+    assert restored.state() == expected
+    assert restored.in_position and restored.highest_since_entry == 110.0
+    assert restored.tracker.stats.total.trades == 1
+    # The restart's checkpoint compacted everything into the snapshot
+    assert restored_journal.load()[1] == []
+    assert not os.path.exists(restored_journal.rotated_path)
+
+def test_rotation_without_a_snapshot_keeps_every_record(tmp_path):
+    path = str(tmp_path / 'state')
+    journal = StateJournal(path)
+    journal.append('order', SYMBOL, id='a')
+    journal.append('order', SYMBOL, id='b')
+    journal.rotate() # Crash before write_snapshot
+    journal.append('order', SYMBOL, id='c')
+    journal.close()
+
+    journal = StateJournal(path)
+    symbols, records = journal.load()
+    assert symbols == {}
+    assert [r['id'] for r in records] == ['a', 'b', 'c']
+    assert journal.seq == 3
+
+    seq = journal.rotate() # A second unfinished checkpoint folds into the first rotated WAL
+    assert seq == 3
+    assert [r['id'] for r in StateJournal(path).load()[1]] == ['a', 'b', 'c']
+    journal.write_snapshot({SYMBOL: {'in_position': False}}, seq)
+    journal.append('drop', SYMBOL, id='d')
+    with open(journal.wal_path, 'a') as f:
+        f.write('{"seq":5,"t":"dr') # Torn by a crash mid-write
+    journal.close()
+
+    symbols, records = StateJournal(path).load()
+    assert symbols == {SYMBOL: {'in_position': False}}
+    assert [(r['seq'], r['id']) for r in records] == [(4, 'd')]
+
+def test_sync_descriptor_outlives_rotation(tmp_path):
+    journal = StateJournal(str(tmp_path / 'state'))
+    assert journal.pending_sync() is None
+    journal.append('order', SYMBOL, id='a')
+    fd = journal.pending_sync()
+    assert journal.pending_sync() is None # Nothing new since
+    journal.rotate() # Closes the WAL file object while the fsync is still queued
+    journal.fsync_descriptor(fd)
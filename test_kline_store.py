@@ -0,0 +1,47 @@
+import asyncio
+import threading
+from bot import flush_kline_store
+from kline_store import KlineStore
+
+def kline(open_time, close=100.0):
+    return {'t': open_time, 'o': "99.5", 'h': "101.0", 'l': "99.0", 'c': f"{close}", 'v': "3.5", 'x': True}
+
+def test_closed_candles_are_queued_until_flushed(tmp_path):
+    store = KlineStore(str(tmp_path / 'klines.db'))
+    store.append('BTCUSDT', '1m', kline(0))
+    store.queue('BTCUSDT', '5m', [(0, 99.5, 101.0, 99.0, 100.0, 3.5)])
+    assert store.last_open_time('BTCUSDT', '1m') is None # Nothing written on the event loop
+    store.flush()
+    assert store.load('BTCUSDT', '1m', 10) == [(0, 99.5, 101.0, 99.0, 100.0, 3.5)]
+    assert store.load('BTCUSDT', '5m', 10) == [(0, 99.5, 101.0, 99.0, 100.0, 3.5)]
+    store.append('BTCUSDT', '1m', kline(60000))
+    store.close() # Flushes what is still queued
+    assert KlineStore(str(tmp_path / 'klines.db')).last_open_time('BTCUSDT', '1m') == 60000
+
+def test_writes_from_a_worker_thread(tmp_path):
+    store = KlineStore(str(tmp_path / 'klines.db'))
+    for i in range(500):
+        store.append('BTCUSDT', '1m', kline(i * 60000, 100.0 + i))
+    writer = threading.Thread(target=store.write, args=(store.take_pending(),))
+    writer.start()
+    while writer.is_alive():
+        store.load('BTCUSDT', '1m', 10) # Reads on the loop's thread meanwhile
+    writer.join()
+    assert store.last_open_time('BTCUSDT', '1m') == 499 * 60000
+    assert store.take_pending() == []
+    store.close()
+
+def test_flush_task_batches_off_the_loop(tmp_path):
+    store = KlineStore(str(tmp_path / 'klines.db'))
+
+    async def run():
+        task = asyncio.create_task(flush_kline_store(store, 0.01))
+        for i in range(3):
+            store.append(f"SYM{i}USDT", '1m', kline(0))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert [store.last_open_time(f"SYM{i}USDT", '1m') for i in range(3)] == [0, 0, 0]
+    store.close()
@@ -0,0 +1,90 @@
+import asyncio
+from decimal import Decimal
+import aiohttp
+from aiohttp import web
+from accounting import Instrument, Ledger
+from order_manager import OrderManager, RateLimiter, header_trace_config
+
+def full_response(fills):
+    return {'symbol': 'BTCUSDT', 'orderId': 1, 'clientOrderId': 'sct-1', 'status': 'FILLED', 'fills': [
+        {'price': price, 'qty': qty, 'commission': commission, 'commissionAsset': asset}
+        for price, qty, commission, asset in fills
+    ]}
+
+def test_base_asset_commission_keeps_the_quote_spent():
+    orders = OrderManager(client=None)
+    # 0.5 BTC for 30.00 + 20.20 USDT; 0.0005 BTC withheld as commission
+    response = full_response([('100.00', '0.3', '0.0003', 'BTC'), ('101.00', '0.2', '0.0002', 'BTC')])
+    fill = asyncio.run(orders._reconcile('BTCUSDT', 'BUY', 'sct-1', response))
+    assert fill['quantity'] == Decimal('0.4995')
+    assert fill['fee'] == Decimal('0.0502')
+
+    ledger = Ledger(cash=1000)
+    ledger.register(Instrument('BTCUSDT', '0.01', '0.00001'))
+    ledger.apply_fill('BTCUSDT', 'BUY', fill['quantity'], fill['price'], fill['fee'])
+    assert ledger.cash_units == ledger.to_units('949.80')
+    assert ledger.positions['BTCUSDT'].cost_units == ledger.to_units('50.20')
+    assert ledger.positions['BTCUSDT'].steps == 49950
+
+def test_base_asset_commission_on_a_sell_is_a_quote_fee():
+    orders = OrderManager(client=None)
+    fill = asyncio.run(orders._reconcile('BTCUSDT', 'SELL', 'sct-1', full_response([('100.00', '0.5', '0.0005', 'BTC')])))
+    assert fill['quantity'] == Decimal('0.5')
+    assert fill['fee'] == Decimal('0.05')
+
+
+class RecordingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__()
+        self.weights = []
+
+    def update(self, headers):
+        self.weights.append(headers['X-MBX-USED-WEIGHT-1M'])
+        super().update(headers)
+
+
+async def overlapping_requests():
+    async def slow(request):
+        # Headers now, body later: a faster request completes in between
+        response = web.StreamResponse(headers={'X-MBX-USED-WEIGHT-1M': '7', 'Content-Type': 'application/json'})
+        await response.prepare(request)
+        await asyncio.sleep(0.2)
+        await response.write(b'{}')
+        return response
+
+    async def fast(request):
+        return web.json_response({}, headers={'X-MBX-USED-WEIGHT-1M': '3'})
+
+    app = web.Application()
+    app.router.add_get('/slow', slow)
+    app.router.add_get('/fast', fast)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    class Client:
+        """Keeps the last response on the shared session, as AsyncClient does."""
+        response = None
+
+        async def get(self, path):
+            async with session.get(f"http://127.0.0.1:{port}{path}") as response:
+                self.response = response
+                return await response.json()
+
+    limiter = RecordingLimiter()
+    client = Client()
+    orders = OrderManager(client, limiter=limiter)
+    async with aiohttp.ClientSession(trace_configs=[header_trace_config()]) as session:
+        slow_call = asyncio.create_task(orders._request(1, False, client.get, path='/slow'))
+        await asyncio.sleep(0.05)
+        await orders._request(1, False, client.get, path='/fast')
+        await slow_call
+    await runner.cleanup()
+    return limiter
+
+def test_rate_limit_headers_come_from_each_request():
+    limiter = asyncio.run(overlapping_requests())
+    assert limiter.weights == ['3', '7']
+    assert limiter.used_weight == 7
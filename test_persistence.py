@@ -0,0 +1,112 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from persistence import PersistencePipeline
+from trade_log import TradeLog
+
+boto3 = pytest.importorskip('boto3')
+mock_aws = pytest.importorskip('moto').mock_aws # Local S3 stand-in
+
+BUCKET = 'sct-test-logs'
+
+def trade_record(price=100.0, ts=None):
+    return {'ts': ts or int(time.time() * 1000), 'symbol': 'BTCUSDT', 'side': 'BUY', 'price': price, 'quantity': 0.5,
+            'fee': 0.05, 'pnl': 0.0, 'pnl_pct': 0.0, 'net_worth': 1000.0, 'label': 'STRATEGY'}
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class FlakyClient:
+    """S3 client whose first `failures` uploads raise, as during an outage."""
+
+    def __init__(self, client, failures):
+        self.client = client
+        self.failures = failures
+
+    def upload_file(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("S3 unavailable")
+        return self.client.upload_file(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+def keys(s3):
+    return [o['Key'] for o in s3.list_objects_v2(Bucket=BUCKET).get('Contents', [])]
+
+def test_part_is_uploaded(s3, tmp_path):
+    pipeline = PersistencePipeline(bucket=BUCKET, s3_client=s3, flush_interval=0.05, trade_part_interval=0.05, log_dir=str(tmp_path / 'trade_logs'))
+    pipeline.write_record('trades', trade_record(101.5))
+    assert wait_for(lambda: pipeline.uploads == 1)
+    pipeline.close()
+
+    (key,) = keys(s3)
+    part = tmp_path / key
+    assert part.exists()
+    # The S3 copy alone restores the log
+    os.remove(part)
+    assert pipeline.trade_log.read('trades', ['price'])['price'] == []
+    s3.download_file(BUCKET, key, str(part))
+    assert pipeline.trade_log.read('trades', ['price'])['price'] == [101.5]
+    assert pipeline.upload_errors == 0
+
+def test_failed_upload_keeps_the_part_and_retries(s3, tmp_path):
+    client = FlakyClient(s3, failures=2)
+    pipeline = PersistencePipeline(bucket=BUCKET, s3_client=client, flush_interval=0.05, trade_part_interval=0.05, log_dir=str(tmp_path / 'trade_logs'))
+    pipeline.write_record('trades', trade_record())
+    assert wait_for(lambda: pipeline.upload_errors >= 1)
+    parts = list((tmp_path / 'trade_logs').rglob('part-*'))
+    assert len(parts) == 1 # Still on disk while S3 is down
+
+    assert wait_for(lambda: pipeline.uploads == 1)
+    pipeline.close()
+    assert pipeline.upload_errors == 2
+    assert keys(s3) == [pipeline.trade_log.key(str(parts[0]))]
+    assert parts[0].exists()
+
+def test_trades_are_buffered_into_one_part_per_interval(tmp_path):
+    pipeline = PersistencePipeline(flush_interval=0.01, trade_part_interval=0.5, log_dir=str(tmp_path / 'trade_logs'))
+    for i in range(5):
+        pipeline.write_record('trades', trade_record(100.0 + i))
+        time.sleep(0.03) # Several flushes between fills
+    assert wait_for(lambda: pipeline.rows_written == 5)
+    pipeline.close()
+    assert len(list((tmp_path / 'trade_logs').rglob('part-*'))) == 1
+    assert pipeline.trade_log.read('trades', ['price'])['price'] == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+def test_stray_parts_of_a_compacted_day_are_recompacted(tmp_path):
+    log = TradeLog(str(tmp_path / 'trade_logs'))
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    ts = int(yesterday.timestamp() * 1000)
+    date = yesterday.strftime('%Y-%m-%d')
+    log.write('trades', [trade_record(100.0, ts)])
+    log.write('trades', [trade_record(101.0, ts + 1)])
+    assert log.compact('trades', date)[0]
+    # A late flush after midnight, or a worker that restarted before the day was compacted
+    log.write('trades', [trade_record(102.0, ts + 2)])
+
+    pipeline = PersistencePipeline(flush_interval=0.01, log_dir=log.root)
+    assert wait_for(lambda: len(log._parts(log.partition_dir('trades', date))) == 1)
+    pipeline.close()
+    (part,) = log._parts(log.partition_dir('trades', date))
+    assert os.path.basename(part).startswith('compacted-')
+    assert log.read('trades', ['price'])['price'] == [100.0, 101.0, 102.0]
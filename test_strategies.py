@@ -0,0 +1,48 @@
+import random
+from config import build_config
+from indicators import IndicatorEngine
+from strategies import MarketState, StateBatch, SIGNALS, STRATEGIES, Signal, load_strategy
+
+def bar_states(count=600, seed=1):
+    """
+    MarketStates of a random walk through an IndicatorEngine, one per closed bar:
+    warm-up bars (everything None) included, RSI knocked out on every 7th bar
+    (as after a gap) and every other bar in a position whose entry and peak
+    straddle the price.
+    """
+    rng = random.Random(seed)
+    engine = IndicatorEngine(rsi_period=30, ema_period=50, atr_period=5)
+    price = 100.0
+    states = []
+    for i in range(count):
+        close = price * (1 + rng.gauss(0, 0.01))
+        high = max(price, close) * (1 + rng.random() * 0.005)
+        low = min(price, close) * (1 - rng.random() * 0.005)
+        rsi, ema, atr, vol_confirm = engine.evaluate(close, rng.uniform(1, 10), True, high, low)
+        if i % 7 == 0:
+            rsi = None
+        entry = close * rng.uniform(0.9, 1.1) if i % 2 else 0.0
+        states.append(MarketState(
+            f"SYM{i}USDT", close, rsi, ema, atr, vol_confirm, rng.random() < 0.8,
+            entry, max(entry, close) * rng.uniform(1.0, 1.05) if entry else 0.0
+        ))
+        price = close
+    return states
+
+def test_batch_matches_scalar():
+    config = build_config({})
+    states = bar_states()
+    assert any(s.rsi is None and s.atr is not None and s.entry_price for s in states)
+    for name in STRATEGIES:
+        strategy = load_strategy(name, config)
+        expected = [strategy.on_bar_close(state) for state in states]
+        assert [SIGNALS[code] for code in strategy.evaluate(StateBatch(states))] == expected, name
+        assert len(set(expected)) > 2, name # The bars exercise more than HOLD/BUY
+
+def test_exits_fire_while_rsi_warms_up():
+    config = build_config({})
+    state = MarketState("BTCUSDT", price=90.0, atr=1.0, entry_price=100.0, highest_since_entry=100.0)
+    for name in STRATEGIES:
+        strategy = load_strategy(name, config)
+        assert strategy.on_bar_close(state) == Signal.SELL_STOP_LOSS, name
+        assert SIGNALS[strategy.evaluate(StateBatch([state]))[0]] == Signal.SELL_STOP_LOSS, name
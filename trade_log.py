@@ -0,0 +1,272 @@
+import argparse
+import csv
+import glob
+import os
+from datetime import datetime, timezone
+from colorama import init, Fore, Style
+
+# Bumped whenever a table's columns change; each version lives in its own v<N>/ directory
+SCHEMA_VERSION = 1
+
+# Column order and Arrow type of each table. ts is epoch milliseconds (UTC).
+# Amounts are float64 for analytics; the exact values live in the ledger/journal.
+TABLES = {
+    'trades': (
+        ('ts', 'int64'), ('symbol', 'string'), ('side', 'string'), ('price', 'float64'),
+        ('quantity', 'float64'), ('fee', 'float64'), ('pnl', 'float64'), ('pnl_pct', 'float64'),
+        ('net_worth', 'float64'), ('label', 'string')
+    ),
+    'equity': (
+        ('ts', 'int64'), ('symbol', 'string'), ('price', 'float64'), ('net_worth', 'float64')
+    )
+}
+
+def have_arrow():
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def partition_date(ts):
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+def _parse(value, kind):
+    if kind == 'int64':
+        return int(value)
+    if kind == 'float64':
+        return float(value)
+    return value
+
+
+class TradeLog:
+    """
+    Date-partitioned, columnar trade and equity logs:
+
+        <root>/<table>/v<SCHEMA_VERSION>/date=YYYY-MM-DD/part-<stamp>.parquet
+
+    Parts are immutable; every write adds new ones and compact() folds a
+    finished day into a single file. Queries open only the date partitions in
+    range and read only the columns they need. Without pyarrow the same layout
+    is written as CSV parts (slower to query, same results).
+    """
+
+    def __init__(self, root='trade_logs'):
+        self.root = root
+        self.parquet = have_arrow()
+
+    def table_dir(self, table, version=SCHEMA_VERSION):
+        return os.path.join(self.root, table, f"v{version}")
+
+    def partition_dir(self, table, date):
+        return os.path.join(self.table_dir(table), f"date={date}")
+
+    def key(self, path):
+        """Object key of a part, relative to the root's parent (e.g. trade_logs/trades/v1/...)."""
+        return os.path.relpath(path, os.path.dirname(os.path.abspath(self.root))).replace(os.sep, '/')
+
+    # --- Writing ---
+
+    def write(self, table, records):
+        """Writes records (dicts keyed by column) as one new part per date; returns the part paths."""
+        by_date = {}
+        for record in records:
+            by_date.setdefault(partition_date(record['ts']), []).append(record)
+
+        stamp = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}" # Unique across supervisor workers
+        paths = []
+        for date, rows in sorted(by_date.items()):
+            columns = {name: [row.get(name) for row in rows] for name, _ in TABLES[table]}
+            paths.append(self._write_part(table, date, f"part-{stamp}", columns))
+        return paths
+
+    def _write_part(self, table, date, name, columns):
+        directory = self.partition_dir(table, date)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + ('.parquet' if self.parquet else '.csv'))
+        tmp = path + '.tmp'
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([(n, getattr(pa, t)()) for n, t in TABLES[table]],
+                               metadata={'schema_version': str(SCHEMA_VERSION), 'table': table})
+            pq.write_table(pa.table(columns, schema=schema), tmp, compression='zstd')
+        else:
+            names = [n for n, _ in TABLES[table]]
+            with open(tmp, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(names)
+                writer.writerows(zip(*(columns[n] for n in names)))
+        os.replace(tmp, path) # Readers never see a half-written part
+        return path
+
+    def compact(self, table, date):
+        """
+        Merges a partition's parts into one file. Returns (new_path, removed_paths),
+        or (None, []) when there is nothing to merge.
+        """
+        parts = self._parts(self.partition_dir(table, date))
+        if len(parts) < 2:
+            return None, []
+        columns = self._read_parts(table, parts, [n for n, _ in TABLES[table]])
+        order = sorted(range(len(columns['ts'])), key=columns['ts'].__getitem__)
+        columns = {name: [values[i] for i in order] for name, values in columns.items()}
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = self._write_part(table, date, f"compacted-{stamp}", columns)
+        for part in parts:
+            os.remove(part)
+        return path, parts
+
+    # --- Reading ---
+
+    def dates(self, table):
+        return sorted(os.path.basename(d)[len('date='):] for d in glob.glob(os.path.join(self.table_dir(table), 'date=*')))
+
+    def _parts(self, directory):
+        return sorted(glob.glob(os.path.join(directory, '*.parquet')) + glob.glob(os.path.join(directory, '*.csv')))
+
+    def _read_parts(self, table, parts, columns):
+        types = dict(TABLES[table])
+        result = {name: [] for name in columns}
+        for part in parts:
+            if part.endswith('.parquet'):
+                import pyarrow.parquet as pq
+
+                data = pq.read_table(part, columns=columns).to_pydict()
+                for name in columns:
+                    result[name].extend(data[name])
+            else:
+                with open(part, newline='') as f:
+                    for row in csv.DictReader(f):
+                        for name in columns:
+                            result[name].append(_parse(row[name], types[name]))
+        return result
+
+    def read(self, table, columns, start=None, end=None, symbols=None):
+        """
+        Columns of `table` between two dates (YYYY-MM-DD, inclusive) as a dict of
+        lists, sorted by ts. Only partitions in range and the named columns are read.
+        """
+        columns = list(dict.fromkeys(['ts'] + list(columns) + (['symbol'] if symbols else [])))
+        parts = []
+        for date in self.dates(table):
+            if (start is None or date >= start) and (end is None or date <= end):
+                parts.extend(self._parts(self.partition_dir(table, date)))
+        data = self._read_parts(table, parts, columns)
+
+        keep = range(len(data['ts']))
+        if symbols:
+            symbols = set(symbols)
+            keep = [i for i in keep if data['symbol'][i] in symbols]
+        keep = sorted(keep, key=data['ts'].__getitem__)
+        return {name: [values[i] for i in keep] for name, values in data.items()}
+
+    def stats(self, start=None, end=None, symbols=None):
+        """
+        Closed-trade statistics: count, win rate, total/average PnL, max drawdown
+        of realized PnL, and the same per exit label (STOP_LOSS, TRAILING_TP,
+        RSI_EXIT, ...). Reads ts/side/pnl/label of the trades table only.
+        """
+        data = self.read('trades', ['side', 'pnl', 'label'], start, end, symbols)
+        result = {'trades': 0, 'wins': 0, 'total_pnl': 0.0, 'max_drawdown': 0.0, 'by_label': {}}
+        realized = peak = 0.0
+        for side, pnl, label in zip(data['side'], data['pnl'], data['label']):
+            if side != 'SELL':
+                continue
+            row = result['by_label'].setdefault(label, {'trades': 0, 'wins': 0, 'total_pnl': 0.0})
+            for bucket in (result, row):
+                bucket['trades'] += 1
+                bucket['wins'] += pnl > 0
+                bucket['total_pnl'] += pnl
+            realized += pnl
+            peak = max(peak, realized)
+            result['max_drawdown'] = max(result['max_drawdown'], peak - realized)
+
+        for bucket in [result] + list(result['by_label'].values()):
+            bucket['win_rate'] = bucket['wins'] / bucket['trades'] * 100 if bucket['trades'] else 0.0
+            bucket['avg_pnl'] = bucket['total_pnl'] / bucket['trades'] if bucket['trades'] else 0.0
+        return result
+
+    def equity_drawdown(self, symbol, start=None, end=None):
+        """Largest peak-to-trough fall of one symbol's logged net worth, as (amount, percent)."""
+        data = self.read('equity', ['net_worth'], start, end, [symbol])
+        peak = worst = worst_pct = 0.0
+        for net_worth in data['net_worth']:
+            peak = max(peak, net_worth)
+            if peak and peak - net_worth > worst:
+                worst, worst_pct = peak - net_worth, (peak - net_worth) / peak * 100
+        return worst, worst_pct
+
+    # --- Migration ---
+
+    def import_csv(self, path, symbol):
+        """
+        Converts a legacy trades_log.csv into partitions. Handles the older
+        8-column header, whose rows may still carry the exit type as a 9th
+        value. Rows of any other shape are reported and skipped; returns the
+        number of rows imported.
+        """
+        records = []
+        malformed = []
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                extra = row.get(None) or [] # Values beyond the header
+                if len(extra) > 1 or None in row.values():
+                    malformed.append(reader.line_num)
+                    continue
+                ts = int(datetime.strptime(row['Timestamp'], "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+                records.append({
+                    'ts': ts, 'symbol': symbol, 'side': row['Side'], 'price': float(row['Price']),
+                    'quantity': float(row['Quantity']), 'fee': float(row['Fee']), 'pnl': float(row['PnL']),
+                    'pnl_pct': float(row['PnL_Pct']), 'net_worth': float(row['Net_Worth']),
+                    'label': row.get('Type') or (extra or [None])[0] or 'STRATEGY'
+                })
+        if malformed:
+            print(Fore.YELLOW + f"[WARN] {path}: skipped {len(malformed)} row(s) with an unexpected number of "
+                                f"columns (lines {', '.join(map(str, malformed))})")
+        if records:
+            self.write('trades', records)
+        return len(records)
+
+
+def print_stats(stats, title):
+    print(Style.BRIGHT + Fore.CYAN + f"\n=== {title} ===")
+    print(f"Trades: {stats['trades']} | Win Rate: {stats['win_rate']:.1f}% | Total Profit: ${stats['total_pnl']:.2f} "
+          f"| Avg: ${stats['avg_pnl']:.2f} | Max Drawdown: ${stats['max_drawdown']:.2f}")
+    for label, row in sorted(stats['by_label'].items()):
+        print(f"  {label}: {row['trades']} trades | Win Rate: {row['win_rate']:.1f}% | PnL: ${row['total_pnl']:.2f} "
+              f"| Avg: ${row['avg_pnl']:.2f}")
+
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Query or maintain the partitioned trade/equity logs.")
+    parser.add_argument('--root', default='trade_logs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    stats_cmd = commands.add_parser('stats', help="Win rate, PnL, drawdown and per-label stats")
+    stats_cmd.add_argument('--start', help="First date (YYYY-MM-DD)")
+    stats_cmd.add_argument('--end', help="Last date (YYYY-MM-DD)")
+    stats_cmd.add_argument('--symbol', action='append', help="Restrict to a symbol (repeatable)")
+    import_cmd = commands.add_parser('import', help="Convert a legacy trades CSV")
+    import_cmd.add_argument('path')
+    import_cmd.add_argument('--symbol', required=True)
+    compact_cmd = commands.add_parser('compact', help="Merge the parts of past days (local files only)")
+    args = parser.parse_args()
+
+    log = TradeLog(args.root)
+    if args.command == 'stats':
+        print_stats(log.stats(args.start, args.end, args.symbol), f"Trades {args.start or 'start'} .. {args.end or 'now'}")
+        for symbol in args.symbol or []:
+            amount, pct = log.equity_drawdown(symbol, args.start, args.end)
+            print(f"  {symbol} equity drawdown: ${amount:.2f} ({pct:.2f}%)")
+    elif args.command == 'import':
+        print(f"{Fore.GREEN}Imported {log.import_csv(args.path, args.symbol)} rows into {log.table_dir('trades')}")
+    else:
+        today = partition_date(datetime.now(timezone.utc).timestamp() * 1000)
+        for table in TABLES:
+            for date in log.dates(table):
+                if date < today:
+                    path, removed = log.compact(table, date)
+                    if path:
+                        print(f"{table} {date}: {len(removed)} parts -> {os.path.basename(path)}")
@@ -0,0 +1,248 @@
+import math
+from decimal import Decimal
+import numpy as np
+
+SECONDS_PER_YEAR = 365 * 86400 # Crypto trades around the clock
+
+
+class TradeBuffer:
+    """
+    The most recent closed trades in a fixed-capacity ring of float64 columns
+    (labels as small integer codes), instead of an ever-growing list of dicts.
+    """
+
+    FIELDS = ('entry_time', 'exit_time', 'entry_price', 'exit_price', 'quantity', 'pnl', 'pnl_pct', 'fee')
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.size = 0
+        self._head = 0 # Next write position
+        self._data = np.zeros((len(self.FIELDS), capacity), dtype=np.float64)
+        self._labels = np.zeros(capacity, dtype=np.int16)
+        self.label_names = []
+        self._codes = {}
+
+    def append(self, label, *values):
+        """Adds one trade: label followed by a value for each of FIELDS (NaN when unknown)."""
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.label_names)
+            self.label_names.append(label)
+        i = self._head
+        self._data[:, i] = values
+        self._labels[i] = code
+        self._head = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def _order(self):
+        return (np.arange(self.size) + self._head - self.size) % self.capacity
+
+    def column(self, field):
+        """Copy of one field, oldest trade first."""
+        return self._data[self.FIELDS.index(field), self._order()]
+
+    def labels(self):
+        return [self.label_names[code] for code in self._labels[self._order()]]
+
+    def state(self):
+        order = self._order()
+        return {
+            'labels': self.labels(),
+            'columns': {field: self._data[i, order].tolist() for i, field in enumerate(self.FIELDS)}
+        }
+
+    def load_state(self, state):
+        self.size = self._head = 0
+        columns = [state['columns'][field] for field in self.FIELDS]
+        for label, *values in zip(state['labels'], *columns):
+            self.append(label, *values)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes + self._labels.nbytes
+
+
+class PnLBucket:
+    """Running totals for one group of closed trades (all trades, or one exit label)."""
+
+    __slots__ = ('trades', 'wins', 'total_pnl', 'held', 'hold_seconds')
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.total_pnl = Decimal('0')
+        self.held = 0 # Trades with a known entry time
+        self.hold_seconds = 0.0
+
+    def add(self, pnl, hold_seconds=None):
+        self.trades += 1
+        self.wins += pnl > 0
+        self.total_pnl += pnl
+        if hold_seconds is not None:
+            self.held += 1
+            self.hold_seconds += hold_seconds
+
+    @property
+    def win_rate(self):
+        return self.wins / self.trades * 100 if self.trades else 0.0
+
+    @property
+    def avg_pnl(self):
+        return self.total_pnl / self.trades if self.trades else Decimal('0')
+
+    @property
+    def avg_hold_seconds(self):
+        return self.hold_seconds / self.held if self.held else 0.0
+
+    def summary(self):
+        return {'trades': self.trades, 'wins': self.wins, 'win_rate': self.win_rate, 'total_pnl': self.total_pnl,
+                'avg_pnl': self.avg_pnl, 'avg_hold_seconds': self.avg_hold_seconds}
+
+    def state(self):
+        return [self.trades, self.wins, str(self.total_pnl), self.held, self.hold_seconds]
+
+    def load_state(self, state):
+        self.trades, self.wins, total_pnl, self.held, self.hold_seconds = state
+        self.total_pnl = Decimal(total_pnl)
+
+
+class TradeStats:
+    """
+    Performance statistics updated in O(1) per closed trade and per equity
+    sample, so reading them never walks the trade history.
+
+    - PnL, win rate, holding time: overall and per exit label (PnLBucket).
+    - Max drawdown of realized PnL, and of net worth sampled every sample_seconds.
+    - Sharpe/Sortino of the sampled net-worth returns (Welford running
+      mean/variance, downside deviation against 0), annualized.
+    """
+
+    def __init__(self, capacity=1000, sample_seconds=60):
+        self.sample_seconds = sample_seconds
+        self.recent = TradeBuffer(capacity)
+        self.total = PnLBucket()
+        self.by_label = {}
+        self.realized = Decimal('0')
+        self.realized_peak = Decimal('0')
+        self.max_drawdown = Decimal('0')
+
+        self.returns = 0 # Equity samples with a return
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._downside = 0.0 # Sum of squared negative returns
+        self._next_sample = 0.0
+        self._last_value = None
+        self.equity_peak = 0.0
+        self.max_equity_drawdown_pct = 0.0
+
+    def record_trade(self, pnl, pnl_pct=0, label='STRATEGY', entry_time=None, exit_time=None,
+                     entry_price=0, exit_price=0, quantity=0, fee=0):
+        """Folds in one closed trade; times are epoch seconds (None if unknown)."""
+        hold = exit_time - entry_time if entry_time is not None and exit_time is not None else None
+        self.total.add(pnl, hold)
+        bucket = self.by_label.get(label)
+        if bucket is None:
+            bucket = self.by_label[label] = PnLBucket()
+        bucket.add(pnl, hold)
+
+        self.realized += pnl
+        if self.realized > self.realized_peak:
+            self.realized_peak = self.realized
+        elif self.realized_peak - self.realized > self.max_drawdown:
+            self.max_drawdown = self.realized_peak - self.realized
+
+        nan = float('nan')
+        self.recent.append(label, nan if entry_time is None else entry_time, nan if exit_time is None else exit_time,
+                           float(entry_price), float(exit_price), float(quantity), float(pnl), float(pnl_pct), float(fee))
+
+    def record_equity(self, timestamp, value):
+        """Called with every net-worth observation; only one per sample_seconds is used."""
+        if timestamp < self._next_sample:
+            return
+        self._next_sample = timestamp - timestamp % self.sample_seconds + self.sample_seconds
+
+        if self._last_value:
+            r = value / self._last_value - 1
+            self.returns += 1
+            delta = r - self._mean
+            self._mean += delta / self.returns
+            self._m2 += delta * (r - self._mean)
+            if r < 0:
+                self._downside += r * r
+        self._last_value = value
+
+        if value > self.equity_peak:
+            self.equity_peak = value
+        elif self.equity_peak:
+            drawdown = (self.equity_peak - value) / self.equity_peak * 100
+            if drawdown > self.max_equity_drawdown_pct:
+                self.max_equity_drawdown_pct = drawdown
+
+    @property
+    def _annualization(self):
+        return math.sqrt(SECONDS_PER_YEAR / self.sample_seconds)
+
+    @property
+    def sharpe(self):
+        if self.returns < 2 or self._m2 <= 0:
+            return 0.0
+        return self._mean / math.sqrt(self._m2 / (self.returns - 1)) * self._annualization
+
+    @property
+    def sortino(self):
+        if self.returns < 2 or self._downside <= 0:
+            return 0.0
+        return self._mean / math.sqrt(self._downside / self.returns) * self._annualization
+
+    def summary(self):
+        result = self.total.summary()
+        result.update({
+            'max_drawdown': self.max_drawdown,
+            'max_equity_drawdown_pct': self.max_equity_drawdown_pct,
+            'sharpe': self.sharpe,
+            'sortino': self.sortino,
+            'by_label': {label: bucket.summary() for label, bucket in self.by_label.items()}
+        })
+        return result
+
+    def gauges(self, **labels):
+        """(name, labels, value) rows for the metrics endpoint."""
+        rows = [
+            ('trades', labels, self.total.trades),
+            ('win_rate_pct', labels, self.total.win_rate),
+            ('realized_pnl', labels, float(self.total.total_pnl)),
+            ('max_drawdown', labels, float(self.max_drawdown)),
+            ('max_equity_drawdown_pct', labels, self.max_equity_drawdown_pct),
+            ('sharpe', labels, self.sharpe),
+            ('sortino', labels, self.sortino),
+            ('avg_hold_seconds', labels, self.total.avg_hold_seconds)
+        ]
+        for label, bucket in self.by_label.items():
+            rows.append(('label_trades', dict(labels, label=label), bucket.trades))
+            rows.append(('label_pnl', dict(labels, label=label), float(bucket.total_pnl)))
+        return rows
+
+    def state(self):
+        return {
+            'total': self.total.state(),
+            'by_label': {label: bucket.state() for label, bucket in self.by_label.items()},
+            'realized': [str(self.realized), str(self.realized_peak), str(self.max_drawdown)],
+            'equity': [self.returns, self._mean, self._m2, self._downside, self._next_sample, self._last_value,
+                       self.equity_peak, self.max_equity_drawdown_pct],
+            'recent': self.recent.state()
+        }
+
+    def load_state(self, state):
+        self.total.load_state(state['total'])
+        self.by_label = {}
+        for label, values in state['by_label'].items():
+            bucket = self.by_label[label] = PnLBucket()
+            bucket.load_state(values)
+        self.realized, self.realized_peak, self.max_drawdown = (Decimal(v) for v in state['realized'])
+        (self.returns, self._mean, self._m2, self._downside, self._next_sample, self._last_value,
+         self.equity_peak, self.max_equity_drawdown_pct) = state['equity']
+        self.recent.load_state(state['recent'])